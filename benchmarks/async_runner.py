@@ -0,0 +1,126 @@
+"""Compare the sync and async plugin runners on a mocked API.
+
+Each plugin sends a number of requests to a mocked API
+which answers after a fixed latency. Sync plugins are run on
+a thread pool the size of APScheduler's default executor.
+Async plugins are submitted to Meguca's event loop.
+
+Both runners are measured with the same request patterns:
+    serial: each plugin sends its requests one after another.
+    concurrent: each plugin sends all its requests at the same time.
+        Sync plugins send them from a thread pool of their own.
+
+Usage:
+    PYTHONPATH=. python benchmarks/async_runner.py [--plugins 50] [--requests 5] [--latency 0.2]
+"""
+
+
+import argparse
+import asyncio
+import configparser
+import concurrent.futures
+import threading
+import time
+from unittest import mock
+
+from meguca import meguca
+
+
+# Default number of threads of APScheduler's BackgroundScheduler
+SCHEDULER_THREADS = 10
+
+
+class MockAPI():
+    """A mocked NationStates API with a fixed round trip latency."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def get_nation(self, name, shards):
+        time.sleep(self.latency)
+        return {shards.upper(): name}
+
+    async def async_get_nation(self, name, shards):
+        await asyncio.sleep(self.latency)
+        return {shards.upper(): name}
+
+
+def gen_plg(plg_id, api, req_num, is_async, concurrent_reqs):
+    """Generate a collector plugin sending a number of requests."""
+
+    names = ['nation{}'.format(i) for i in range(req_num)]
+
+    if is_async and concurrent_reqs:
+        async def run():
+            results = await asyncio.gather(*[api.async_get_nation(name, 'name') for name in names])
+            return {plg_id: len(results)}
+    elif is_async:
+        async def run():
+            results = [await api.async_get_nation(name, 'name') for name in names]
+            return {plg_id: len(results)}
+    elif concurrent_reqs:
+        def run():
+            with concurrent.futures.ThreadPoolExecutor(max_workers=req_num) as executor:
+                results = list(executor.map(api.get_nation, names, ['name'] * req_num))
+            return {plg_id: len(results)}
+    else:
+        def run():
+            results = [api.get_nation(name, 'name') for name in names]
+            return {plg_id: len(results)}
+
+    details = configparser.ConfigParser()
+    details['Core'] = {'Id': plg_id}
+
+    return mock.Mock(plugin_object=mock.Mock(run=run), details=details)
+
+
+def bench_sync(plugins):
+    meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=SCHEDULER_THREADS) as executor:
+        futures = [executor.submit(meguca_ins.run_plugin, plg, 'run') for plg in plugins]
+        peak_threads = threading.active_count()
+        concurrent.futures.wait(futures)
+    elapsed = time.perf_counter() - start
+
+    return elapsed, peak_threads
+
+
+def bench_async(plugins):
+    meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+    meguca_ins.event_loop.start()
+
+    start = time.perf_counter()
+    for plg in plugins:
+        meguca_ins.submit_plugin(plg, 'run')
+    peak_threads = threading.active_count()
+    concurrent.futures.wait(list(meguca_ins.pending_coros.values()))
+    elapsed = time.perf_counter() - start
+
+    meguca_ins.event_loop.stop()
+
+    return elapsed, peak_threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--plugins', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.2)
+    args = parser.parse_args()
+
+    api = MockAPI(args.latency)
+
+    print('{} plugins x {} requests, {:.0f} ms latency'.format(args.plugins, args.requests,
+                                                             args.latency * 1000))
+    for pattern, concurrent_reqs in (('serial', False), ('concurrent', True)):
+        for runner, bench, is_async in (('sync', bench_sync, False), ('async', bench_async, True)):
+            plugins = [gen_plg('{}{}'.format(runner, i), api, args.requests, is_async, concurrent_reqs)
+                       for i in range(args.plugins)]
+            elapsed, peak_threads = bench(plugins)
+            print('{:<10} {:<6} {:>8.2f} s {:>6} threads'.format(pattern, runner, elapsed, peak_threads))
+
+
+if __name__ == '__main__':
+    main()
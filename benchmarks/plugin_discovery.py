@@ -0,0 +1,72 @@
+"""Compare plugin discovery time with yapsy and with the plugin manifest.
+
+Each measurement runs in a new interpreter so imports are not cached.
+Three cases are measured:
+    yapsy: yapsy scans the plugin directory and imports every plugin.
+    manifest miss: the manifest is rebuilt, which imports every plugin.
+    manifest hit: plugins are read from the manifest without imports.
+
+Usage:
+    PYTHONPATH=. python benchmarks/plugin_discovery.py [--runs 5]
+"""
+
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+MEASURE_CODE = '''
+import sys
+import time
+from meguca import plugin
+start = time.perf_counter()
+plugin.PlgManager({plugin_dir!r}, {plugin_ext!r}, {manifest_path!r}).load_plugins()
+print(time.perf_counter() - start, len(sys.modules))
+'''
+
+
+def measure(manifest_path):
+    """Measure plugin discovery in a new interpreter.
+
+    Returns:
+        tuple: Elapsed time and number of imported modules.
+    """
+
+    code = MEASURE_CODE.format(plugin_dir='meguca/plugins', plugin_ext='plugin',
+                               manifest_path=manifest_path)
+    output = subprocess.run([sys.executable, '-c', code], check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    elapsed, module_num = output.split()
+
+    return float(elapsed), int(module_num)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manifest_path = os.path.join(tmp_dir, 'manifest.json')
+
+        results = {'yapsy': [], 'manifest miss': [], 'manifest hit': []}
+        for i in range(args.runs):
+            results['yapsy'].append(measure(None))
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            results['manifest miss'].append(measure(manifest_path))
+            results['manifest hit'].append(measure(manifest_path))
+
+    print('Median of {} runs'.format(args.runs))
+    for case, case_results in results.items():
+        print('{:<14} {:>8.1f} ms {:>6} modules'.format(case,
+                                                       statistics.median(r[0] for r in case_results) * 1000,
+                                                       case_results[0][1]))
+
+
+if __name__ == '__main__':
+    main()
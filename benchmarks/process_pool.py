@@ -0,0 +1,145 @@
+"""Compare running CPU-bound stat plugins on threads and in worker processes.
+
+A generated endorsement graph is shared by several runs of a plugin which
+counts mutual endorsements of every nation. Three cases are measured:
+    threads: runs on a thread pool like the concurrent stat plugin mode.
+    processes: runs in worker processes. The graph is encoded on every call.
+    processes + cache: runs in worker processes. The graph is encoded
+        once per version like Meguca does. It did not change since
+        the last tick so it is not encoded at all.
+
+Worker processes only shorten wall time if there are free CPUs.
+
+Main thread time is the time the main thread spends preparing calls,
+which holds the GIL while other jobs wait. Main thread work is the number
+of loop iterations the main thread completes while the runs are
+in progress, a stand-in for other jobs which need the GIL.
+
+Usage:
+    PYTHONPATH=. python benchmarks/process_pool.py [--nations 5000] [--endos 100] [--runs 4]
+"""
+
+
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
+import random
+import time
+
+import networkx as nx
+
+from meguca import data
+from meguca import process_pool
+
+
+class MutualEndoCount():
+    """Count mutual endorsements of every nation several times."""
+
+    plg_config = None
+
+    def run(self, data):
+        endos = data['endos']
+        result = 0
+        for i in range(3):
+            result = sum(len(set(endos.predecessors(nation)) & set(endos.successors(nation)))
+                         for nation in endos)
+
+        return {'mutual_endos': result}
+
+
+def gen_graph(nation_num, endo_num):
+    """Generate an endorsement graph.
+
+    Returns:
+        networkx.DiGraph: Graph.
+    """
+
+    rand = random.Random(0)
+    nations = ['nation_{}'.format(i) for i in range(nation_num)]
+    graph = nx.DiGraph()
+    graph.add_nodes_from(nations)
+    graph.add_edges_from((nation, rand.choice(nations)) for nation in nations for i in range(endo_num))
+
+    return graph
+
+
+def wait_and_work(futures):
+    """Do work on the main thread until futures finish.
+
+    Returns:
+        int: Number of loop iterations done.
+    """
+
+    work = 0
+    while not all(future.done() for future in futures):
+        for i in range(1000):
+            work += 1
+
+    for future in futures:
+        future.result()
+
+    return work
+
+
+def run_threads(data_store, runs):
+    plg_object = MutualEndoCount()
+
+    with concurrent.futures.ThreadPoolExecutor(runs) as executor:
+        start = time.perf_counter()
+        main_start = time.thread_time()
+        futures = [executor.submit(plg_object.run, data_store.snapshot()) for i in range(runs)]
+        main_time = time.thread_time() - main_start
+        work = wait_and_work(futures)
+
+        return time.perf_counter() - start, main_time, work
+
+
+def run_processes(executor, data_store, runs, cache=None):
+    start = time.perf_counter()
+    main_start = time.thread_time()
+
+    futures = []
+    for i in range(runs):
+        if cache is not None:
+            encoded_data = cache.encode_data(data_store.snapshot(), ['endos'])
+        else:
+            encoded_data = process_pool.encode_data({'endos': data_store['endos']})
+        futures.append(executor.submit(process_pool.run_plugin, os.path.abspath(__file__),
+                                       'MutualEndoCount', None, 'run', {'data': encoded_data}))
+
+    main_time = time.thread_time() - main_start
+    work = wait_and_work(futures)
+
+    return time.perf_counter() - start, main_time, work
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nations', type=int, default=5000)
+    parser.add_argument('--endos', type=int, default=100)
+    parser.add_argument('--runs', type=int, default=4)
+    args = parser.parse_args()
+
+    data_store = data.DataStore()
+    data_store['endos'] = gen_graph(args.nations, args.endos)
+    print('{} nations, {} endorsements, {} runs, {} CPUs'.format(args.nations, data_store['endos'].number_of_edges(),
+                                                                 args.runs, os.cpu_count()))
+
+    mp_context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(args.runs, mp_context=mp_context) as executor:
+        # Start workers, load the plugin and encode the graph before measuring
+        cache = process_pool.EncodingCache()
+        run_processes(executor, data_store, args.runs, cache)
+
+        results = {'threads': run_threads(data_store, args.runs),
+                   'processes': run_processes(executor, data_store, args.runs),
+                   'processes + cache': run_processes(executor, data_store, args.runs, cache)}
+
+    for case, (elapsed, main_time, work) in results.items():
+        print('{:<18} {:>8.2f} s wall {:>8.1f} ms main thread {:>12} main thread work'
+              .format(case, elapsed, main_time * 1000, work))
+
+
+if __name__ == '__main__':
+    main()
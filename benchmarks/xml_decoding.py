@@ -0,0 +1,126 @@
+"""Compare NSApi respond decoders on large payloads.
+
+Five paths are measured:
+    xmltodict: the previous decoder.
+    xmltodict + set: the previous decoder and converting nation lists
+        into sets in the plugin like WAStats did.
+    etree: ElementTree decoding into the same dictionaries.
+    etree typed: ElementTree decoding and typed values (e.g. sets of nations).
+    stream typed: incremental parsing of the encoded payload in chunks
+        like streamed requests do. Includes the encoded payload itself
+        for the other paths since they hold it as text.
+
+Payloads are taken from a fixture file recorded with the 'record'
+transport mode if given. Otherwise payloads shaped like the WA members,
+region nations and happenings shards are generated.
+
+Usage:
+    PYTHONPATH=. python benchmarks/xml_decoding.py [--fixtures cassette.json] [--runs 5]
+"""
+
+
+import argparse
+import statistics
+import time
+import tracemalloc
+
+from meguca import transport
+from meguca.plugins.src.ns_api import decoders
+from meguca.plugins.src.ns_api.ns_api import STREAM_CHUNK_SIZE
+
+
+def gen_payloads():
+    """Generate payloads shaped like large shards.
+
+    Returns:
+        dict: Payload by name.
+    """
+
+    members = ','.join('nation_{}'.format(i) for i in range(300000))
+    nations = ':'.join('nation_{}'.format(i) for i in range(10000))
+    events = ''.join('<EVENT id="{0}"><TIMESTAMP>{0}</TIMESTAMP>'
+                     '<TEXT>@@nation_{0}@@ endorsed @@nation_{1}@@.</TEXT></EVENT>'.format(i, i + 1)
+                     for i in range(100))
+
+    return {'wa members': '<WA council="1"><NUMNATIONS>300000</NUMNATIONS>'
+                          '<MEMBERS>{}</MEMBERS></WA>'.format(members),
+            'region nations': '<REGION id="region"><NATIONS>{}</NATIONS></REGION>'.format(nations),
+            'happenings': '<WORLD><HAPPENINGS>{}</HAPPENINGS></WORLD>'.format(events)}
+
+
+def load_payloads(path):
+    """Load recorded payloads from a fixture file.
+
+    Returns:
+        dict: Payload by request URL.
+    """
+
+    return {interaction['request']['url']: interaction['response']['body']
+            for interaction in transport.load_fixtures(path)
+            if interaction['response']['status'] == 200}
+
+
+def measure(decode, payload, runs):
+    """Measure decoding of a payload.
+
+    Returns:
+        tuple: Median time in seconds and peak traced memory in bytes.
+    """
+
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        decode(payload)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    decode(payload)
+    peak_mem = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return statistics.median(times), peak_mem
+
+
+def decode_xmltodict_sets(payload):
+    """Decode with xmltodict and split nation lists into sets in Python."""
+
+    resp_dict = decoders.decode_xmltodict(payload)
+    for tag in ('MEMBERS', 'NATIONS'):
+        if tag in resp_dict:
+            resp_dict[tag] = set(resp_dict[tag].split(',' if tag == 'MEMBERS' else ':'))
+
+    return resp_dict
+
+
+def decode_stream_typed(payload):
+    """Parse a payload incrementally in chunks like streamed requests."""
+
+    data = payload.encode('utf-8')
+    chunks = (data[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(data), STREAM_CHUNK_SIZE))
+
+    return dict(decoders.iter_shards(chunks, typed=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.fixtures) if args.fixtures else gen_payloads()
+    paths = {'xmltodict': decoders.decode_xmltodict,
+             'xmltodict + set': decode_xmltodict_sets,
+             'etree': decoders.decode_etree,
+             'etree typed': lambda payload: decoders.decode_typed(decoders.decode_etree(payload)),
+             'stream typed': decode_stream_typed}
+
+    print('Median of {} runs'.format(args.runs))
+    for name, payload in payloads.items():
+        print('{} ({} KB)'.format(name, len(payload) // 1024))
+        for path, decode in paths.items():
+            elapsed, peak_mem = measure(decode, payload, args.runs)
+            print('    {:<16} {:>8.2f} ms {:>8} KB peak'.format(path, elapsed * 1000, peak_mem // 1024))
+
+
+if __name__ == '__main__':
+    main()
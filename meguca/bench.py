@@ -0,0 +1,340 @@
+"""Benchmark plugins offline against recorded fixtures.
+
+Chosen plugins are prepared and run a number of times like in a dry run.
+NationStates API and site requests are answered from a fixture file
+(see meguca.transport) so results do not depend on the network.
+Latency percentiles, throughput and allocations of each plugin's
+prepare and run phase are reported as JSON so results of different
+versions can be compared. Runs are timed without memory tracing.
+Allocations are measured in separate traced runs after the timed ones.
+Peak RSS is only reported for the whole benchmark process
+since the operating system keeps one peak per process.
+
+Usage:
+    python -m meguca.bench endo_collector delegate_stats --fixtures fixtures.json
+                           [--runs 20] [--warmup 1] [--memory-runs 1] [--latency recorded]
+                           [--output results.json]
+
+Fixture files can be recorded from the live site with the 'record' transport mode.
+"""
+
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+from meguca import info
+from meguca import meguca
+from meguca import plugin
+from meguca import profiling
+from meguca import utils
+
+
+logger = logging.getLogger(__name__)
+
+
+# Version of the result format
+RESULT_VERSION = 2
+
+# Phases to benchmark by default in their run order
+PHASES = ('prepare', 'run')
+
+# Percentiles of latencies to report
+PERCENTILES = (50, 90, 99)
+
+
+def get_peak_rss():
+    """Get the peak resident set size of this process over its lifetime.
+
+    Returns:
+        int: Peak RSS in bytes. None if it cannot be measured.
+    """
+
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes and Linux reports kilobytes.
+    if sys.platform == 'darwin':
+        return peak_rss
+
+    return peak_rss * 1024
+
+
+def measure_time(func):
+    """Time a call.
+
+    Args:
+        func (callable): Callable with no arguments.
+
+    Returns:
+        dict: Wall time and CPU time of the call.
+    """
+
+    start_wall_time = time.perf_counter()
+    start_cpu_time = time.process_time()
+
+    func()
+
+    return {'wall_time': time.perf_counter() - start_wall_time,
+            'cpu_time': time.process_time() - start_cpu_time}
+
+
+def measure_memory(func):
+    """Measure memory allocations of a call.
+    Memory is traced only during the call since tracing slows it down.
+
+    Args:
+        func (callable): Callable with no arguments.
+
+    Returns:
+        dict: Peak traced memory allocation in bytes
+            and net number of allocated memory blocks of the call.
+    """
+
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    try:
+        tracemalloc.reset_peak()
+        start_mem = tracemalloc.get_traced_memory()[0]
+        start_blocks = sys.getallocatedblocks()
+
+        func()
+
+        return {'allocated_blocks': sys.getallocatedblocks() - start_blocks,
+                'peak_mem': max(tracemalloc.get_traced_memory()[1] - start_mem, 0)}
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def summarize(samples, memory_samples):
+    """Aggregate measurements of the runs of a phase.
+
+    Args:
+        samples (list): Timings of each timed run.
+        memory_samples (list): Memory measurements of each traced run.
+
+    Returns:
+        dict: Aggregates.
+    """
+
+    wall_times = sorted(sample['wall_time'] for sample in samples)
+    total_wall_time = sum(wall_times)
+
+    latency = {'p{}'.format(percent): profiling.percentile(wall_times, percent)
+               for percent in PERCENTILES}
+    latency['mean'] = total_wall_time / len(wall_times)
+    latency['max'] = wall_times[-1]
+
+    summary = {'runs': len(samples),
+               'latency': latency,
+               'throughput': len(samples) / total_wall_time if total_wall_time else None,
+               'cpu_time': sum(sample['cpu_time'] for sample in samples) / len(samples),
+               'peak_mem': max(sample['peak_mem'] for sample in memory_samples),
+               'allocated_blocks': (sum(sample['allocated_blocks'] for sample in memory_samples)
+                                    // len(memory_samples))}
+
+    return summary
+
+
+def bench_plugin(meguca_ins, plg, phases, runs, warmup, memory_runs):
+    """Benchmark phases of a plugin.
+
+    Args:
+        meguca_ins (meguca.Meguca): Meguca instance with loaded services.
+        plg (yapsy.PluginInfo): Plugin metadata object.
+        phases (list): Entry methods to benchmark in order.
+        runs (int): Number of timed runs of each phase.
+        warmup (int): Number of unmeasured runs before timed ones.
+        memory_runs (int): Number of traced runs after timed ones.
+
+    Returns:
+        dict: Aggregates of each phase.
+    """
+
+    results = {}
+
+    for phase in phases:
+        if not hasattr(plg.plugin_object, phase):
+            logger.info('Did not find %s() in "%s". Skipping', phase, plg.name)
+            continue
+
+        def run_phase():
+            meguca_ins.run_plugin(plg, phase)
+
+        for i in range(warmup):
+            run_phase()
+
+        samples = [measure_time(run_phase) for i in range(runs)]
+        memory_samples = [measure_memory(run_phase) for i in range(memory_runs)]
+        results[phase] = summarize(samples, memory_samples)
+
+        logger.info('Plugin "%s" %s() p50=%.3g s over %d runs', plg.name, phase,
+                    results[phase]['latency']['p50'], runs)
+
+    return results
+
+
+def bench(meguca_ins, plg_ids, phases=PHASES, runs=10, warmup=1, memory_runs=1):
+    """Benchmark plugins in order.
+
+    Args:
+        meguca_ins (meguca.Meguca): Meguca instance.
+        plg_ids (list): Ids of plugins to benchmark in run order.
+        phases (tuple, optional): Defaults to PHASES. Entry methods to benchmark.
+        runs (int, optional): Defaults to 10. Number of timed runs of each phase.
+        warmup (int, optional): Defaults to 1. Number of unmeasured runs before timed ones.
+        memory_runs (int, optional): Defaults to 1. Number of traced runs
+            of each phase to measure allocations.
+
+    Raises:
+        KeyError: Raises if a plugin does not exist.
+
+    Returns:
+        dict: Results. process_peak_rss is the peak RSS of the whole
+            benchmark process including Meguca itself, not of a plugin. E.g:
+            {'version': 2, 'runs': 10, 'process_peak_rss': 52428800, ...,
+             'plugins': {'endo_collector': {'run': {'latency': {'p50': 0.1, ...},
+                                                    'throughput': 9.8, ...}}}}
+    """
+
+    plugins = {plg.details['Core']['Id']: plg for plg in meguca_ins.plg_manager.get_all_plugins()}
+    chosen_plugins = [plugins[plg_id] for plg_id in plg_ids]
+
+    meguca_ins.load_services()
+    meguca_ins.compile_args_plans()
+
+    if tracemalloc.is_tracing():
+        logger.warning('Memory is traced. Timings include the tracing overhead')
+
+    results = {'version': RESULT_VERSION,
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'time': time.time(),
+               'runs': runs,
+               'warmup': warmup,
+               'memory_runs': memory_runs,
+               'plugins': {}}
+
+    for plg in chosen_plugins:
+        results['plugins'][plg.details['Core']['Id']] = bench_plugin(meguca_ins, plg, phases,
+                                                                    runs, warmup, memory_runs)
+
+    results['process_peak_rss'] = get_peak_rss()
+
+    return results
+
+
+def parse_latency(value):
+    """Parse the simulated latency argument.
+
+    Args:
+        value (str): Seconds or 'recorded'.
+
+    Returns:
+        float|str: Latency.
+    """
+
+    if value == 'recorded':
+        return value
+
+    return float(value)
+
+
+def positive_int(value):
+    """Parse a number of runs which must be at least 1.
+
+    Args:
+        value (str): Number.
+
+    Raises:
+        argparse.ArgumentTypeError: Raises if the number is below 1.
+
+    Returns:
+        int: Number.
+    """
+
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('must be at least 1')
+
+    return number
+
+
+def parse_args(argv=None):
+    """Parse command-line arguments.
+
+    Args:
+        argv (list, optional): Defaults to None. Arguments. Uses sys.argv if None.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark Meguca plugins against recorded fixtures.')
+    parser.add_argument('plugins', nargs='+', help='Ids of plugins to benchmark in run order')
+    parser.add_argument('--fixtures', required=True,
+                        help='fixture file of recorded NationStates responses')
+    parser.add_argument('--runs', type=positive_int, default=10, help='timed runs of each phase')
+    parser.add_argument('--warmup', type=int, default=1,
+                        help='unmeasured runs of each phase before timed ones')
+    parser.add_argument('--memory-runs', type=positive_int, default=1,
+                        help='traced runs of each phase after timed ones to measure allocations')
+    parser.add_argument('--phases', nargs='+', default=list(PHASES), choices=PHASES,
+                        help='entry methods to benchmark')
+    parser.add_argument('--latency', type=parse_latency,
+                        help="simulated latency of each response in seconds "
+                             "or 'recorded' to use recorded latencies")
+    parser.add_argument('--config', default=info.GENERAL_CONFIG_PATH, help='general configuration file')
+    parser.add_argument('--output', help='file to write JSON results to instead of stdout')
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Benchmark plugins and output results.
+
+    Args:
+        argv (list, optional): Defaults to None. Command-line arguments.
+    """
+
+    args = parse_args(argv)
+
+    general_config = utils.load_config(args.config)
+    general_config['transport'] = {'mode': 'replay', 'path': args.fixtures, 'latency': args.latency}
+    # Plugins are run by the benchmark instead of the scheduler.
+    general_config['dry_run'] = {'enable': True, 'plugins': []}
+
+    plg_manager = plugin.PlgManager(info.PLUGIN_DIR_PATH, info.PLUGIN_DESC_EXT, info.PLUGIN_MANIFEST_PATH)
+    plg_config = plg_manager.load_plugins()
+
+    meguca_ins = meguca.Meguca(plg_manager, general_config, plg_config)
+
+    try:
+        results = bench(meguca_ins, args.plugins, args.phases, args.runs, args.warmup, args.memory_runs)
+    finally:
+        meguca_ins.shutdown()
+
+    output = json.dumps(results, indent=4, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""This module saves and loads checkpoints of plugin data
+and plugin states so Meguca can restart without rebuilding them.
+
+A checkpoint is a gzipped pickle. Graphs are stored in the compact
+form used to ship them to worker processes so their node and edge
+attributes are not kept.
+"""
+
+
+import gzip
+import logging
+import os
+import pickle
+import time
+
+from meguca import process_pool
+
+
+logger = logging.getLogger(__name__)
+
+
+# Version of the checkpoint format
+CHECKPOINT_VERSION = 1
+
+
+def save(path, data_dict, plugin_states):
+    """Save a checkpoint atomically.
+    The checkpoint is written to a temporary file which then replaces
+    the old checkpoint so a crash never leaves a half-written one.
+
+    Args:
+        path (str): Checkpoint file path.
+        data_dict (dict): Plugin data.
+        plugin_states (dict): State of each plugin by plugin Id.
+    """
+
+    checkpoint = {'version': CHECKPOINT_VERSION,
+                  'time': time.time(),
+                  'data': process_pool.encode_data(data_dict),
+                  'plugins': plugin_states}
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=5) as gzip_file:
+            pickle.dump(checkpoint, gzip_file, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    logger.debug('Saved checkpoint "%s"', path)
+
+
+def load(path, max_age=None):
+    """Load a checkpoint.
+
+    Args:
+        path (str): Checkpoint file path.
+        max_age (float, optional): Defaults to None. Maximum age in seconds.
+
+    Returns:
+        dict: Plugin data ('data'), state of each plugin by plugin Id ('plugins')
+            and the time it was saved ('time'). None if the checkpoint does not exist,
+            is unreadable, has another format version or is too old.
+    """
+
+    try:
+        with gzip.open(path, 'rb') as f:
+            checkpoint = pickle.load(f)
+    except FileNotFoundError:
+        logger.info('Could not find checkpoint "%s"', path)
+        return None
+    except Exception:
+        logger.exception('Could not read checkpoint "%s"', path)
+        return None
+
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        logger.warning('Checkpoint "%s" has an unsupported format version', path)
+        return None
+
+    age = time.time() - checkpoint['time']
+    if max_age is not None and age > max_age:
+        logger.warning('Checkpoint "%s" is %d seconds old which is older than %d seconds',
+                       path, age, max_age)
+        return None
+
+    checkpoint['data'] = process_pool.decode_data(checkpoint['data'])
+
+    return checkpoint
@@ -1,15 +1,242 @@
 import collections
+import collections.abc
+import contextlib
+import contextvars
+import threading
+import time
 
 from meguca import exceptions
 
 
+# Versions of keys read in the current thread or task
+# while reads are tracked.
+_reads = contextvars.ContextVar('meguca_data_reads', default=None)
+
+# Key recorded when untracked data such as time series or
+# profiler records is read. It has no version to compare.
+UNTRACKED = object()
+
+
+@contextlib.contextmanager
+def track_reads():
+    """Record keys of data stores read in a with block.
+
+    Yields:
+        dict: Version of each read key at the time of its first read.
+    """
+
+    reads = {}
+    token = _reads.set(reads)
+
+    try:
+        yield reads
+    finally:
+        _reads.reset(token)
+
+
+def record_read(versions, key):
+    """Record the version of a key read while reads are tracked.
+
+    Args:
+        versions (collections.Counter): Versions of keys.
+        key (str): Key.
+    """
+
+    reads = _reads.get()
+    if reads is not None and key not in reads:
+        reads[key] = versions[key]
+
+
+def record_untracked_read():
+    """Record a read of data without versions while reads are tracked."""
+
+    reads = _reads.get()
+    if reads is not None:
+        reads[UNTRACKED] = None
+
+
+def get_item(state, key, raise_notyetexist):
+    """Get an item from a data state.
+
+    Args:
+        state (tuple): Data dict and versions of its keys.
+        key (str): Key.
+        raise_notyetexist (bool): Raise exceptions.NotYetExist instead of
+            exceptions.NotFound if the key does not exist.
+
+    Raises:
+        exceptions.NotFound: Raise if cannot index object.
+        exceptions.NotYetExist: Raise if cannot index object when raise_notyetexist is True.
+
+    Returns:
+        Value of the key.
+    """
+
+    data, versions = state
+    record_read(versions, key)
+
+    if key not in data:
+        if raise_notyetexist:
+            raise exceptions.NotYetExist(key)
+        else:
+            raise exceptions.NotFound(key)
+
+    return data[key]
+
+
+def is_equal(old_value, value):
+    """Check if a new value is equal to the current one.
+
+    Args:
+        old_value: Current value.
+        value: New value.
+
+    Returns:
+        bool: False if the values differ or cannot be compared.
+    """
+
+    try:
+        return bool(old_value == value)
+    except Exception:
+        return False
+
+
+class DataSnapshot(collections.abc.Mapping):
+    """Immutable view of a data store at one point in time.
+    Later commits to the store do not change it.
+
+    Args:
+        state (tuple): Data dict and versions of its keys.
+            Neither is changed after it is committed.
+        raise_notyetexist (bool): Raise exceptions.NotYetExist instead of
+            exceptions.NotFound if a key does not exist.
+        profiler (profiling.Profiler): Plugin run profiler.
+        timeseries (timeseries.TimeSeriesStore): Histories of numeric keys.
+    """
+
+    def __init__(self, state, raise_notyetexist, profiler, timeseries):
+        self._state = state
+        self.raise_notyetexist = raise_notyetexist
+        self._profiler = profiler
+        self._timeseries = timeseries
+
+    @property
+    def versions(self):
+        """collections.Counter: Version of each key."""
+
+        return self._state[1]
+
+    @property
+    def profiler(self):
+        """profiling.Profiler: Plugin run profiler."""
+
+        record_untracked_read()
+
+        return self._profiler
+
+    @property
+    def timeseries(self):
+        """timeseries.TimeSeriesStore: Histories of numeric keys."""
+
+        record_untracked_read()
+
+        return self._timeseries
+
+    def __getitem__(self, key):
+        return get_item(self._state, key, self.raise_notyetexist)
+
+    def __contains__(self, key):
+        data, versions = self._state
+        record_read(versions, key)
+
+        return key in data
+
+    def __iter__(self):
+        # Keys may be added later so the keys read depend on every key.
+        record_untracked_read()
+
+        return iter(self._state[0])
+
+    def __len__(self):
+        record_untracked_read()
+
+        return len(self._state[0])
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self._state[0])
+
+
 class DataStore(collections.UserDict):
-    """Shared data dictionary for plugins to use and store data."""
+    """Shared data dictionary for plugins to use and store data.
+
+    Each key has a version which increases when the key is changed.
+    Storing a value equal to the current one does not change the version.
+    A value changed in place must be stored again to change the version.
+
+    Changes are committed by replacing the data dict and versions
+    together instead of changing them in place. Readers never need a lock
+    and can take snapshots which are not affected by later commits.
+    """
 
     def __init__(self, raise_notyetexist=False, *args, **kwargs):
         self._raise_notyetexist = raise_notyetexist
+        self._profiler = None
+        self._timeseries = None
+        # Data dict and version of each key. Replaced on each commit.
+        self._state = ({}, collections.Counter())
+        self._write_lock = threading.Lock()
         super().__init__(*args, **kwargs)
 
+    @property
+    def data(self):
+        """dict: Committed data. Must not be changed in place."""
+
+        return self._state[0]
+
+    @data.setter
+    def data(self, data):
+        with self._write_lock:
+            versions = collections.Counter(self._state[1])
+            for key in set(self._state[0]) | set(data):
+                versions[key] += 1
+            self._state = (dict(data), versions)
+
+    @property
+    def versions(self):
+        """collections.Counter: Version of each key. Must not be changed in place."""
+
+        return self._state[1]
+
+    @property
+    def profiler(self):
+        """profiling.Profiler: Plugin run profiler.
+        Plugins can query run aggregates with data.profiler.summary().
+        """
+
+        record_untracked_read()
+
+        return self._profiler
+
+    @profiler.setter
+    def profiler(self, profiler):
+        self._profiler = profiler
+
+    @property
+    def timeseries(self):
+        """timeseries.TimeSeriesStore: Histories of numeric keys.
+        Each stat plugin run adds a sample of every tracked key
+        whether or not it changed.
+        Plugins can query them with data.timeseries.range() and aggregate().
+        """
+
+        record_untracked_read()
+
+        return self._timeseries
+
+    @timeseries.setter
+    def timeseries(self, timeseries):
+        self._timeseries = timeseries
+
     @property
     def raise_notyetexist(self):
         return self._raise_notyetexist
@@ -38,10 +265,95 @@ class DataStore(collections.UserDict):
             Result of the indexing.
         """
 
-        if key not in self.data:
-            if self._raise_notyetexist:
-                raise exceptions.NotYetExist(key)
-            else:
-                raise exceptions.NotFound(key)
+        return get_item(self._state, key, self._raise_notyetexist)
+
+    def __setitem__(self, key, value):
+        self.commit({key: value})
+
+    def __delitem__(self, key):
+        self.commit(deleted=(key,))
+
+    def __contains__(self, key):
+        data, versions = self._state
+        record_read(versions, key)
+
+        return key in data
+
+    def __iter__(self):
+        # Keys may be added later so the keys read depend on every key.
+        record_untracked_read()
+
+        return iter(self._state[0])
+
+    def __len__(self):
+        record_untracked_read()
+
+        return len(self._state[0])
+
+    def update(self, *args, **kwargs):
+        """Commit several keys at once."""
+
+        self.commit(dict(*args, **kwargs))
+
+    def commit(self, changes=None, deleted=()):
+        """Atomically apply changes to several keys.
+        Readers see either none or all of the changes.
+
+        Args:
+            changes (dict, optional): Defaults to None. Keys to set.
+            deleted (tuple, optional): Defaults to (). Keys to delete.
+
+        Raises:
+            KeyError: Raises if a key to delete does not exist.
+                No change is applied.
+        """
+
+        with self._write_lock:
+            data, versions = self._state
+            new_data = dict(data)
+            new_versions = collections.Counter(versions)
+
+            for key, value in (changes or {}).items():
+                if key in new_data:
+                    old_value = new_data[key]
+                    if old_value is not value and is_equal(old_value, value):
+                        continue
+
+                new_data[key] = value
+                new_versions[key] += 1
+
+            for key in deleted:
+                del new_data[key]
+                new_versions[key] += 1
+
+            self._state = (new_data, new_versions)
+
+    def record_timeseries(self):
+        """Add a sample of the current value of every tracked key
+        to the time series so samples are evenly spaced
+        whether or not the keys changed.
+        """
+
+        if self._timeseries is not None:
+            self._timeseries.record(self._state[0], time.time())
+
+    def copy(self):
+        """Get a data store with the same committed data.
+
+        Returns:
+            DataStore: Copy.
+        """
+
+        store = type(self)(self._raise_notyetexist)
+        store._state = self._state
+
+        return store
+
+    def snapshot(self):
+        """Get an immutable view of the committed data.
+
+        Returns:
+            DataSnapshot: Snapshot.
+        """
 
-        return self.data[key]
+        return DataSnapshot(self._state, self._raise_notyetexist, self._profiler, self._timeseries)
@@ -0,0 +1,158 @@
+"""This module resolves data dependencies between plugins.
+
+Plugins declare the data keys they produce and consume
+in the Data section of their description files:
+
+    [Data]
+    Produces = total_ec, cross_endo
+    Consumes = endos
+"""
+
+
+import networkx as nx
+
+from meguca import exceptions
+
+
+# Section of plugin description files which contains data declarations
+DATA_SECTION = 'Data'
+
+
+def get_declared_keys(plg, declaration):
+    """Get data keys declared in a plugin's description file.
+
+    Args:
+        plg (yapsy.PluginInfo): Plugin metadata object.
+        declaration (str): Declaration name (Produces/Consumes).
+
+    Returns:
+        list: Data keys.
+    """
+
+    try:
+        keys = plg.details[DATA_SECTION][declaration]
+    except KeyError:
+        return []
+
+    return [key.strip() for key in keys.split(',') if key.strip()]
+
+
+def build_graph(plugins, available_keys=None):
+    """Build a dependency graph of plugins from their data declarations.
+    An edge from plugin A to plugin B means B consumes data A produces.
+
+    Args:
+        plugins (list): Plugin metadata objects (yapsy.PluginInfo).
+        available_keys (set, optional): Defaults to None.
+            Data keys provided by plugins outside of the graph.
+
+    Raises:
+        exceptions.DependencyError: Raises if a key has more than one producer,
+            has no producer or if there is a dependency cycle.
+
+    Returns:
+        networkx.DiGraph: Dependency graph with plugin Ids as nodes.
+    """
+
+    available_keys = available_keys or set()
+    graph = nx.DiGraph()
+    producers = {}
+
+    for plg in plugins:
+        plg_id = plg.details['Core']['Id']
+        graph.add_node(plg_id, plg=plg)
+
+        for key in get_declared_keys(plg, 'Produces'):
+            if key in producers:
+                raise exceptions.DependencyError('Key "{}" is produced by both "{}" and "{}"'
+                                                 .format(key, producers[key], plg_id))
+            producers[key] = plg_id
+
+    for plg in plugins:
+        plg_id = plg.details['Core']['Id']
+
+        for key in get_declared_keys(plg, 'Consumes'):
+            if key in producers:
+                graph.add_edge(producers[key], plg_id)
+            elif key not in available_keys:
+                raise exceptions.DependencyError('Plugin "{}" consumes key "{}" which no plugin produces'
+                                                 .format(plg_id, key))
+
+    check_cycle(graph)
+
+    return graph
+
+
+def build_service_graph(service_deps):
+    """Build a dependency graph of services.
+    An edge from service A to service B means B's get() wants A.
+
+    Args:
+        service_deps (dict): Ids of services each service wants by service Id.
+
+    Raises:
+        exceptions.DependencyError: Raises if there is a dependency cycle.
+
+    Returns:
+        networkx.DiGraph: Dependency graph with service Ids as nodes.
+    """
+
+    graph = nx.DiGraph()
+
+    for plg_id, deps in service_deps.items():
+        graph.add_node(plg_id)
+        graph.add_edges_from((dep, plg_id) for dep in deps)
+
+    check_cycle(graph)
+
+    return graph
+
+
+def check_cycle(graph):
+    """Check a dependency graph for cycles.
+
+    Args:
+        graph (networkx.DiGraph): Dependency graph.
+
+    Raises:
+        exceptions.DependencyError: Raises if there is a dependency cycle.
+    """
+
+    try:
+        cycle = nx.find_cycle(graph)
+    except nx.NetworkXNoCycle:
+        return
+
+    raise exceptions.DependencyError('Dependency cycle between plugins: {}'
+                                     .format(' -> '.join(edge[0] for edge in cycle)))
+
+
+def sort_plugins(graph):
+    """Sort plugins in a dependency graph so producers come before consumers.
+    Ties are broken by plugin Id so the order is deterministic.
+
+    Args:
+        graph (networkx.DiGraph): Dependency graph.
+
+    Returns:
+        list: Plugin metadata objects (yapsy.PluginInfo).
+    """
+
+    return [graph.nodes[plg_id]['plg'] for plg_id in nx.lexicographical_topological_sort(graph)]
+
+
+def group_plugins(graph):
+    """Group plugins in a dependency graph into levels.
+    Plugins in the same level do not depend on each other
+    and only depend on plugins in earlier levels.
+
+    Args:
+        graph (networkx.DiGraph): Dependency graph.
+
+    Returns:
+        list: Levels as lists of plugin metadata objects (yapsy.PluginInfo)
+            sorted by plugin Id.
+    """
+
+    return [[graph.nodes[plg_id]['plg'] for plg_id in sorted(generation)]
+            for generation in nx.topological_generations(graph)]
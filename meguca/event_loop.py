@@ -0,0 +1,71 @@
+"""This module runs coroutines of plugins on a shared event loop.
+"""
+
+
+import asyncio
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopThread():
+    """An asyncio event loop running in a background thread.
+    The loop is only started when the first coroutine is submitted.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the event loop thread if it is not running."""
+
+        with self._lock:
+            if self.thread is not None:
+                return
+
+            self.loop = asyncio.new_event_loop()
+            started = threading.Event()
+            self.thread = threading.Thread(target=self._run_loop, args=(started,),
+                                           name='meguca-event-loop', daemon=True)
+            self.thread.start()
+            started.wait()
+
+        logger.debug('Started event loop thread')
+
+    def _run_loop(self, started):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(started.set)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the event loop.
+
+        Args:
+            coro (coroutine): Coroutine object.
+
+        Returns:
+            concurrent.futures.Future: Result of the coroutine.
+        """
+
+        self.start()
+
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        """Stop the event loop and wait for its thread to exit."""
+
+        with self._lock:
+            if self.thread is None:
+                return
+
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.thread = None
+            self.loop = None
+
+        logger.debug('Stopped event loop thread')
@@ -14,6 +14,10 @@ class PluginManagerError(Meguca):
     """Base exception for plugin management-related exceptions."""
 
 
+class DependencyError(PluginManagerError):
+    """Raise if dependencies between plugins cannot be resolved."""
+
+
 class PluginError(Meguca):
     """Base exception for plugin exceptions.
     If raises and not handled, plugin will automatically be blacklisted.
@@ -27,6 +31,7 @@ class NotFound(PluginError):
     """Raise if get a non-existent item from entry method's parameters."""
 
     def __init__(self, key):
+        super().__init__(key)
         self.non_existent_key = key
 
     def __str__(self):
@@ -35,3 +40,7 @@ class NotFound(PluginError):
 
 class NotYetExist(NotFound):
     """Raise if get a non-yet-exist item from entry method's parameters."""
+
+
+class TransportError(Meguca):
+    """Raise if a request cannot be served by a transport."""
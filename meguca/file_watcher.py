@@ -0,0 +1,68 @@
+"""This module detects changes of files so they can be reloaded
+without restarting Meguca.
+"""
+
+
+import logging
+import os
+
+
+logger = logging.getLogger(__name__)
+
+
+class FileWatcher():
+    """Detect added, modified and removed files in directories
+    by polling their modification time and size.
+
+    Args:
+        dirs (list): Directories to watch.
+        extensions (tuple): Extensions of files to watch.
+    """
+
+    def __init__(self, dirs, extensions):
+        self.dirs = dirs
+        self.extensions = extensions
+
+        # Modification time and size of watched files by absolute path
+        self.stats = self.scan()
+
+    def scan(self):
+        """Get modification time and size of watched files.
+
+        Returns:
+            dict: Modification time and size by absolute path.
+        """
+
+        stats = {}
+
+        for watched_dir in self.dirs:
+            for dir_path, dir_names, file_names in os.walk(watched_dir, followlinks=True):
+                for file_name in file_names:
+                    if not file_name.endswith(self.extensions):
+                        continue
+
+                    path = os.path.abspath(os.path.join(dir_path, file_name))
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    stats[path] = (stat.st_mtime_ns, stat.st_size)
+
+        return stats
+
+    def poll(self):
+        """Get files changed since the last poll.
+
+        Returns:
+            list: Absolute paths of changed files.
+        """
+
+        stats = self.scan()
+        changed = sorted(path for path in set(stats) | set(self.stats)
+                         if stats.get(path) != self.stats.get(path))
+        self.stats = stats
+
+        if changed:
+            logger.debug('Changed files: %r', changed)
+
+        return changed
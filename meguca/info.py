@@ -8,6 +8,12 @@ PLUGIN_DIR_PATH = 'meguca/plugins'
 # Plugin description file extension
 PLUGIN_DESC_EXT = 'plugin'
 
+# Cached result of plugin discovery so plugins are not imported on startup
+PLUGIN_MANIFEST_PATH = 'meguca/plugins/.manifest.json'
+
+# Default path to the checkpoint of plugin data and states
+CHECKPOINT_PATH = 'meguca/checkpoint.pkl.gz'
+
 # Path to general configuration file
 GENERAL_CONFIG_PATH = 'meguca/config/general_config.toml'
 
@@ -15,6 +21,9 @@ GENERAL_CONFIG_PATH = 'meguca/config/general_config.toml'
 LOGGING_CONFIG = {
     'version': 1,
 
+    # Core modules create their loggers before this config is applied.
+    'disable_existing_loggers': False,
+
     'formatters': {
         'MegucaFormatter': {
             'format': '[%(asctime)s %(name)s %(levelname)s] %(message)s'
@@ -38,8 +47,30 @@ LOGGING_CONFIG = {
         }
     },
 
+    # Third-party loggers kept enabled by disable_existing_loggers.
+    # yapsy logs tracebacks of plugins it could not load at DEBUG level.
+    'loggers': {
+        'yapsy': {
+            'level': 'WARNING'
+        }
+    },
+
     'root': {
         'level': 'DEBUG',
         'handlers': ['console', 'file']
     }
 }
+
+# Logging pipeline. Records are formatted and written by a background thread.
+LOG_PIPELINE_CONFIG = {
+    # Log large arguments in full instead of summarizing them
+    'verbose': False,
+    # Strings longer than this are truncated
+    'max_length': 500,
+    # Collections with more items than this are summarized
+    'max_items': 50,
+    # Records per second of each logger below WARNING. 0 to disable
+    'rate_limit': 20,
+    # Maximum number of records of a logger passed at once
+    'burst': 200
+}
@@ -0,0 +1,234 @@
+"""This module moves formatting and writing of log records off
+the threads which log them.
+
+Records are put on a queue by the only handler of the root logger
+and a background thread formats them and passes them to the configured
+handlers. Large arguments are summarized before they are queued unless
+verbose mode is on, and bursts of records from a logger are rate-limited.
+"""
+
+
+import atexit
+import collections.abc
+import copy
+import logging
+import logging.config
+import logging.handlers
+import queue
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+# Listener passing queued records to handlers. Started by setup().
+_listener = None
+
+
+# Types of arguments whose formatted text cannot change after a record is queued
+IMMUTABLE_TYPES = (str, bytes, int, float, complex, bool, type(None))
+
+
+class Summary(str):
+    """Summary of a log argument. Formats the same with %s and %r."""
+
+    def __repr__(self):
+        return str(self)
+
+
+def summarize(value, max_length, max_items):
+    """Summarize a large log argument.
+
+    Args:
+        value: Argument.
+        max_length (int): Strings longer than this are truncated.
+        max_items (int): Collections with more items than this are summarized.
+
+    Returns:
+        The argument or a summary of it.
+    """
+
+    if isinstance(value, (str, bytes)):
+        if len(value) > max_length:
+            return Summary('{!r}... ({} characters)'.format(value[:max_length], len(value)))
+        return value
+
+    if isinstance(value, collections.abc.Sized):
+        try:
+            size = len(value)
+        except Exception:
+            return value
+
+        if size > max_items:
+            return Summary('<{} with {} items>'.format(type(value).__name__, size))
+
+    return value
+
+
+def is_immutable(value):
+    """Check if the formatted text of a log argument cannot change later.
+
+    Args:
+        value: Argument.
+
+    Returns:
+        bool: True if the argument is immutable.
+    """
+
+    if isinstance(value, (tuple, frozenset)):
+        return all(is_immutable(item) for item in value)
+
+    return isinstance(value, IMMUTABLE_TYPES)
+
+
+class SummarizingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler which summarizes large arguments of records
+    and leaves formatting to the listener thread.
+    Records whose arguments could change before they are formatted,
+    such as lists or graphs, get their message built before they are queued.
+
+    Args:
+        handler_queue (queue.Queue): Queue of records.
+        verbose (bool, optional): Defaults to False. Log arguments in full.
+        max_length (int, optional): Defaults to 500. Strings longer than this are truncated.
+        max_items (int, optional): Defaults to 50. Collections with more items than this are summarized.
+    """
+
+    def __init__(self, handler_queue, verbose=False, max_length=500, max_items=50):
+        super().__init__(handler_queue)
+        self.verbose = verbose
+        self.max_length = max_length
+        self.max_items = max_items
+
+    def prepare(self, record):
+        # Other handlers of the logger may still use the record.
+        record = copy.copy(record)
+
+        if not self.verbose and record.args:
+            if isinstance(record.args, collections.abc.Mapping):
+                record.args = {key: summarize(value, self.max_length, self.max_items)
+                               for key, value in record.args.items()}
+            else:
+                record.args = tuple(summarize(value, self.max_length, self.max_items)
+                                    for value in record.args)
+
+        if record.args:
+            args = record.args.values() if isinstance(record.args, collections.abc.Mapping) else record.args
+            if not all(is_immutable(arg) for arg in args):
+                record.msg = record.getMessage()
+                record.args = None
+
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            record.msg = '{} [{} earlier messages suppressed]'.format(record.msg, suppressed)
+
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Drop records of a logger beyond a rate with a token bucket.
+    The next passed record of the logger tells how many were dropped.
+
+    Args:
+        rate (float): Records per second.
+        burst (int): Maximum number of records passed at once.
+        max_level (int, optional): Defaults to logging.INFO.
+            Records above this level are never dropped.
+    """
+
+    def __init__(self, rate, burst, max_level=logging.INFO):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_level = max_level
+
+        # Tokens and time of last update by logger name
+        self.buckets = {}
+        # Number of dropped records since the last passed one by logger name
+        self.dropped = collections.Counter()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+
+        now = time.monotonic()
+
+        with self._lock:
+            tokens, last_time = self.buckets.get(record.name, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last_time) * self.rate)
+
+            if tokens < 1:
+                self.buckets[record.name] = (tokens, now)
+                self.dropped[record.name] += 1
+                return False
+
+            self.buckets[record.name] = (tokens - 1, now)
+            record.suppressed = self.dropped.pop(record.name, 0)
+
+        return True
+
+
+def setup(logging_config, pipeline_config):
+    """Configure logging and move the root logger's handlers
+    behind a queue served by a background thread.
+
+    Args:
+        logging_config (dict): Configuration for logging.config.dictConfig.
+        pipeline_config (dict): Pipeline configuration.
+            verbose -- Log large arguments in full
+            max_length -- Strings longer than this are truncated
+            max_items -- Collections with more items than this are summarized
+            rate_limit -- Records per second of each logger below WARNING. 0 to disable
+            burst -- Maximum number of records of a logger passed at once
+    """
+
+    global _listener
+
+    stop()
+    logging.config.dictConfig(logging_config)
+
+    root_logger = logging.getLogger()
+    handlers = list(root_logger.handlers)
+
+    record_queue = queue.SimpleQueue()
+    queue_handler = SummarizingQueueHandler(record_queue,
+                                            verbose=pipeline_config.get('verbose', False),
+                                            max_length=pipeline_config.get('max_length', 500),
+                                            max_items=pipeline_config.get('max_items', 50))
+    if pipeline_config.get('rate_limit'):
+        queue_handler.addFilter(RateLimitFilter(pipeline_config['rate_limit'],
+                                                pipeline_config.get('burst', 100)))
+
+    for handler in handlers:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(record_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def set_verbose(verbose):
+    """Turn verbose mode on or off.
+
+    Args:
+        verbose (bool): Log large arguments in full.
+    """
+
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, SummarizingQueueHandler):
+            handler.verbose = verbose
+
+
+def stop():
+    """Write queued records and stop the background thread."""
+
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop)
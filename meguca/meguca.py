@@ -2,23 +2,62 @@
 """
 
 
+import argparse
 import logging
-import logging.config
+import concurrent.futures
+import contextlib
+import functools
+import importlib
+import inspect
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
 
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
 
 from meguca import info
 from meguca import exceptions
 from meguca import plugin
+from meguca import checkpoint
 from meguca import data
+from meguca import dependency
+from meguca import event_loop
+from meguca import file_watcher
+from meguca import log_pipeline
+from meguca import process_pool
+from meguca import profiling
+from meguca import scheduling
+from meguca import services
+from meguca import timeseries
 from meguca import utils
 
 
-logging.config.dictConfig(info.LOGGING_CONFIG)
+log_pipeline.setup(info.LOGGING_CONFIG, info.LOG_PIPELINE_CONFIG)
 
 logger = logging.getLogger(__name__)
 
 
+# Plugin categories which get a data snapshot instead of the data store.
+# They read data and return their changes.
+SNAPSHOT_CATEGORIES = ('Stat', 'View')
+
+# Extensions of files which are reloaded when they change
+RELOAD_EXTENSIONS = ('.py', '.toml')
+
+# Scheduler job Id of stat plugins
+STAT_PLUGINS_JOB_ID = 'stat_plugins'
+
+# Schedule configuration keys which are job options instead of trigger arguments
+JOB_OPTIONS = ('executor', 'max_instances', 'misfire_grace_time', 'priority')
+
+# Signals which gracefully stop Meguca
+STOP_SIGNALS = ('SIGTERM', 'SIGINT', 'SIGHUP')
+
+
 class Meguca():
     """Scheduling and plugin handling.
 
@@ -30,7 +69,29 @@ class Meguca():
 
     def __init__(self, plg_manager, general_config, plg_config):
 
-        self.scheduler = BackgroundScheduler()
+        profiling_conf = general_config.get('profiling', {})
+
+        # Priority of scheduled jobs by job Id.
+        # Higher priority jobs run first when an executor is busy.
+        self.job_priorities = {}
+        # Measures scheduling lag, misfires and overlaps of jobs.
+        self.job_metrics = scheduling.JobMetrics(window=profiling_conf.get('window', 100))
+
+        # Each executor has its own threads so time-critical jobs
+        # can be kept apart from bulk jobs.
+        scheduler_conf = general_config.get('scheduler', {})
+        executors_conf = dict(scheduler_conf.get('executors', {}))
+        executors_conf.setdefault('default', 10)
+        # Number of jobs handed to executors which have not finished.
+        self.running_jobs = scheduling.JobCounter()
+        executors = {name: scheduling.PriorityThreadPoolExecutor(max_workers, self.job_priorities,
+                                                                 self.job_metrics, self.running_jobs)
+                     for name, max_workers in executors_conf.items()}
+
+        self.executor_names = set(executors)
+        self.scheduler = BackgroundScheduler(executors=executors)
+        self.scheduler.add_listener(self.job_metrics.handle_event,
+                                    EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES | EVENT_JOB_ERROR)
 
         self.plg_manager = plg_manager
 
@@ -41,125 +102,568 @@ class Meguca():
         self.dry_run = dry_conf.get('enable', False)
         self.dry_plugins = dry_conf.get('plugins', [])
 
+        stat_concurrency_conf = general_config.get('stat_plugins_concurrency', {})
+        self.stat_concurrency = stat_concurrency_conf.get('enable', False)
+        self.stat_max_workers = stat_concurrency_conf.get('max_workers', 4)
+
+        stat_cache_conf = general_config.get('stat_plugins_cache', {})
+        self.stat_cache = stat_cache_conf.get('enable', True)
+
+        process_pool_conf = general_config.get('process_pool', {})
+        self.process_plugins = process_pool_conf.get('plugins', [])
+        self.process_max_workers = process_pool_conf.get('max_workers', None)
+
+        checkpoint_conf = general_config.get('checkpoint', {})
+        self.checkpoint_enable = checkpoint_conf.get('enable', False)
+        self.checkpoint_path = checkpoint_conf.get('path', info.CHECKPOINT_PATH)
+        self.checkpoint_interval = checkpoint_conf.get('interval', 600)
+        # The data dump is updated daily so an older checkpoint
+        # is not better than preparing plugins from the dump.
+        self.checkpoint_max_age = checkpoint_conf.get('max_age', 86400)
+
+        shutdown_conf = general_config.get('shutdown', {})
+        self.drain_timeout = shutdown_conf.get('drain_timeout', 30)
+
+        self.profiling_summary_interval = profiling_conf.get('summary_interval', 3600)
+
+        hot_reload_conf = general_config.get('hot_reload', {})
+        self.hot_reload = hot_reload_conf.get('enable', False)
+        self.hot_reload_interval = hot_reload_conf.get('interval', 5)
+        self.hot_reload_dirs = hot_reload_conf.get('dirs', [info.PLUGIN_DIR_PATH,
+                                                            os.path.dirname(info.GENERAL_CONFIG_PATH)])
+
         self.stat_plugins_schedule = general_config.get('stat_plugins_schedule', {})
         self.plugin_schedule = general_config.get('plugin_schedule', {})
 
-        # Holds all service objects
-        self.services = {}
+        # Holds all service objects.
+        # They are created when first injected.
+        self.services = services.ServiceRegistry(self.create_service)
+
+        # Compiled lists of dependencies to inject into entry methods
+        # by plugin Id and entry method name.
+        self.args_plans = {}
+
+        # Stat plugins sorted by data dependencies
+        # and grouped into levels of independent plugins.
+        # Resolved on preparation.
+        self.stat_plugins = None
+        self.stat_plugin_levels = None
+
+        # Ids of plugins restored from a checkpoint.
+        # They are not prepared again.
+        self.restored_plugins = set()
+
+        # Versions of data keys stat plugins read on their last run
+        # and the configuration version then, by plugin Id.
+        # Stat plugins whose inputs did not change are skipped.
+        self.stat_inputs = {}
+        # Increases when configuration is reloaded.
+        self.config_version = 0
+
+        # Runs independent stat plugins at the same time if enabled.
+        self.stat_executor = None
+        if self.stat_concurrency:
+            self.stat_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.stat_max_workers,
+                                                                       thread_name_prefix='stat')
+
+        # Runs CPU-bound stat plugins in worker processes.
+        # Workers are spawned instead of forked because
+        # the scheduler's threads may hold locks.
+        self.process_executor = None
+        self.encoding_cache = process_pool.EncodingCache()
+        if self.process_plugins:
+            mp_context = multiprocessing.get_context('spawn')
+            self.process_executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.process_max_workers,
+                                                                           mp_context=mp_context)
+
+        # Runs coroutine entry methods of plugins.
+        self.event_loop = event_loop.EventLoopThread()
+        # Coroutines of scheduled plugins which have not finished.
+        self.pending_coros = {}
+
+        # Detects changed plugin modules and configuration files.
+        # Created when plugins are scheduled if hot reload is enabled.
+        self.file_watcher = None
+
+        # Measures plugin runs.
+        self.profiler = profiling.Profiler(window=profiling_conf.get('window', 100),
+                                           trace_malloc=profiling_conf.get('trace_malloc', False))
 
         # Holds all data generated and used by plugins
         self.data = data.DataStore()
+        self.data.profiler = self.profiler
+
+        # Keeps histories of numeric data keys for views to query.
+        timeseries_conf = general_config.get('timeseries', {})
+        if timeseries_conf.get('keys'):
+            self.data.timeseries = timeseries.TimeSeriesStore(timeseries_conf['keys'],
+                                                              timeseries_conf.get('capacity', 10080),
+                                                              timeseries_conf.get('rollups', {'hourly': 720,
+                                                                                              'daily': 365}))
         # Holds general and plugins' configuration to pass to plugins.
         self.config = {'meguca': general_config,
                        'plugins': plg_config}
 
-    def get_args(self, entry_method):
+    def compile_args_plan(self, plg, entry_method):
+        """Compile the list of dependencies to inject into an entry method
+        from its signature. Signatures of lazy plugins are read from
+        the plugin manifest so their modules are not imported.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+            entry_method (str): Name of entry method.
+
+        Raises:
+            AttributeError: Raises if the plugin does not have the entry method.
+            exceptions.PluginError: Raises if the entry method wants
+                a dependency which does not exist.
+
+        Returns:
+            tuple: Names of parameters to inject.
+        """
+
+        params = plugin.get_entry_params(plg, entry_method)
+        if params is None:
+            raise AttributeError('Plugin "{}" has no entry method {}()'.format(plg.name, entry_method))
+
+        known_deps = {'data', 'config'} | set(self.services)
+
+        plan = []
+        for param in params:
+            if param['name'] in known_deps:
+                plan.append(param['name'])
+            elif param['required']:
+                raise exceptions.PluginError('Entry method {}() of plugin "{}" wants unknown dependency "{}"'
+                                             .format(entry_method, plg.name, param['name']))
+
+        return tuple(plan)
+
+    def get_args_plan(self, plg, entry_method):
+        """Get the compiled dependency plan of an entry method.
+        Plans are compiled on first use if they were not compiled on preparation.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+            entry_method (str): Name of entry method.
+
+        Returns:
+            tuple: Names of parameters to inject.
+        """
+
+        key = (plg.details['Core']['Id'], entry_method)
+
+        plan = self.args_plans.get(key)
+        if plan is None:
+            plan = self.compile_args_plan(plg, entry_method)
+            self.args_plans[key] = plan
+
+        return plan
+
+    def compile_args_plans(self):
+        """Compile dependency plans of entry methods of all enabled plugins.
+
+        Raises:
+            exceptions.PluginError: Raises if an entry method wants
+                a dependency which does not exist.
+        """
+
+        for plg_category, entry_methods in plugin.ENTRY_METHODS.items():
+            for plg in self.plg_manager.get_plugins(plg_category):
+                if plg.details['Core']['Id'] in self.blacklist:
+                    continue
+
+                for entry_method in entry_methods:
+                    if plugin.get_entry_params(plg, entry_method) is not None:
+                        self.get_args_plan(plg, entry_method)
+
+        logger.debug('Compiled dependency plans of entry methods')
+
+    def get_args(self, plan, snapshot=False):
         """Get arguments containing dependencies to inject into plugins via entry method.
 
         Args:
-            entry_method (func): Entry method object.
+            plan (tuple): Names of parameters to inject.
+            snapshot (bool, optional): Defaults to False. Inject a snapshot
+                of the data store which does not change during the run.
 
         Returns:
             Entry method arguments.
         """
 
-        entry_params = entry_method.__code__.co_varnames
         entry_args = {}
 
-        if 'data' in entry_params:
-            entry_args['data'] = self.data
-        if 'config' in entry_params:
-            entry_args['config'] = self.config
-
-        for param in entry_params:
-            if param in self.services:
+        for param in plan:
+            if param == 'data':
+                entry_args[param] = self.data.snapshot() if snapshot else self.data
+            elif param == 'config':
+                entry_args[param] = self.config
+            else:
                 entry_args[param] = self.services[param]
 
         return entry_args
 
-    def run_plugin(self, plg, entry_method):
-        """Run a plugin.
+    def call_plugin(self, plg, entry_method):
+        """Call a plugin's entry method without storing its returned data.
+        Coroutine entry methods are run on the event loop
+        and this call blocks until they finish.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+            entry_method (str): Name of entry method.
+
+        Returns:
+            Data returned by the entry method.
+        """
+
+        if entry_method == 'run' and plg.details['Core']['Id'] in self.process_plugins:
+            with self.profiler.profile(plg.name, entry_method):
+                return self.call_plugin_in_process(plg, entry_method)
+
+        method = getattr(plg.plugin_object, entry_method)
+        entry_args = self.get_args(self.get_args_plan(plg, entry_method),
+                                   snapshot=plg.category in SNAPSHOT_CATEGORIES)
+
+        if inspect.iscoroutinefunction(method):
+            coro = self.profiler.profile_coro(plg.name, entry_method, method(**entry_args))
+            return self.event_loop.submit(coro).result()
+
+        with self.profiler.profile(plg.name, entry_method):
+            return method(**entry_args)
+
+    def call_plugin_in_process(self, plg, entry_method):
+        """Call a plugin's entry method in a worker process.
+        Only data and config can be injected. Data is limited
+        to the keys the plugin declares it consumes.
 
         Args:
             plg (yapsy.PluginInfo): Plugin metadata object.
             entry_method (str): Name of entry method.
+
+        Raises:
+            exceptions.PluginError: Raises if the entry method wants a service.
+
+        Returns:
+            Data returned by the entry method.
         """
 
-        entry_method = getattr(plg.plugin_object, entry_method)
-        entry_args = self.get_args(entry_method)
+        plg_object = plg.plugin_object
+        entry_args = self.get_args(self.get_args_plan(plg, entry_method))
+
+        services = set(entry_args) - {'data', 'config'}
+        if services:
+            raise exceptions.PluginError('Plugin "{}" runs in a worker process and cannot use services {}'
+                                         .format(plg.name, sorted(services)))
+
+        if 'data' in entry_args:
+            consumed_keys = dependency.get_declared_keys(plg, 'Consumes')
+            entry_args['data'] = self.encoding_cache.encode_data(self.data.snapshot(), consumed_keys)
+
+        future = self.process_executor.submit(process_pool.run_plugin,
+                                              inspect.getfile(type(plg_object)),
+                                              type(plg_object).__name__,
+                                              plg_object.plg_config,
+                                              entry_method, entry_args)
+        return_data = future.result()
+
+        if return_data:
+            return process_pool.decode_data(return_data)
+
+        return return_data
 
-        return_data = entry_method(**entry_args)
+    def run_plugin(self, plg, entry_method):
+        """Run a plugin. Its returned data is committed at once.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+            entry_method (str): Name of entry method.
+        """
+
+        return_data = self.call_plugin(plg, entry_method)
 
         if return_data:
             self.data.update(return_data)
 
-    def run_stat_plugins(self, entry_method):
-        """Run stat plugins
+    def submit_plugin(self, plg, entry_method):
+        """Run a plugin with a coroutine entry method on the event loop
+        without waiting for it to finish. Returned data is stored
+        when the coroutine finishes.
+
+        A new run is skipped if the previous one has not finished yet.
 
         Args:
-            entry_method (str): Name of entry method
+            plg (yapsy.PluginInfo): Plugin metadata object.
+            entry_method (str): Name of entry method.
+        """
 
-        Raises:
-            exceptions.NotFound: Raises if failed to index data dict.
+        plg_id = plg.details['Core']['Id']
+
+        pending_coro = self.pending_coros.get(plg_id)
+        if pending_coro is not None and not pending_coro.done():
+            logger.warning('Previous run of plugin "%s" has not finished. Skipping', plg.name)
+            return
+
+        method = getattr(plg.plugin_object, entry_method)
+        entry_args = self.get_args(self.get_args_plan(plg, entry_method),
+                                   snapshot=plg.category in SNAPSHOT_CATEGORIES)
+
+        coro = self.profiler.profile_coro(plg.name, entry_method, method(**entry_args))
+        future = self.event_loop.submit(coro)
+        future.add_done_callback(functools.partial(self.store_coro_result, plg))
+        self.pending_coros[plg_id] = future
+
+    def store_coro_result(self, plg, future):
+        """Store data returned by a plugin's coroutine.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+            future (concurrent.futures.Future): Finished coroutine result.
         """
 
-        # Raises exceptions.NotYetExist instead of exceptions.NotFound
-        # if cannot find item in data dict
-        self.data.raise_notyetexist = True
+        try:
+            return_data = future.result()
+        except Exception:
+            logger.exception('Plugin "%s" raised an exception', plg.name)
+            return
+
+        if return_data:
+            self.data.update(return_data)
+
+    def resolve_stat_plugins(self):
+        """Sort stat plugins by their data dependencies.
 
-        # If a plugin wants to use data not yet created by other plugins,
-        # it will be put on queue to run again after the required data
-        # become available.
-        queue = []
+        Raises:
+            exceptions.DependencyError: Raises if a dependency cycle
+                or a missing producer is found.
+        """
+
+        plugins = []
         for plg in self.plg_manager.get_plugins('Stat'):
             if plg.details['Core']['Id'] not in self.blacklist:
-                    queue.append(plg)
-                    logger.debug('Stat plugin "%s" added to queue', plg.name)
+                plugins.append(plg)
             else:
                 logger.debug('Stat plugin "%s" blocked from running', plg.name)
 
-        logger.debug('Stat plugins run queue built')
+        # Keys produced by collectors are available before stat plugins run.
+        available_keys = set()
+        for plg in self.plg_manager.get_plugins('Collector'):
+            if plg.details['Core']['Id'] not in self.blacklist:
+                available_keys.update(dependency.get_declared_keys(plg, 'Produces'))
 
-        # Limit the number of iterations through the queue to 2 because
-        # after the first iteration, we should have all the data needed by
-        # plugins that use non-yet-exist data, the second iteration is to
-        # re-run those plugins with the now-exist data.
-        for i in range(2):
-            for plg in queue:
-                try:
+        graph = dependency.build_graph(plugins, available_keys)
+        self.stat_plugins = dependency.sort_plugins(graph)
+        self.stat_plugin_levels = dependency.group_plugins(graph)
+
+        logger.debug('Stat plugins run order: %r', [plg.name for plg in self.stat_plugins])
+
+    def run_stat_plugins(self, entry_method):
+        """Run stat plugins in dependency order.
+
+        Args:
+            entry_method (str): Name of entry method
+        """
+
+        if self.stat_plugins is None:
+            self.resolve_stat_plugins()
+
+        if self.stat_concurrency:
+            self.run_stat_plugins_concurrently(entry_method)
+        else:
+            for plg in self.stat_plugins:
+                if self.skip_stat_plugin(plg, entry_method):
+                    continue
+
+                with self.track_stat_inputs(plg, entry_method):
                     self.run_plugin(plg, entry_method)
-                    logger.info('Run stat plugin "%s"', plg.name)
-                    queue.remove(plg)
-                except exceptions.NotYetExist as non_existent_key:
-                    if i == 0:
-                        logger.debug('Did not find key "%s" in data dict. Put plugin "%s" on rerun queue', non_existent_key, plg.name)
-                    elif i == 1:
-                        raise exceptions.NotFound('Plugin "{}" wanted non-existent key "{}" from data dict.'.format(plg.name, non_existent_key))
-
-        # Return back to raising exceptions.NotFound if cannot find item in data dict
-        self.data.raise_notyetexist = False
-
-    def schedule(self, callable_obj, name, schedule_config, kwargs=None):
+                logger.info('Run stat plugin "%s"', plg.name)
+
+        # Skipped plugins keep their data so every tick is sampled.
+        if entry_method == 'run':
+            self.data.record_timeseries()
+
+    def run_stat_plugins_concurrently(self, entry_method):
+        """Run stat plugins of the same dependency level at the same time.
+        Returned data of a level is stored in plugin Id order
+        after the whole level finishes so the result is deterministic.
+
+        Args:
+            entry_method (str): Name of entry method
+        """
+
+        for level in self.stat_plugin_levels:
+            level = [plg for plg in level if not self.skip_stat_plugin(plg, entry_method)]
+            futures = [self.stat_executor.submit(self.call_stat_plugin, plg, entry_method)
+                       for plg in level]
+
+            # Wait for the whole level so a failed plugin
+            # does not leave others running into the next level.
+            concurrent.futures.wait(futures)
+
+            for plg, future in zip(level, futures):
+                return_data = future.result()
+                if return_data:
+                    self.data.update(return_data)
+                logger.info('Run stat plugin "%s"', plg.name)
+
+    def call_stat_plugin(self, plg, entry_method):
+        """Call a stat plugin's entry method and record the data it reads.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+            entry_method (str): Name of entry method.
+
+        Returns:
+            Data returned by the entry method.
+        """
+
+        with self.track_stat_inputs(plg, entry_method):
+            return self.call_plugin(plg, entry_method)
+
+    def is_stat_input_tracked(self, plg, entry_method):
+        """Check if the inputs of a stat plugin's entry method can be tracked.
+        Inputs are tracked for run() if it only uses data and config.
+        Services fetch data from outside so plugins using them always run.
+        Data read by coroutines is not tracked.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+            entry_method (str): Name of entry method.
+
+        Returns:
+            bool: True if the inputs can be tracked.
+        """
+
+        if not self.stat_cache or entry_method != 'run':
+            return False
+
+        if set(self.get_args_plan(plg, entry_method)) - {'data', 'config'}:
+            return False
+
+        return not inspect.iscoroutinefunction(getattr(plg.plugin_object, entry_method))
+
+    def skip_stat_plugin(self, plg, entry_method):
+        """Check if a stat plugin can be skipped because data and
+        configuration it read on its last run did not change.
+        Plugins which read no data or read untracked data such as
+        time series or profiler records are never skipped.
+        Its returned data from the last run stays in the data store.
+        Preparation is skipped for plugins restored from a checkpoint.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+            entry_method (str): Name of entry method.
+
+        Returns:
+            bool: True if the plugin can be skipped.
+        """
+
+        if entry_method == 'prepare' and plg.details['Core']['Id'] in self.restored_plugins:
+            logger.debug('Stat plugin "%s" was restored from checkpoint. Skipping preparation', plg.name)
+            return True
+
+        if entry_method != 'run':
+            return False
+
+        inputs = self.stat_inputs.get(plg.details['Core']['Id'])
+        if inputs is None:
+            return False
+
+        reads, config_version = inputs
+        if config_version != self.config_version:
+            return False
+
+        if not reads or data.UNTRACKED in reads:
+            return False
+
+        for key, version in reads.items():
+            if self.data.versions[key] != version:
+                return False
+
+        logger.debug('Inputs of stat plugin "%s" did not change. Skipping', plg.name)
+
+        return True
+
+    @contextlib.contextmanager
+    def track_stat_inputs(self, plg, entry_method):
+        """Record the data a stat plugin reads in a with block
+        if the plugin's run succeeds.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+            entry_method (str): Name of entry method.
+        """
+
+        plg_id = plg.details['Core']['Id']
+
+        if not self.is_stat_input_tracked(plg, entry_method):
+            yield
+            return
+
+        self.stat_inputs.pop(plg_id, None)
+        config_version = self.config_version
+
+        # Worker processes only get the keys the plugin declares it consumes.
+        if plg_id in self.process_plugins:
+            reads = {key: self.data.versions[key]
+                     for key in dependency.get_declared_keys(plg, 'Consumes')}
+            yield
+        else:
+            with data.track_reads() as reads:
+                yield
+
+        self.stat_inputs[plg_id] = (reads, config_version)
+
+    def schedule(self, callable_obj, name, schedule_config, kwargs=None, job_id=None):
         """Schedule a callable.
 
         Args:
             callable_obj: A callable object.
             name (str): Name to refer to in the scheduler.
-            schedule_config (dict): Schedule configuration.
+            schedule_config (dict): Schedule configuration. Besides trigger arguments
+                it can set the executor, max_instances, misfire_grace_time
+                and priority of the job.
             kwargs (optional): Defaults to None. Arguments to pass to the callable.
+            job_id (str, optional): Defaults to None. Id of the job to find it later.
+
+        Raises:
+            exceptions.ConfigError: Raises if the executor does not exist.
         """
 
         schedule_mode = schedule_config.pop('schedule_mode')
-        self.scheduler.add_job(callable_obj,
-                               trigger=schedule_mode,
-                               name=name,
-                               kwargs=kwargs,
-                               coalesce=True,
-                               **schedule_config)
+        priority = schedule_config.pop('priority', 0)
+
+        executor = schedule_config.get('executor', 'default')
+        if executor not in self.executor_names:
+            raise exceptions.ConfigError('Executor "{}" of "{}" does not exist'.format(executor, name))
+
+        job = self.scheduler.add_job(callable_obj,
+                                     trigger=schedule_mode,
+                                     id=job_id,
+                                     name=name,
+                                     kwargs=kwargs,
+                                     coalesce=True,
+                                     **schedule_config)
+        self.job_priorities[job.id] = priority
 
         logger.debug('Scheduled "%s" with "%s" and "%r"',
                      name, schedule_mode, schedule_config)
 
+    def get_run_callable(self, plg):
+        """Get the callable which runs a scheduled plugin.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+
+        Returns:
+            Callable to schedule.
+        """
+
+        # Coroutine entry methods do not hold a scheduler thread
+        # while they wait.
+        if inspect.iscoroutinefunction(plg.plugin_object.run):
+            return self.submit_plugin
+
+        return self.run_plugin
+
     def schedule_plugins(self, plg_category):
         """Schedule plugins by category.
 
@@ -172,11 +676,12 @@ class Meguca():
                 plg_id = plg.details['Core']['Id']
                 schedule_config = dict(self.plugin_schedule[plg_id])
 
-                self.schedule(self.run_plugin,
+                self.schedule(self.get_run_callable(plg),
                               kwargs={'plg': plg,
                                       'entry_method': 'run'},
                               name=plg.name,
-                              schedule_config=schedule_config)
+                              schedule_config=schedule_config,
+                              job_id=plg_id)
             else:
                 logger.debug('Plugin "%s" blocked from running', plg.name)
 
@@ -191,20 +696,95 @@ class Meguca():
         self.schedule(self.run_stat_plugins,
                       kwargs={'entry_method': 'run'},
                       name='Stat plugins',
-                      schedule_config=self.stat_plugins_schedule)
+                      schedule_config=dict(self.stat_plugins_schedule),
+                      job_id=STAT_PLUGINS_JOB_ID)
 
         self.schedule_plugins('View')
 
+        if self.profiling_summary_interval:
+            self.schedule(self.log_summary,
+                          name='Profiling summary',
+                          schedule_config={'schedule_mode': 'interval',
+                                           'seconds': self.profiling_summary_interval},
+                          job_id='profiling_summary')
+
+        if self.checkpoint_enable:
+            self.schedule(self.save_checkpoint,
+                          name='Checkpoint',
+                          schedule_config={'schedule_mode': 'interval',
+                                           'seconds': self.checkpoint_interval},
+                          job_id='checkpoint')
+
+        if self.hot_reload:
+            self.file_watcher = file_watcher.FileWatcher(self.hot_reload_dirs, RELOAD_EXTENSIONS)
+            self.schedule(self.reload_changed_files,
+                          name='Hot reload',
+                          schedule_config={'schedule_mode': 'interval',
+                                           'seconds': self.hot_reload_interval},
+                          job_id='hot_reload')
+
+    def log_summary(self):
+        """Log plugin run and scheduling metrics."""
+
+        self.profiler.log_summary()
+        self.job_metrics.log_summary()
+
     def load_services(self):
-        """Load service plugins."""
+        """Register service plugins and check dependencies between them.
+        Service objects are only created when a plugin first needs them.
+
+        Raises:
+            exceptions.DependencyError: Raises if services depend on each other.
+        """
 
         for plg in self.plg_manager.get_plugins('Service'):
-            args = self.get_args(plg.plugin_object.get)
-            self.services[plg.details['Core']['Id']] = plg.plugin_object.get(**args)
-            logger.debug('Loaded service "%s"', plg.name)
+            if plg.details['Core']['Id'] in self.blacklist:
+                logger.debug('Service "%s" blocked from loading', plg.name)
+                continue
+
+            self.services.register(plg.details['Core']['Id'], plg)
+            logger.debug('Registered service "%s"', plg.name)
+
+        service_deps = {}
+        for plg_id, plg in self.services.plugins.items():
+            service_deps[plg_id] = [dep for dep in self.get_args_plan(plg, 'get')
+                                    if dep in self.services]
+        dependency.build_service_graph(service_deps)
 
         logger.info('Loaded all services')
 
+    def remove_service(self, plg_id):
+        """Remove a service object and objects of services built from it
+        so they are all created again when next injected.
+
+        Args:
+            plg_id (str): Service Id.
+        """
+
+        removed = [plg_id]
+        for removed_id in removed:
+            for service_id, service_plg in self.services.plugins.items():
+                if service_id not in removed and removed_id in self.get_args_plan(service_plg, 'get'):
+                    removed.append(service_id)
+
+        # Dependent services are closed before the services they use.
+        for removed_id in reversed(removed):
+            self.services.remove(removed_id)
+
+    def create_service(self, plg):
+        """Create a service object.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+
+        Returns:
+            Service object.
+        """
+
+        args = self.get_args(self.get_args_plan(plg, 'get'))
+
+        return plg.plugin_object.get(**args)
+
     def prepare_stat_plugins(self):
         self.run_stat_plugins('prepare')
         logger.debug('Prepared "Stat" plugins')
@@ -217,7 +797,9 @@ class Meguca():
         """
 
         for plg in self.plg_manager.get_plugins(plg_category):
-            if plg.details['Core']['Id'] not in self.blacklist:
+            if plg.details['Core']['Id'] in self.restored_plugins:
+                logger.debug('Plugin "%s" was restored from checkpoint. Skipping preparation', plg.name)
+            elif plg.details['Core']['Id'] not in self.blacklist:
                 try:
                     self.run_plugin(plg, 'prepare')
                     logger.debug('Initialized plugin "%s"', plg.name)
@@ -229,11 +811,79 @@ class Meguca():
 
         logger.info('Prepared "%s" plugins', plg_category)
 
-    def prepare(self):
-        """Prepare everything before running."""
+    def get_plugin_states(self):
+        """Get states of plugins to save in a checkpoint.
+
+        Returns:
+            dict: State of each plugin by plugin Id.
+        """
+
+        plugin_states = {}
+
+        for plg in self.plg_manager.get_all_plugins():
+            plg_id = plg.details['Core']['Id']
+            if plg_id in self.blacklist or not hasattr(plg.plugin_object, 'checkpoint'):
+                continue
+
+            state = plg.plugin_object.checkpoint()
+            if state is not None:
+                plugin_states[plg_id] = state
+
+        return plugin_states
+
+    def save_checkpoint(self):
+        """Save plugin data and plugin states to the checkpoint file."""
+
+        # States are taken before data so a saved cursor never points past
+        # the saved data. At worst some collected data is collected again.
+        plugin_states = self.get_plugin_states()
+        data_dict = dict(self.data.snapshot())
+
+        checkpoint.save(self.checkpoint_path, data_dict, plugin_states)
+
+        logger.info('Saved checkpoint with %d data keys and %d plugin states',
+                    len(data_dict), len(plugin_states))
+
+    def restore_checkpoint(self):
+        """Restore plugin data and plugin states from the checkpoint file.
+
+        Returns:
+            bool: False if there is no usable checkpoint.
+        """
+
+        saved = checkpoint.load(self.checkpoint_path, self.checkpoint_max_age)
+        if saved is None:
+            return False
+
+        self.data.update(saved['data'])
+
+        for plg in self.plg_manager.get_all_plugins():
+            plg_id = plg.details['Core']['Id']
+            if plg_id in saved['plugins'] and plg_id not in self.blacklist:
+                plg.plugin_object.restore(saved['plugins'][plg_id])
+                self.restored_plugins.add(plg_id)
+                logger.debug('Restored state of plugin "%s"', plg.name)
+
+        logger.info('Restored checkpoint from %s', time.ctime(saved['time']))
+
+        return True
+
+    def prepare(self, warm_start=False):
+        """Prepare everything before running.
+
+        Args:
+            warm_start (bool, optional): Defaults to False. Restore plugin data
+                and states from the checkpoint. Restored plugins are not prepared again.
+        """
 
         self.load_services()
+        self.compile_args_plans()
+
+        if warm_start and not self.restore_checkpoint():
+            logger.warning('Could not warm start. Preparing all plugins')
+
         self.prepare_plugins('Collector')
+        self.resolve_stat_plugins()
         self.prepare_stat_plugins()
         self.prepare_plugins('View')
 
@@ -264,12 +914,269 @@ class Meguca():
             self.scheduler.start()
             logger.info('Scheduler started')
 
+    def reload_changed_files(self):
+        """Reload plugin modules and configuration files changed since the last check."""
+
+        for path in self.file_watcher.poll():
+            try:
+                self.reload_file(path)
+            except Exception:
+                logger.exception('Could not reload "%s"', path)
+
+    def reload_file(self, path):
+        """Reload a changed file.
+
+        Args:
+            path (str): Absolute path of the file.
+        """
+
+        if path == os.path.abspath(info.GENERAL_CONFIG_PATH):
+            self.reload_general_config()
+            return
+
+        plugins = [plg for plg in self.plg_manager.get_all_plugins()
+                   if plg.details['Core']['Id'] not in self.blacklist]
+        reloaded = False
+
+        for plg in plugins:
+            config_file = plg.details['Core'].get('ConfigFile')
+            if config_file and os.path.abspath(config_file) == path:
+                self.reload_plugin_config(plg)
+                reloaded = True
+
+        if path.endswith('.py'):
+            module_plugins = [plg for plg in plugins
+                              if os.path.abspath(plugin.get_module_file(plg.path)) == path]
+
+            # A helper module is reloaded along with plugins in its directory.
+            if not module_plugins:
+                for module in list(sys.modules.values()):
+                    module_file = getattr(module, '__file__', None)
+                    if module_file and os.path.abspath(module_file) == path:
+                        importlib.reload(module)
+                        module_plugins = [plg for plg in plugins
+                                          if os.path.dirname(os.path.abspath(plugin.get_module_file(plg.path)))
+                                          == os.path.dirname(path)]
+                        break
+
+            for plg in module_plugins:
+                self.reload_plugin(plg)
+                reloaded = True
+
+        if not reloaded:
+            logger.debug('No enabled plugin uses changed file "%s"', path)
+
+    def reload_plugin(self, plg):
+        """Reload a plugin's module and reschedule its job.
+        The old plugin object is kept if the new one cannot be used.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+        """
+
+        plg_id = plg.details['Core']['Id']
+        old_plugin_object = plg.plugin_object
+        old_plans = {key: plan for key, plan in self.args_plans.items() if key[0] == plg_id}
+        is_lazy = isinstance(plg, plugin.LazyPluginInfo)
+        old_entry_methods = plg.entry_methods if is_lazy else None
+
+        self.plg_manager.reload_plugin(plg)
+        self.stat_inputs.pop(plg_id, None)
+        for key in old_plans:
+            del self.args_plans[key]
+
+        try:
+            for entry_method in plugin.ENTRY_METHODS[plg.category]:
+                if plugin.get_entry_params(plg, entry_method) is not None:
+                    self.get_args_plan(plg, entry_method)
+        except exceptions.PluginError:
+            plg.plugin_object = old_plugin_object
+            if is_lazy:
+                plg.entry_methods = old_entry_methods
+            self.args_plans.update(old_plans)
+            raise
+
+        # Services are created again from the new code when next injected.
+        if plg.category == 'Service':
+            self.remove_service(plg_id)
+
+        self.reschedule_plugin(plg)
+
+        logger.info('Reloaded plugin "%s"', plg.name)
+
+    def reload_plugin_config(self, plg):
+        """Reload a plugin's configuration file.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+        """
+
+        self.config['plugins'][plg.name] = self.plg_manager.load_plugin_config(plg)
+        self.config_version += 1
+        self.reschedule_plugin(plg)
+
+        logger.info('Reloaded configuration of plugin "%s"', plg.name)
+
+    def reschedule_plugin(self, plg):
+        """Point a plugin's scheduled job to its current plugin object.
+        The job keeps its next run time.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+        """
+
+        plg_id = plg.details['Core']['Id']
+
+        if self.scheduler.get_job(plg_id) is not None:
+            self.scheduler.modify_job(plg_id, func=self.get_run_callable(plg))
+            logger.debug('Rescheduled plugin "%s"', plg.name)
+
+    def reload_general_config(self):
+        """Reload the general configuration file.
+        Only schedules are applied. Other settings need a restart.
+        """
+
+        general_config = utils.load_config(info.GENERAL_CONFIG_PATH)
+        self.config['meguca'] = general_config
+        self.config_version += 1
+
+        plugin_schedule = general_config.get('plugin_schedule', {})
+        for plg_id, schedule_config in plugin_schedule.items():
+            if schedule_config != self.plugin_schedule.get(plg_id):
+                self.reschedule_job(plg_id, schedule_config)
+        self.plugin_schedule = plugin_schedule
+
+        stat_plugins_schedule = general_config.get('stat_plugins_schedule', {})
+        if stat_plugins_schedule != self.stat_plugins_schedule:
+            self.reschedule_job(STAT_PLUGINS_JOB_ID, stat_plugins_schedule)
+        self.stat_plugins_schedule = stat_plugins_schedule
+
+        logger.info('Reloaded general configuration. Settings other than schedules apply after a restart')
+
+    def reschedule_job(self, job_id, schedule_config):
+        """Change the trigger of a scheduled job.
+
+        Args:
+            job_id (str): Job Id.
+            schedule_config (dict): Schedule configuration.
+        """
+
+        if self.scheduler.get_job(job_id) is None:
+            return
+
+        schedule_config = dict(schedule_config)
+        schedule_mode = schedule_config.pop('schedule_mode')
+        job_options = {option: schedule_config.pop(option) for option in JOB_OPTIONS
+                       if option in schedule_config}
+
+        self.job_priorities[job_id] = job_options.pop('priority', 0)
+        if job_options:
+            self.scheduler.modify_job(job_id, **job_options)
+        self.scheduler.reschedule_job(job_id, trigger=schedule_mode, **schedule_config)
+
+        logger.debug('Rescheduled job "%s" with "%s" and "%r"', job_id, schedule_mode, schedule_config)
+
+    def wait_for_jobs(self, timeout=None):
+        """Wait for running jobs and pending coroutines to finish.
+
+        Args:
+            timeout (float, optional): Defaults to None. Maximum seconds to wait.
+
+        Returns:
+            bool: False if the timeout passed before everything finished.
+        """
+
+        start = time.monotonic()
+
+        finished = self.running_jobs.wait(timeout)
+
+        pending_coros = [future for future in self.pending_coros.values() if not future.done()]
+        if pending_coros:
+            if timeout is not None:
+                timeout = max(timeout - (time.monotonic() - start), 0)
+            not_done = concurrent.futures.wait(pending_coros, timeout).not_done
+            finished = finished and not not_done
+
+        return finished
+
     def shutdown(self):
-        self.scheduler.shutdown()
+        """Stop scheduling new jobs, let running jobs finish
+        until the drain timeout passes and shut everything down.
+        """
+
+        if self.scheduler.running:
+            self.scheduler.pause()
+            logger.info('Waiting up to %s seconds for running jobs to finish', self.drain_timeout)
+
+            if not self.wait_for_jobs(self.drain_timeout):
+                logger.warning('%d jobs did not finish before the drain timeout', self.running_jobs.count)
+
+            self.scheduler.shutdown(wait=False)
+            logger.info('Scheduler stopped')
+
+            if self.checkpoint_enable:
+                try:
+                    self.save_checkpoint()
+                except Exception:
+                    logger.exception('Could not save checkpoint')
+
+        if self.stat_executor is not None:
+            self.stat_executor.shutdown()
+
+        if self.process_executor is not None:
+            self.process_executor.shutdown()
 
+        self.event_loop.stop()
+        self.services.close()
 
-def main():
-    """Initialize and start Meguca or clean-up and stop it."""
+
+def handle_stop_signals(stop_event):
+    """Set an event when a stop signal arrives.
+
+    Args:
+        stop_event (threading.Event): Event to set.
+    """
+
+    def handler(signum, frame):
+        logger.info('Received signal %s. Stopping', signal.Signals(signum).name)
+        stop_event.set()
+
+    for name in STOP_SIGNALS:
+        # Not every signal exists on every platform
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), handler)
+
+
+def parse_args(argv=None):
+    """Parse command-line arguments.
+
+    Args:
+        argv (list, optional): Defaults to None. Arguments. Uses sys.argv if None.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+
+    parser = argparse.ArgumentParser(description='Plugin-based NationStates data analysis software.')
+    parser.add_argument('--warm-start', action='store_true',
+                        help='restore plugin data and states from the last checkpoint '
+                             'instead of preparing plugins from scratch')
+    parser.add_argument('--verbose-log', action='store_true',
+                        help='log large data structures in full instead of summarizing them')
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Initialize and start Meguca or clean-up and stop it.
+
+    Args:
+        argv (list, optional): Defaults to None. Command-line arguments.
+    """
+
+    args = parse_args(argv)
+    if args.verbose_log:
+        log_pipeline.set_verbose(True)
 
     print('Starting Meguca')
     logger.info('Initialize Meguca')
@@ -281,20 +1188,24 @@ def main():
         logger.critical('Could not find general configuration file!')
         raise exceptions.ConfigError('Could not find general configuration file!')
 
-    plg_manager = plugin.PlgManager(info.PLUGIN_DIR_PATH, info.PLUGIN_DESC_EXT)
+    plg_manager = plugin.PlgManager(info.PLUGIN_DIR_PATH, info.PLUGIN_DESC_EXT, info.PLUGIN_MANIFEST_PATH)
     plg_config = plg_manager.load_plugins()
 
     meguca = Meguca(plg_manager, general_config, plg_config)
-    meguca.prepare()
+    meguca.prepare(warm_start=args.warm_start)
     logger.info('Prepared everything')
 
+    stop_event = threading.Event()
+    handle_stop_signals(stop_event)
+
     meguca.run()
 
-    try:
-        while True:
-            pass
-    except (KeyboardInterrupt, SystemExit):
-        meguca.shutdown()
+    # Sleep until a stop signal arrives instead of busy-waiting.
+    if not meguca.dry_run:
+        stop_event.wait()
+
+    meguca.shutdown()
+    logger.info('Meguca stopped')
 
 
 if __name__ == '__main__':
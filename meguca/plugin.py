@@ -3,7 +3,15 @@ to interact with the plugins.
 """
 
 
+import configparser
+import importlib.util
+import inspect
+import json
 import logging
+import os
+import re
+import sys
+import threading
 
 from yapsy import PluginFileLocator, PluginManager
 
@@ -11,11 +19,14 @@ from meguca import plugin_categories
 from meguca import utils
 from meguca import exceptions
 
-# TODO: Implement our own Plugin File Locator and Analyzer
 
 logger = logging.getLogger(__name__)
 
 
+# Version of the plugin manifest format
+MANIFEST_VERSION = 2
+
+
 PLUGIN_CATEGORIES = {
     'Service': plugin_categories.Service,
     'Collector': plugin_categories.Collector,
@@ -23,6 +34,349 @@ PLUGIN_CATEGORIES = {
     'View': plugin_categories.View
 }
 
+# Entry methods of each plugin category
+ENTRY_METHODS = {
+    'Service': ('get',),
+    'Collector': ('prepare', 'run', 'dry_run'),
+    'Stat': ('prepare', 'run', 'dry_run'),
+    'View': ('prepare', 'run', 'dry_run')
+}
+
+
+def load_module(module_path, module_name):
+    """Import a plugin module from its path.
+
+    Args:
+        module_path (str): Path to the module file without extension
+            or to the package directory.
+        module_name (str): Name to register the module as.
+
+    Returns:
+        module: Plugin module.
+    """
+
+    if os.path.isdir(module_path):
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(module_path, '__init__.py'),
+                                                      submodule_search_locations=[module_path])
+    else:
+        spec = importlib.util.spec_from_file_location(module_name, module_path + '.py')
+
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def find_plugin_class(module):
+    """Find the plugin class in a plugin module.
+    Like yapsy, the first class in alphabetical order which
+    subclasses a plugin category is used.
+
+    Args:
+        module (module): Plugin module.
+
+    Raises:
+        exceptions.PluginManagerError: Raises if no plugin class is found.
+
+    Returns:
+        tuple: Class name and category name.
+    """
+
+    for name in dir(module):
+        element = getattr(module, name)
+        if not isinstance(element, type):
+            continue
+
+        for category, category_class in PLUGIN_CATEGORIES.items():
+            if issubclass(element, category_class) and element is not category_class:
+                return name, category
+
+    raise exceptions.PluginManagerError('Could not find a plugin class in module "{}"'.format(module.__file__))
+
+
+def inspect_params(method):
+    """Get parameters of an entry method which can be injected.
+
+    Args:
+        method (callable): Entry method.
+
+    Returns:
+        list: Name of each parameter and whether it has no default value.
+    """
+
+    params = inspect.signature(method).parameters
+
+    return [{'name': param.name, 'required': param.default is param.empty}
+            for param in params.values()
+            if param.kind not in (param.VAR_POSITIONAL, param.VAR_KEYWORD)]
+
+
+def inspect_entry_methods(plugin_object, category):
+    """Get parameters of entry methods a plugin object has.
+
+    Args:
+        plugin_object: Plugin object.
+        category (str): Category name.
+
+    Returns:
+        dict: Parameters of each entry method. Read inspect_params.
+    """
+
+    return {entry_method: inspect_params(getattr(plugin_object, entry_method))
+            for entry_method in ENTRY_METHODS[category]
+            if hasattr(plugin_object, entry_method)}
+
+
+def get_entry_params(plg, entry_method):
+    """Get parameters of a plugin's entry method.
+    Lazy plugins answer from their manifest without importing their module.
+
+    Args:
+        plg (yapsy.PluginInfo): Plugin metadata object.
+        entry_method (str): Name of entry method.
+
+    Returns:
+        list: Parameters. Read inspect_params. None if the plugin
+            does not have the entry method.
+    """
+
+    if isinstance(plg, LazyPluginInfo) and plg.entry_methods is not None:
+        return plg.entry_methods.get(entry_method)
+
+    method = getattr(plg.plugin_object, entry_method, None)
+    if method is None:
+        return None
+
+    return inspect_params(method)
+
+
+def get_module_name(details):
+    """Get the name to register a plugin module as.
+
+    Args:
+        details (configparser.ConfigParser): Content of the description file.
+
+    Returns:
+        str: Module name.
+    """
+
+    return 'meguca_plugin_{}'.format(re.sub(r'\W', '_', details['Core'].get('Id', details['Core']['Name'])))
+
+
+def get_module_file(module_path):
+    """Get the file of a plugin module.
+
+    Args:
+        module_path (str): Path to the module file without extension
+            or to the package directory.
+
+    Returns:
+        str: Module file path.
+    """
+
+    if os.path.isdir(module_path):
+        return os.path.join(module_path, '__init__.py')
+
+    return module_path + '.py'
+
+
+class LazyPluginInfo():
+    """Plugin metadata object whose module is only imported
+    when its plugin object is first used.
+    Provides the attributes of yapsy.PluginInfo Meguca uses.
+
+    Args:
+        name (str): Plugin name.
+        path (str): Path to the module file without extension
+            or to the package directory.
+        details (configparser.ConfigParser): Content of the description file.
+        category (str): Category name.
+        class_name (str): Plugin class name.
+        entry_methods (dict, optional): Defaults to None. Parameters of
+            each entry method of the plugin class. Read inspect_entry_methods.
+            None if they are unknown.
+    """
+
+    def __init__(self, name, path, details, category, class_name, entry_methods=None):
+        self.name = name
+        self.path = path
+        self.details = details
+        self.category = category
+        self.class_name = class_name
+        self.entry_methods = entry_methods
+
+        self._plg_config = None
+        self._plugin_object = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self):
+        """bool: Whether the plugin module was imported."""
+
+        return self._plugin_object is not None
+
+    @property
+    def plugin_object(self):
+        """Plugin object. Its module is imported on first access."""
+
+        if self._plugin_object is None:
+            with self._lock:
+                if self._plugin_object is None:
+                    module = load_module(self.path, get_module_name(self.details))
+                    plugin_object = getattr(module, self.class_name)()
+                    plugin_object.plg_config = self._plg_config
+                    self._plugin_object = plugin_object
+
+                    logger.debug('Imported plugin "%s"', self.name)
+
+        return self._plugin_object
+
+    @plugin_object.setter
+    def plugin_object(self, plugin_object):
+        self._plugin_object = plugin_object
+
+    def set_config(self, plg_config):
+        """Set the plugin's configuration.
+
+        Args:
+            plg_config (dict): Plugin's configuration.
+        """
+
+        self._plg_config = plg_config
+        if self._plugin_object is not None:
+            self._plugin_object.plg_config = plg_config
+
+
+def scan_desc_files(plugin_dir, plugin_ext):
+    """Find plugin description files.
+
+    Args:
+        plugin_dir (str): Directory to find plugin description files.
+        plugin_ext (str): Plugin description file extension name.
+
+    Returns:
+        list: Description file paths.
+    """
+
+    desc_files = []
+
+    for dir_path, dir_names, file_names in os.walk(plugin_dir, followlinks=True):
+        for file_name in file_names:
+            if file_name.endswith('.' + plugin_ext):
+                desc_files.append(os.path.join(dir_path, file_name))
+
+    return sorted(desc_files)
+
+
+def discover_plugins(plugin_dir, plugin_ext):
+    """Find plugins by reading description files and importing their modules.
+
+    Args:
+        plugin_dir (str): Directory to find plugin description files.
+        plugin_ext (str): Plugin description file extension name.
+
+    Returns:
+        tuple: Plugin metadata objects (LazyPluginInfo) and plugin manifest.
+    """
+
+    plugins = []
+    manifest = {'version': MANIFEST_VERSION,
+                'desc_files': {},
+                'plugins': []}
+
+    for desc_file in scan_desc_files(plugin_dir, plugin_ext):
+        details = configparser.ConfigParser()
+        details.read(desc_file)
+        manifest['desc_files'][desc_file] = os.path.getmtime(desc_file)
+
+        if not details.has_option('Core', 'Name') or not details.has_option('Core', 'Module'):
+            logger.debug('Description file "%s" has no plugin name or module', desc_file)
+            continue
+
+        path = os.path.join(os.path.dirname(desc_file), details['Core']['Module'])
+        # Importing is the only way to know the plugin class and category.
+        module = load_module(path, get_module_name(details))
+        class_name, category = find_plugin_class(module)
+
+        plugin_object = getattr(module, class_name)()
+        plg = LazyPluginInfo(details['Core']['Name'].strip(), path, details, category, class_name,
+                             inspect_entry_methods(plugin_object, category))
+        plg.plugin_object = plugin_object
+        plugins.append(plg)
+
+        manifest['plugins'].append({'name': plg.name,
+                                    'path': path,
+                                    'details': {section: dict(details[section]) for section in details.sections()},
+                                    'category': plg.category,
+                                    'class_name': plg.class_name,
+                                    'entry_methods': plg.entry_methods,
+                                    'module_mtime': os.path.getmtime(get_module_file(path))})
+
+    return plugins, manifest
+
+
+def load_manifest(manifest_path, plugin_dir, plugin_ext):
+    """Load plugins from a plugin manifest without importing their modules.
+
+    Args:
+        manifest_path (str): Plugin manifest file path.
+        plugin_dir (str): Directory to find plugin description files.
+        plugin_ext (str): Plugin description file extension name.
+
+    Returns:
+        list: Plugin metadata objects (LazyPluginInfo).
+            None if the manifest does not exist or is outdated.
+    """
+
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        return None
+
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+
+    desc_files = scan_desc_files(plugin_dir, plugin_ext)
+    if sorted(manifest['desc_files']) != desc_files:
+        return None
+
+    try:
+        for desc_file in desc_files:
+            if os.path.getmtime(desc_file) != manifest['desc_files'][desc_file]:
+                return None
+
+        for plg_manifest in manifest['plugins']:
+            if os.path.getmtime(get_module_file(plg_manifest['path'])) != plg_manifest['module_mtime']:
+                return None
+    except OSError:
+        return None
+
+    plugins = []
+    for plg_manifest in manifest['plugins']:
+        details = configparser.ConfigParser()
+        details.read_dict(plg_manifest['details'])
+        plugins.append(LazyPluginInfo(plg_manifest['name'], plg_manifest['path'], details,
+                                      plg_manifest['category'], plg_manifest['class_name'],
+                                      plg_manifest['entry_methods']))
+
+    return plugins
+
+
+def save_manifest(manifest_path, manifest):
+    """Save a plugin manifest.
+
+    Args:
+        manifest_path (str): Plugin manifest file path.
+        manifest (dict): Plugin manifest.
+    """
+
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, manifest_path)
+
 
 class PlgManager():
     """Load plugins and provide an interface to access them.
@@ -30,15 +384,45 @@ class PlgManager():
         Args:
             plugin_dir (str): Directory to find plugin description files.
             plugin_ext (str): Plugin description file extension name.
+            manifest_path (str, optional): Defaults to None.
+                Plugin manifest file path. If provided, plugins are found
+                using a cached manifest and their modules are only imported
+                when they are first used. Otherwise yapsy imports every plugin.
         """
 
-    def __init__(self, plugin_dir, plugin_ext):
+    def __init__(self, plugin_dir, plugin_ext, manifest_path=None):
+        self.plugin_dir = plugin_dir
+        self.plugin_ext = plugin_ext
+        self.manifest_path = manifest_path
+
+        # Plugin metadata objects (LazyPluginInfo) if a manifest is used
+        self.plugins = None
+
         plg_analyzer = PluginFileLocator.PluginFileAnalyzerWithInfoFile('locator', plugin_ext)
         plg_locator = PluginFileLocator.PluginFileLocator(analyzers=[plg_analyzer])
         self.plugin_manager = PluginManager.PluginManager(categories_filter=PLUGIN_CATEGORIES,
                                                           directories_list=[plugin_dir],
                                                           plugin_locator=plg_locator)
 
+    def collect_plugins(self):
+        """Find plugins using the plugin manifest.
+        The manifest is rebuilt if it does not exist or is outdated.
+
+        Returns:
+            list: Plugin metadata objects (LazyPluginInfo).
+        """
+
+        plugins = load_manifest(self.manifest_path, self.plugin_dir, self.plugin_ext)
+
+        if plugins is None:
+            logger.info('Plugin manifest is missing or outdated. Rebuilding it')
+            plugins, manifest = discover_plugins(self.plugin_dir, self.plugin_ext)
+            save_manifest(self.manifest_path, manifest)
+        else:
+            logger.debug('Loaded plugin manifest "%s"', self.manifest_path)
+
+        return plugins
+
     def load_plugins(self):
         """Load plugins.
 
@@ -46,26 +430,28 @@ class PlgManager():
             dict: Plugins' configuration.
         """
 
-        self.plugin_manager.collectPlugins()
+        if self.manifest_path is not None:
+            self.plugins = self.collect_plugins()
+            plugins = self.plugins
+        else:
+            self.plugin_manager.collectPlugins()
+            plugins = self.plugin_manager.getAllPlugins()
 
         all_plg_config = {}
 
-        plugins = self.plugin_manager.getAllPlugins()
-
         if not plugins:
             logger.critical('Could not find any plugin!')
             raise exceptions.PluginManagerError('Could not find any plugin! Re-check your plugin directory.')
 
         for plg in plugins:
-            self.plugin_manager.activatePluginByName(plg.name)
+            if self.plugins is None:
+                self.plugin_manager.activatePluginByName(plg.name)
 
             if 'Id' not in plg.details['Core']:
                 raise exceptions.PluginManagerError('Could not find Id in description file of plugin "%s"', plg.name)
 
             try:
-                plg_config = utils.load_config(plg.details['Core']['ConfigFile'])
-                plg.plugin_object.plg_config = plg_config
-                all_plg_config[plg.name] = plg_config
+                all_plg_config[plg.name] = self.load_plugin_config(plg)
 
                 logger.debug('Loaded plugin "%s"', plg.name)
             except (IOError, KeyError):
@@ -75,6 +461,64 @@ class PlgManager():
 
         return all_plg_config
 
+    def load_plugin_config(self, plg):
+        """Load a plugin's configuration file and set it to the plugin.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+
+        Raises:
+            IOError: Raises if the configuration file cannot be read.
+            KeyError: Raises if the plugin has no configuration file.
+
+        Returns:
+            dict: Plugin's configuration.
+        """
+
+        plg_config = utils.load_config(plg.details['Core']['ConfigFile'])
+
+        if isinstance(plg, LazyPluginInfo):
+            plg.set_config(plg_config)
+        else:
+            plg.plugin_object.plg_config = plg_config
+
+        return plg_config
+
+    def reload_plugin(self, plg):
+        """Re-import a plugin's module and replace its plugin object.
+        Attributes of the old plugin object are copied to the new one
+        so state built on preparation is kept.
+
+        Args:
+            plg (yapsy.PluginInfo): Plugin metadata object.
+
+        Raises:
+            exceptions.PluginManagerError: Raises if the plugin's category changed.
+        """
+
+        # The new code is imported on first use anyway.
+        # Its entry methods are inspected then since they may have changed.
+        if isinstance(plg, LazyPluginInfo) and not plg.is_loaded:
+            plg.entry_methods = None
+            return
+
+        module = load_module(plg.path, get_module_name(plg.details))
+        class_name, category = find_plugin_class(module)
+        if category != plg.category:
+            raise exceptions.PluginManagerError('Category of plugin "{}" changed from {} to {}. Restart to load it'
+                                                .format(plg.name, plg.category, category))
+
+        old_plugin_object = plg.plugin_object
+        plugin_object = getattr(module, class_name)()
+        plugin_object.__dict__.update(old_plugin_object.__dict__)
+        plg.plugin_object = plugin_object
+
+        if isinstance(plg, LazyPluginInfo):
+            plg.class_name = class_name
+            plg.entry_methods = inspect_entry_methods(plugin_object, category)
+
+        logger.debug('Reloaded module of plugin "%s"', plg.name)
+
     def get_plugins(self, category):
         """Get plugins by category
 
@@ -85,7 +529,10 @@ class PlgManager():
             list: Plugin metadata objects (yapsy.PluginInfo).
         """
 
-        plugins = self.plugin_manager.getPluginsOfCategory(category)
+        if self.plugins is not None:
+            plugins = [plg for plg in self.plugins if plg.category == category]
+        else:
+            plugins = self.plugin_manager.getPluginsOfCategory(category)
 
         if not plugins:
             logger.warning('Could not find "%s" plugins', category)
@@ -99,4 +546,7 @@ class PlgManager():
             list: Plugin metadata objects (yapsy.PluginInfo).
         """
 
+        if self.plugins is not None:
+            return self.plugins
+
         return self.plugin_manager.getAllPlugins()
@@ -24,7 +24,10 @@ class Service(MegucaPlugin):
 
 
 class StandardPlugin(MegucaPlugin):
-    """Base class for standard plugins."""
+    """Base class for standard plugins.
+    Entry methods can also be coroutine functions (async def).
+    They are run on a shared event loop.
+    """
 
     def run(self):
         """Entry method."""
@@ -34,6 +37,21 @@ class StandardPlugin(MegucaPlugin):
     def prepare(self):
         """Entry method for initialization."""
 
+    def checkpoint(self):
+        """Return state to save in checkpoints such as cursors (optional).
+        It must be picklable. Plugins whose state is restored
+        on warm start are not prepared again.
+        """
+
+        return None
+
+    def restore(self, state):
+        """Restore state saved by checkpoint() on warm start (optional).
+
+        Args:
+            state: Saved state.
+        """
+
 
 class Collector(StandardPlugin):
     """Base class for plugins that collect data.
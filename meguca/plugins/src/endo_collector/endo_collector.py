@@ -166,14 +166,30 @@ class EndoDataCollector(plugin_categories.Collector):
             events = ns_api.get_world('happenings', shard_params=shard_params)['HAPPENINGS']['EVENT']
             logger.debug('Events from %s: %r', self.last_evt_time, events)
 
-            self.last_evt_time = events[0]['TIMESTAMP']
-
-            load_data_from_api(events, data['endos'],
+            # Update a copy so plugins reading the current graph
+            # never see a half-applied update.
+            endos = data['endos'].copy()
+            load_data_from_api(events, endos,
                                precision_mode=self.plg_config['precision']['precision_mode'])
+            data['endos'] = endos
+
+            # Move the cursor after the graph is stored so a checkpoint
+            # never has a cursor newer than its graph.
+            self.last_evt_time = events[0]['TIMESTAMP']
         except KeyError:
             logger.debug('There was no event from "%s"', self.last_evt_time)
             pass
 
+    def checkpoint(self):
+        """Save the time of the last loaded happening."""
+
+        return {'last_evt_time': self.last_evt_time}
+
+    def restore(self, state):
+        """Resume loading happenings from the saved time."""
+
+        self.last_evt_time = state['last_evt_time']
+
     def prepare(self, config):
         """Make an initial endorsement graph using the data dump."""
 
@@ -0,0 +1,229 @@
+"""An asyncio wrapper for NationStates API.
+"""
+
+
+import asyncio
+import concurrent.futures
+import functools
+
+import requests
+import requests.adapters
+
+from meguca import plugin_categories
+from meguca import profiling
+from meguca import transport
+from meguca.plugins.src.ns_api import cache
+from meguca.plugins.src.ns_api import decoders
+
+
+# Default maximum number of requests in flight and of open connections
+MAX_CONNECTIONS = 10
+
+
+class AsyncNSApiPlugin(plugin_categories.Service):
+    """Service plugin class."""
+
+    def get(self, ns_api, config):
+        """Share the rate limiter and pin of the NSApi service."""
+
+        ns_api_conf = config['meguca'].get('ns_api', {})
+
+        async_ns_api = AsyncNSApi(ns_api, ns_api_conf.get('async_max_connections', MAX_CONNECTIONS))
+        transport.mount(async_ns_api.session, config['meguca'].get('transport', {}))
+
+        return async_ns_api
+
+
+class AsyncNSApi():
+    """asyncio wrapper for NationStates API.
+
+    It is not a native asyncio client. Each request is sent with
+    requests on a thread pool as large as the connection pool,
+    which bounds the number of requests in flight. Coroutines waiting
+    for responds do not hold scheduler threads but every request
+    in flight still holds a pool thread.
+
+    Requests share the rate limiter, pin, decoder and respond cache
+    of a NSApi so both wrappers together stay within the rate limit.
+    Responds are not merged. Call close() when it is no longer used.
+
+    Args:
+        ns_api (NSApi): Wrapper to share the rate limiter, pin and decoder with.
+        max_connections (int, optional): Defaults to MAX_CONNECTIONS.
+            Maximum number of requests in flight and of open connections.
+
+    Examples:
+        Get endorsements of many nations concurrently:
+
+        >>> async_ns_api = AsyncNSApi(NSApi('Lampshade'))
+        >>> results = await asyncio.gather(*[async_ns_api.get_nation(name, 'endorsements')
+                                             for name in names])
+    """
+
+    def __init__(self, ns_api, max_connections=MAX_CONNECTIONS):
+        self.ns_api = ns_api
+        self.rate_limiter = ns_api.rate_limiter
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_connections,
+                                                pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_connections,
+                                                              thread_name_prefix='ns_api_async')
+
+    async def acquire(self):
+        """Wait for a free slot in the shared rate limiter without blocking the event loop."""
+
+        while True:
+            wait_time = self.rate_limiter.try_acquire()
+            if wait_time <= 0:
+                return
+
+            await asyncio.sleep(wait_time)
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """Run a blocking function on the thread pool.
+
+        Returns:
+            Result of the function.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def send_req(self, url):
+        """Send request. Waits until it can be sent without exceeding the rate limit.
+
+        Args:
+            url (str): URL to send.
+
+        Returns:
+            requests.Response: Respond.
+        """
+
+        await self.acquire()
+        # Headers are read when the request is sent
+        # so it carries the latest pin.
+        respond = await self.run_blocking(self.session.get, url, headers=self.ns_api.session.headers)
+        profiling.count_request('ns_api')
+
+        return respond
+
+    async def get_data(self, api_type="", name="", shards="", shard_params=None, typed=False):
+        """Get data about something from the API.
+
+        Args:
+            api_type (str, optional): API type. (nation/region/wa)
+                Leave empty for the world API.
+            name (str, optional): Name of nation/region.
+                Leave empty for the wa or world API.
+            shards (str|list): Shard.
+                Use a list for multiple shards.
+            shard_params (dict, optional): Shard parameters.
+            typed (bool, optional): Defaults to False. Convert values of known shards
+                into Python types. Read decoders.TYPED_DECODERS for more information.
+
+        Returns:
+            dict: Respond content.
+        """
+
+        result, key, ttl = cache.MISS, None, 0
+        if self.ns_api.cache is not None:
+            result, key, ttl = self.ns_api.cache.lookup(api_type, name, shards, shard_params)
+
+        if result is cache.MISS:
+            respond = await self.send_req(self.ns_api.get_url(api_type, name, shards, shard_params))
+            self.ns_api.check_respond(respond)
+            # Large responds are decoded off the event loop
+            result = await self.run_blocking(self.ns_api.process_xml, respond)
+
+            if key is not None:
+                self.ns_api.cache.store(key, result, ttl)
+
+        if typed:
+            return decoders.decode_typed(result)
+
+        return result
+
+    async def get_nation(self, name, shards, shard_params=None, typed=False):
+        """Get data about a nation. Read NSApi.get_nation for more information.
+
+        Args:
+            name (str): Name of nation.
+            shards (str|list): Shard.
+                Use a list for multiple shards.
+            shard_params (dict, optional): Shard parameters.
+            typed (bool, optional): Defaults to False. Convert values of known shards
+                into Python types.
+
+        Returns:
+            dict: Respond content.
+        """
+
+        return await self.get_data('nation', name, shards, shard_params, typed)
+
+    async def get_region(self, name, shards, shard_params=None, typed=False):
+        """Get data about a region. Read NSApi.get_region for more information.
+
+        Args:
+            name (str): Name of region.
+            shards (str|list): Shard.
+                Use a list for multiple shards.
+            shard_params (dict, optional): Shard parameters.
+            typed (bool, optional): Defaults to False. Convert values of known shards
+                into Python types.
+
+        Returns:
+            dict: Respond content.
+        """
+
+        return await self.get_data('region', name, shards, shard_params, typed)
+
+    async def get_wa(self, council, shards, shard_params=None, typed=False):
+        """Get data about the World Assembly. Read NSApi.get_wa for more information.
+
+        Args:
+            council (str): Council name.
+                ga -- General Assembly
+                sc -- Security Council
+            shards (str|list): Shard.
+                Use a list for multiple shards.
+            shard_params (dict, optional): Shard parameters.
+            typed (bool, optional): Defaults to False. Convert values of known shards
+                into Python types.
+
+        Returns:
+            dict: Respond content.
+        """
+
+        if council == 'ga':
+            name = '1'
+        elif council == 'sc':
+            name = '2'
+
+        return await self.get_data('wa', name, shards, shard_params, typed)
+
+    async def get_world(self, shards, shard_params=None, typed=False):
+        """Get data about the world. Read NSApi.get_world for more information.
+
+        Args:
+            shards (str|list): Shard.
+                Use a list for multiple shards.
+            shard_params (dict, optional): Shard parameters.
+            typed (bool, optional): Defaults to False. Convert values of known shards
+                into Python types.
+
+        Returns:
+            dict: Respond content.
+        """
+
+        return await self.get_data('', '', shards, shard_params, typed)
+
+    def close(self):
+        """Close connections and stop the thread pool."""
+
+        self.executor.shutdown(wait=True)
+        self.session.close()
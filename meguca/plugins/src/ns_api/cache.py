@@ -0,0 +1,231 @@
+"""LRU cache of NationStates API responds with a time-to-live per shard.
+"""
+
+
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+
+from meguca.plugins.src.ns_api import helpers
+
+
+logger = logging.getLogger(__name__)
+
+
+# Returned by ResponseCache.lookup() if a respond is not cached
+MISS = object()
+
+
+def get_cache_key(api_type, name, shards, shard_params):
+    """Get the canonical key of a request.
+
+    Args:
+        api_type (str): API type.
+        name (str): Name of nation/region.
+        shards (list): Shards.
+        shard_params (dict): Shard parameters.
+
+    Returns:
+        tuple: Key.
+    """
+
+    return (api_type, name.lower(), tuple(sorted(shard.lower() for shard in shards)),
+            helpers.canonical_params(shard_params))
+
+
+class ResponseCache():
+    """LRU cache of responds.
+
+    A respond is cached for the shortest time-to-live of its shards.
+    Requests with a shard which has no time-to-live are not cached.
+    An expired respond is served while it is refreshed in the background
+    if the rate limit budget is tight, until it is older than the
+    maximum stale time. Otherwise it is fetched again at once.
+
+    Args:
+        fetch_func (callable): Sends a request. Has the same
+            parameters as NSApi.get_data.
+        ttls (dict): Time-to-live in seconds by shard name.
+        max_size (int, optional): Defaults to 256. Maximum number of cached responds.
+        max_stale (float, optional): Defaults to 600. Maximum seconds
+            an expired respond is served for.
+        is_budget_tight (callable, optional): Defaults to None.
+            Returns True if few requests are left in the rate limit.
+    """
+
+    def __init__(self, fetch_func, ttls, max_size=256, max_stale=600, is_budget_tight=None):
+        self.fetch_func = fetch_func
+        self.ttls = {shard.lower(): ttl for shard, ttl in ttls.items()}
+        self.max_size = max_size
+        self.max_stale = max_stale
+        self.is_budget_tight = is_budget_tight or (lambda: False)
+
+        # Respond and expiry time by request key in least recently used order
+        self.entries = collections.OrderedDict()
+        # Keys being refreshed in the background
+        self.refreshing = set()
+        self.counters = collections.Counter()
+        self._lock = threading.Lock()
+        self._refresh_executor = None
+
+    def get_ttl(self, shards):
+        """Get the time-to-live of a request.
+
+        Args:
+            shards (list): Shards.
+
+        Returns:
+            float: Seconds. 0 if the request should not be cached.
+        """
+
+        return min(self.ttls.get(shard.lower(), 0) for shard in shards)
+
+    def get_data(self, api_type, name, shards, shard_params=None):
+        """Get data about something from the cache or the API.
+
+        Args:
+            api_type (str): API type.
+            name (str): Name of nation/region.
+            shards (str|list): Shard.
+            shard_params (dict, optional): Defaults to None. Shard parameters.
+
+        Returns:
+            dict: Respond content. Must not be changed.
+        """
+
+        result, key, ttl = self.lookup(api_type, name, shards, shard_params)
+        if result is not MISS:
+            return result
+
+        result = self.fetch_func(api_type, name, shards, shard_params)
+        if key is not None:
+            self.store(key, result, ttl)
+
+        return result
+
+    def lookup(self, api_type, name, shards, shard_params=None):
+        """Get a cached respond without fetching it on a miss
+        so callers can fetch it their own way and store it.
+
+        Args:
+            api_type (str): API type.
+            name (str): Name of nation/region.
+            shards (str|list): Shard.
+            shard_params (dict, optional): Defaults to None. Shard parameters.
+
+        Returns:
+            tuple: Cached respond or MISS, request key and time-to-live
+                to store a fetched respond with. The key is None
+                if the request is not cached.
+        """
+
+        shard_list = [shards] if isinstance(shards, str) else list(shards)
+        ttl = self.get_ttl(shard_list)
+        if ttl <= 0:
+            return MISS, None, ttl
+
+        key = get_cache_key(api_type, name, shard_list, shard_params)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                result, expiry_time = entry
+                self.entries.move_to_end(key)
+
+                if now < expiry_time:
+                    self.counters['hits'] += 1
+                    return result, key, ttl
+
+                if now < expiry_time + self.max_stale and self.is_budget_tight():
+                    self.counters['stale_hits'] += 1
+                    self.refresh(key, ttl, api_type, name, shards, shard_params)
+                    return result, key, ttl
+
+            self.counters['misses'] += 1
+
+        return MISS, key, ttl
+
+    def store(self, key, result, ttl):
+        """Cache a respond.
+
+        Args:
+            key (tuple): Request key.
+            result (dict): Respond content.
+            ttl (float): Time-to-live in seconds.
+        """
+
+        with self._lock:
+            self.entries[key] = (result, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def refresh(self, key, ttl, api_type, name, shards, shard_params):
+        """Fetch a respond again in the background.
+        Must be called with the lock held.
+
+        Args:
+            key (tuple): Request key.
+            ttl (float): Time-to-live in seconds.
+            api_type (str): API type.
+            name (str): Name of nation/region.
+            shards (str|list): Shard.
+            shard_params (dict): Shard parameters.
+        """
+
+        if key in self.refreshing:
+            return
+        self.refreshing.add(key)
+
+        if self._refresh_executor is None:
+            self._refresh_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+                                                                           thread_name_prefix='ns_api_cache')
+
+        def refresh_entry():
+            try:
+                self.store(key, self.fetch_func(api_type, name, shards, shard_params), ttl)
+            except Exception:
+                logger.exception('Could not refresh cached respond of %r', key)
+            else:
+                with self._lock:
+                    self.counters['refreshes'] += 1
+            finally:
+                with self._lock:
+                    self.refreshing.discard(key)
+
+        self._refresh_executor.submit(refresh_entry)
+
+    def stats(self):
+        """Get cache counters.
+
+        Returns:
+            dict: Number of hits, stale hits, misses, background refreshes
+                and cached responds.
+        """
+
+        with self._lock:
+            return {'hits': self.counters['hits'],
+                    'stale_hits': self.counters['stale_hits'],
+                    'misses': self.counters['misses'],
+                    'refreshes': self.counters['refreshes'],
+                    'size': len(self.entries)}
+
+    def close(self):
+        """Stop the background refresh thread."""
+
+        with self._lock:
+            refresh_executor = self._refresh_executor
+            self._refresh_executor = None
+
+        if refresh_executor is not None:
+            refresh_executor.shutdown(wait=True)
+
+    def clear(self):
+        """Remove all cached responds."""
+
+        with self._lock:
+            self.entries.clear()
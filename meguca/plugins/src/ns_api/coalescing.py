@@ -0,0 +1,164 @@
+"""Merge concurrent NationStates API requests about the same entity
+into one request with combined shards.
+"""
+
+
+import logging
+import threading
+import time
+
+from meguca.plugins.src.ns_api import exceptions
+from meguca.plugins.src.ns_api import helpers
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_batch_key(api_type, name, shard_params):
+    """Get the key of requests which can be merged.
+
+    Args:
+        api_type (str): API type.
+        name (str): Name of nation/region.
+        shard_params (dict): Shard parameters.
+
+    Returns:
+        tuple: Key.
+    """
+
+    return (api_type, name, helpers.canonical_params(shard_params))
+
+
+def slice_result(result, shards, batch_shards):
+    """Get the part of a combined respond a request asked for.
+    Keys which do not belong to any shard of the batch, like the root
+    element's attributes or tags named differently from their shard,
+    are kept in every part.
+
+    Args:
+        result (dict): Combined respond content.
+        shards (list): Shards of the request.
+        batch_shards (list): Shards of all requests in the batch.
+
+    Returns:
+        dict: Respond content of the request.
+    """
+
+    wanted_keys = {shard.upper() for shard in shards}
+    batch_keys = {shard.upper() for shard in batch_shards}
+
+    return {key: value for key, value in result.items()
+            if key in wanted_keys or key not in batch_keys}
+
+
+class Batch():
+    """Requests about the same entity waiting to be sent together."""
+
+    def __init__(self):
+        self.shards = []
+        self.request_num = 0
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+    def add(self, shards):
+        """Add shards of a request.
+
+        Args:
+            shards (list): Shards.
+        """
+
+        for shard in shards:
+            if shard not in self.shards:
+                self.shards.append(shard)
+        self.request_num += 1
+
+
+class Coalescer():
+    """Merge requests for the same API type, name and shard parameters
+    which arrive within a time window into one request.
+
+    The first request of a batch waits for the window to pass
+    and then sends the combined request. Each request gets
+    the part of the combined respond it asked for.
+
+    Args:
+        request_func (callable): Sends a request. Has the same
+            parameters as NSApi.get_data.
+        window (float): Seconds to wait for more requests.
+    """
+
+    def __init__(self, request_func, window):
+        self.request_func = request_func
+        self.window = window
+
+        # Batches which are still open to more requests by key
+        self.pending = {}
+        self._lock = threading.Lock()
+
+    def get_data(self, api_type, name, shards, shard_params=None):
+        """Get data about something from the API via a batch.
+
+        Args:
+            api_type (str): API type.
+            name (str): Name of nation/region.
+            shards (str|list): Shard.
+            shard_params (dict, optional): Defaults to None. Shard parameters.
+
+        Returns:
+            dict: Respond content.
+        """
+
+        shards = [shards] if isinstance(shards, str) else list(shards)
+        key = get_batch_key(api_type, name, shard_params)
+
+        with self._lock:
+            batch = self.pending.get(key)
+            is_leader = batch is None
+            if is_leader:
+                batch = Batch()
+                self.pending[key] = batch
+            batch.add(shards)
+
+        if is_leader:
+            self.send_batch(key, batch, api_type, name, shard_params)
+        else:
+            batch.done.wait()
+
+        if batch.exception is not None:
+            # One invalid shard fails the whole combined request
+            # so each request is tried on its own.
+            if batch.request_num > 1 and isinstance(batch.exception, exceptions.NSAPIReqError):
+                return self.request_func(api_type, name, shards, shard_params)
+            raise batch.exception
+
+        if batch.request_num == 1:
+            return batch.result
+
+        return slice_result(batch.result, shards, batch.shards)
+
+    def send_batch(self, key, batch, api_type, name, shard_params):
+        """Wait for the window to pass and send the combined request of a batch.
+
+        Args:
+            key (tuple): Batch key.
+            batch (Batch): Batch.
+            api_type (str): API type.
+            name (str): Name of nation/region.
+            shard_params (dict): Shard parameters.
+        """
+
+        time.sleep(self.window)
+
+        with self._lock:
+            del self.pending[key]
+
+        if batch.request_num > 1:
+            logger.debug('Coalesced %d requests for shards %r', batch.request_num, batch.shards)
+
+        try:
+            batch.result = self.request_func(api_type, name, batch.shards, shard_params)
+        except Exception as e:
+            batch.exception = e
+        finally:
+            batch.done.set()
@@ -0,0 +1,298 @@
+"""Decode NationStates API responds.
+
+Responds are parsed with the C-accelerated ElementTree parser
+into the same dictionaries xmltodict makes without its overhead.
+Typed decoding converts values of known shards into ready-to-use
+Python types. Streamed responds are parsed incrementally
+and their shards are yielded as soon as they are complete.
+"""
+
+
+import collections
+import xml.etree.ElementTree as ET
+
+import xmltodict
+
+
+def add_value(result, tag, value):
+    """Add a value to a dictionary. Values of repeated tags are put into a list.
+
+    Args:
+        result (dict): Dictionary.
+        tag (str): Tag.
+        value: Value.
+    """
+
+    if tag in result:
+        existing = result[tag]
+        if isinstance(existing, list):
+            existing.append(value)
+        else:
+            result[tag] = [existing, value]
+    else:
+        result[tag] = value
+
+
+def element_to_dict(elem):
+    """Convert an element into the value xmltodict makes of it.
+
+    Args:
+        elem (xml.etree.ElementTree.Element): Element.
+
+    Returns:
+        dict|str: Value. None if the element is empty.
+    """
+
+    result = {'@' + attr: value for attr, value in elem.attrib.items()}
+
+    for child in elem:
+        add_value(result, child.tag, element_to_dict(child))
+
+    text = elem.text.strip() if elem.text else ''
+
+    if not result:
+        return text or None
+    if text:
+        result['#text'] = text
+
+    return result
+
+
+def decode_etree(text):
+    """Decode a respond with ElementTree.
+
+    Args:
+        text (str|bytes): Respond content.
+
+    Returns:
+        dict: Content of the root element.
+    """
+
+    return element_to_dict(ET.fromstring(text))
+
+
+def decode_xmltodict(text):
+    """Decode a respond with xmltodict.
+
+    Args:
+        text (str|bytes): Respond content.
+
+    Returns:
+        dict: Content of the root element.
+    """
+
+    resp_dict = xmltodict.parse(text)
+    # Discard root XML element
+    resp_dict = resp_dict[list(resp_dict.keys())[0]]
+
+    return resp_dict
+
+
+# Decoders by name
+DECODERS = {
+    'etree': decode_etree,
+    'xmltodict': decode_xmltodict
+}
+
+
+def as_list(value):
+    """Get a value which may be repeated as a list."""
+
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+
+    return [value]
+
+
+def decode_nation_list(value):
+    """Decode a list of nations into a set.
+    Lists are separated by commas (WA members, world nations)
+    or colons (region nations).
+    """
+
+    if not value:
+        return set()
+
+    return set(value.split(',' if ',' in value else ':'))
+
+
+def decode_int(value):
+    """Decode an integer."""
+
+    return int(value)
+
+
+def decode_census_scale(scale):
+    """Decode a census scale into a dictionary of measures
+    or a tuple of (timestamp, score) points if it is a history (mode=history).
+    """
+
+    if 'POINT' in scale:
+        return tuple((int(point['TIMESTAMP']), float(point['SCORE'])) for point in as_list(scale['POINT']))
+
+    return {measure: float(score) for measure, score in scale.items()
+            if not measure.startswith('@')}
+
+
+def decode_census(value):
+    """Decode census scales by scale Id. Read decode_census_scale.
+    E.g: {66: {'SCORE': 3.34, 'RANK': 120.0}}
+    or {66: ((1500000000, 3.2), (1500086400, 3.34))} for histories.
+    """
+
+    if not value:
+        return {}
+
+    return {int(scale['@id']): decode_census_scale(scale)
+            for scale in as_list(value.get('SCALE'))}
+
+
+def decode_happenings(value):
+    """Decode events into a tuple of (timestamp, text) tuples. Newest first."""
+
+    if not value:
+        return ()
+
+    return tuple((int(event['TIMESTAMP']), event['TEXT']) for event in as_list(value.get('EVENT')))
+
+
+# Typed decoders by tag of shard
+TYPED_DECODERS = {
+    'MEMBERS': decode_nation_list,
+    'NATIONS': decode_nation_list,
+    'ENDORSEMENTS': decode_nation_list,
+    'NUMNATIONS': decode_int,
+    'NUMREGIONS': decode_int,
+    'POPULATION': decode_int,
+    'CENSUS': decode_census,
+    'HAPPENINGS': decode_happenings
+}
+
+
+def decode_typed(resp_dict):
+    """Convert values of known shards into Python types.
+    Other values are not changed.
+
+    Args:
+        resp_dict (dict): Decoded respond content.
+
+    Returns:
+        dict: Respond content with typed values.
+    """
+
+    return {tag: TYPED_DECODERS[tag](value) if tag in TYPED_DECODERS else value
+            for tag, value in resp_dict.items()}
+
+
+class NationListBuilder():
+    """Split a list of nations into a set while its text arrives
+    so the whole list never exists as one string.
+    """
+
+    def __init__(self):
+        self.nations = set()
+        # Unfinished name at the end of the last piece of text
+        self.rest = ''
+
+    def start(self, tag, attrib):
+        pass
+
+    def data(self, text):
+        names = (self.rest + text).replace(':', ',').split(',')
+        self.rest = names.pop()
+        self.nations.update(names)
+
+    def end(self, tag):
+        pass
+
+    def close(self):
+        self.nations.add(self.rest)
+        self.nations.discard('')
+
+        return self.nations
+
+
+class ShardTarget():
+    """Parser target which collects shards of a respond
+    as soon as their end tags arrive.
+
+    Attributes of the root element are collected as '@' keys like xmltodict does.
+    Each shard is built on its own and released once it is collected
+    so the whole respond is never kept as a tree.
+
+    Args:
+        typed (bool, optional): Defaults to False. Convert values of known shards
+            into Python types. Nation lists are split while they are parsed.
+    """
+
+    def __init__(self, typed=False):
+        self.typed = typed
+        self.depth = 0
+        self.builder = None
+        # Complete (tag, value) pairs
+        self.shards = collections.deque()
+
+    def start(self, tag, attrib):
+        self.depth += 1
+
+        if self.depth == 1:
+            self.shards.extend(('@' + attr, value) for attr, value in attrib.items())
+            return
+
+        if self.depth == 2:
+            if self.typed and TYPED_DECODERS.get(tag) is decode_nation_list:
+                self.builder = NationListBuilder()
+            else:
+                self.builder = ET.TreeBuilder()
+
+        self.builder.start(tag, attrib)
+
+    def data(self, text):
+        if self.depth >= 2:
+            self.builder.data(text)
+
+    def end(self, tag):
+        if self.depth >= 2:
+            self.builder.end(tag)
+
+        if self.depth == 2:
+            value = self.builder.close()
+            if isinstance(value, ET.Element):
+                value = element_to_dict(value)
+                if self.typed and tag in TYPED_DECODERS:
+                    value = TYPED_DECODERS[tag](value)
+
+            self.shards.append((tag, value))
+            self.builder = None
+
+        self.depth -= 1
+
+    def close(self):
+        pass
+
+
+def iter_shards(chunks, typed=False):
+    """Parse a respond incrementally and yield its shards as they arrive.
+
+    Args:
+        chunks (iterable): Pieces of respond content as bytes.
+        typed (bool, optional): Defaults to False. Convert values of known shards
+            into Python types.
+
+    Yields:
+        tuple: Tag and value of a shard or attribute of the root element.
+    """
+
+    target = ShardTarget(typed)
+    parser = ET.XMLParser(target=target)
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        while target.shards:
+            yield target.shards.popleft()
+
+    parser.close()
+    while target.shards:
+        yield target.shards.popleft()
@@ -24,3 +24,10 @@ def construct_url(params, url_beginning, param_delim, param_val_delim):
         url += param_delim
 
     return url
+
+
+def canonical_params(shard_params):
+    """Get a hashable form of shard parameters which does not depend on their order."""
+
+    return tuple(sorted((param, tuple(value) if isinstance(value, list) else value)
+                        for param, value in (shard_params or {}).items()))
@@ -2,114 +2,280 @@
 """
 
 
+import threading
+
 import requests
-import xmltodict
+import requests.adapters
 
 from meguca import plugin_categories
+from meguca import profiling
+from meguca import transport
 from meguca import utils
+from meguca.plugins.src.ns_api import cache
+from meguca.plugins.src.ns_api import coalescing
+from meguca.plugins.src.ns_api import decoders
 from meguca.plugins.src.ns_api import exceptions
 from meguca.plugins.src.ns_api import helpers
+from meguca.plugins.src.ns_api import rate_limiter
 
 
-# Maximum number of requests to send in 30 sec
+# Maximum number of requests to send in a rate limit period
 RATE_LIMIT = 50
+# Rate limit period in seconds
+RATE_LIMIT_PERIOD = 30
+
+# Default time-to-live in seconds of cached responds of slow-changing shards
+CACHE_TTLS = {
+    'numnations': 300,
+    'delegate': 300,
+    'founder': 3600
+}
+
+# Stale cached responds are served while they are refreshed
+# if more than this part of the rate limit is used.
+CACHE_TIGHT_BUDGET = 0.8
+
+# Default seconds to wait for concurrent requests to merge
+# when stat plugins run concurrently. Sequential plugins never
+# send concurrent requests so coalescing is off by default otherwise.
+COALESCE_WINDOW = 0.05
+
+# Default maximum number of connections kept open for reuse
+# by concurrent requests
+POOL_SIZE = 10
+
+# Size in bytes of pieces of streamed responds fed into the parser
+STREAM_CHUNK_SIZE = 64 * 1024
 
 API_URL_BEGINNING = "https://www.nationstates.net/cgi-bin/api.cgi?"
 API_PARAM_DELIMITER = ";"
 API_VALUE_DELIMITER = "+"
 
 
+def check_status(respond, rate_limiter):
+    """Check the HTTP code of a respond.
+
+    Args:
+        respond (requests.Response): Respond.
+        rate_limiter (rate_limiter.RateLimiter): Blocked if the rate limit
+            was exceeded.
+
+    Raises:
+        Exceptions will be raised if the respond's HTTP code is not 200.
+        Read exceptions for more information.
+    """
+
+    if respond.status_code == 200:
+        return
+    elif respond.status_code == 400:
+        raise exceptions.NSAPIReqError('Empty shard causes error when get world data')
+    elif respond.status_code == 404:
+        raise exceptions.NSAPIReqError('This region or nation does not exist')
+    elif respond.status_code == 403:
+        raise exceptions.NSAPIAuthError('Incorrect password')
+    elif respond.status_code == 429:
+        # In case someone override the internal
+        # ratelimiting mechanism
+        retry_after = respond.headers['X-Retry-After']
+        rate_limiter.block(float(retry_after))
+        raise exceptions.NSAPIRateLimitError('NationStates has temporarily banned you for '
+                                             'violating the rate limit. '
+                                             'Re-try after {}'.format(retry_after))
+    elif respond.status_code == 500:
+        raise exceptions.NSAPIError('NS API returned an internal server error')
+    else:
+        raise exceptions.NSAPIError('An unknown API error has occured')
+
+
 class NSApiPlugin(plugin_categories.Service):
     """Service plugin class."""
 
     def get(self, config):
         """Automatically collect pin for private requests if password is provided."""
 
+        ns_api_conf = config['meguca'].get('ns_api', {})
+        cache_conf = ns_api_conf.get('cache', {})
+        cache_ttls = None
+        if cache_conf.get('enable', True):
+            cache_ttls = dict(CACHE_TTLS, **cache_conf.get('ttls', {}))
+
+        coalesce_window = 0
+        if config['meguca'].get('stat_plugins_concurrency', {}).get('enable', False):
+            coalesce_window = COALESCE_WINDOW
+
+        ns_api = NSApi(config['meguca']['auth']['user_agent'],
+                       config['meguca']['auth'].get('password'),
+                       coalesce_window=ns_api_conf.get('coalesce_window', coalesce_window),
+                       cache_ttls=cache_ttls,
+                       cache_size=cache_conf.get('max_size', 256),
+                       cache_max_stale=cache_conf.get('max_stale', 600),
+                       xml_decoder=ns_api_conf.get('xml_decoder', 'etree'),
+                       pool_size=ns_api_conf.get('pool_size', POOL_SIZE))
+        transport.mount(ns_api.session, config['meguca'].get('transport', {}))
+
         if 'password' in config['meguca']['auth']:
-            ns_api = NSApi(config['meguca']['auth']['user_agent'],
-                           config['meguca']['auth']['password'])
             ns_api.get_nation(utils.canonical(config['meguca']['auth']['host_nation']), 'ping')
-        else:
-            ns_api = NSApi(config['meguca']['auth']['user_agent'])
 
         return ns_api
 
 
 class NSApi():
     """Wrapper for NationStates API.
+    Is safe to use from many threads at once. Each request
+    carries its own respond and shared state is updated atomically.
 
     Args:
         user_agent (str): User agent.
         password (str, optional): Defaults to None.
             Password to authenticate private requests.
+        coalesce_window (float, optional): Defaults to 0. Seconds to wait for
+            other requests about the same entity to merge into one request.
+            Requests are not merged if 0.
+        cache_ttls (dict, optional): Defaults to None. Time-to-live in seconds
+            of cached responds by shard name. Responds are not cached if None.
+        cache_size (int, optional): Defaults to 256. Maximum number of cached responds.
+        cache_max_stale (float, optional): Defaults to 600. Maximum seconds
+            an expired respond is served for while it is refreshed.
+        xml_decoder (str, optional): Defaults to 'etree'. Decoder of responds.
+            'etree' or 'xmltodict'. Both make the same dictionaries.
+        pool_size (int, optional): Defaults to POOL_SIZE. Maximum number of
+            connections kept open for reuse by concurrent requests.
     """
 
-    def __init__(self, user_agent, password=None):
+    def __init__(self, user_agent, password=None, coalesce_window=0,
+                 cache_ttls=None, cache_size=256, cache_max_stale=600, xml_decoder='etree',
+                 pool_size=POOL_SIZE):
         self.session = requests.Session()
         self.session.headers['user-agent'] = user_agent
-        self.respond = None
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.password = password
+        self.decode = decoders.DECODERS[xml_decoder]
 
-        # Number of requests sent in 30 seconds.
-        # Used to check the rate limit.
+        # Number of requests NationStates counted in its current
+        # rate limit window as of the last respond.
         self.req_count = 0
+        # Guards the request count and pin updates.
+        self._lock = threading.Lock()
+        # Blocks requests which would exceed the rate limit.
+        self.rate_limiter = rate_limiter.RateLimiter(RATE_LIMIT, RATE_LIMIT_PERIOD)
+
+        # Merges concurrent requests about the same entity.
+        self.coalescer = None
+        if coalesce_window > 0:
+            self.coalescer = coalescing.Coalescer(self.request_data, coalesce_window)
+
+        # Caches responds of slow-changing shards.
+        # Hit and miss counters are available with cache.stats().
+        self.cache = None
+        if cache_ttls is not None:
+            self.cache = cache.ResponseCache(self.fetch_data, cache_ttls, cache_size, cache_max_stale,
+                                             self.is_budget_tight)
 
         if password is not None:
             self.setup_private_session()
 
+    def close(self):
+        """Stop the respond cache's refresh thread and close connections."""
+
+        if self.cache is not None:
+            self.cache.close()
+        self.session.close()
+
+    def is_budget_tight(self):
+        """Check if few requests are left in the rate limit.
+
+        Returns:
+            bool: True if more than CACHE_TIGHT_BUDGET of the rate limit is used.
+        """
+
+        return self.rate_limiter.get_usage() > CACHE_TIGHT_BUDGET
+
     def setup_private_session(self):
         """Add password into headers to obtain pin on first private shard call."""
 
-        self.session.headers.update({'X-Password': self.password})
+        self.update_headers({'X-Password': self.password})
 
-    def send_req(self, url):
-        """Send request.
+    def update_headers(self, headers, removed=()):
+        """Update session headers atomically.
+        The headers are replaced rather than changed in place
+        so requests being prepared in other threads never see
+        them half-updated.
+
+        Args:
+            headers (dict): Headers to set.
+            removed (tuple, optional): Defaults to (). Names of headers to remove.
+        """
+
+        with self._lock:
+            new_headers = self.session.headers.copy()
+            new_headers.update(headers)
+            for name in removed:
+                new_headers.pop(name, None)
+            self.session.headers = new_headers
+
+    def send_req(self, url, stream=False):
+        """Send request. Blocks until it can be sent without exceeding the rate limit.
 
         Args:
             url (str): URL to send.
+            stream (bool, optional): Defaults to False. Only download
+                the headers until the content is read.
 
-        Raises:
-            exceptions.NSAPIRateLimitError: Raises if the rate limit is exceeded.
+        Returns:
+            requests.Response: Respond.
         """
 
-        if self.req_count <= RATE_LIMIT:
-            self.respond = self.session.get(url)
-        else:
-            raise exceptions.NSAPIRateLimitError("API rate limit exceeded! Please wait a minute")
+        self.rate_limiter.acquire()
+        respond = self.session.get(url, stream=stream)
+        profiling.count_request('ns_api')
+
+        return respond
 
-    def set_req_count(self):
-        """Set request count."""
+    def set_req_count(self, respond):
+        """Set request count and sync the rate limiter with it.
+
+        Args:
+            respond (requests.Response): Respond.
+        """
 
-        if 'x-ratelimit-requests-seen' in self.respond.headers:
-            self.req_count = int(self.respond.headers['x-ratelimit-requests-seen'])
+        if 'x-ratelimit-requests-seen' in respond.headers:
+            with self._lock:
+                self.req_count = int(respond.headers['x-ratelimit-requests-seen'])
+                self.rate_limiter.sync(self.req_count)
 
-    def set_pin(self):
+    def set_pin(self, respond):
         """Collect and set pin if a request returns one.
         The pin is used to authenticate private requests
         of the same session.
+
+        Args:
+            respond (requests.Response): Respond.
         """
 
-        if 'X-Pin' in self.respond.headers:
-            self.session.headers['X-Pin'] = self.respond.headers['X-Pin']
+        if 'X-Pin' in respond.headers:
             # Password is not necessary anymore
-            self.session.headers.pop('X-Password', None)
+            self.update_headers({'X-Pin': respond.headers['X-Pin']}, removed=('X-Password',))
 
-    def process_xml(self):
+    def process_xml(self, respond):
         """Convert the XML content in a respond into a dictionary.
 
+        Args:
+            respond (requests.Response): Respond.
+
         Returns:
             dict: Converted content.
         """
 
-        resp_dict = xmltodict.parse(self.respond.text)
-        # Discard root XML element
-        resp_dict = resp_dict[list(resp_dict.keys())[0]]
-
-        return resp_dict
+        return self.decode(respond.text)
 
-    def get_respond(self):
+    def get_respond(self, respond):
         """Process the respond returned after a request is sent.
 
+        Args:
+            respond (requests.Response): Respond.
+
         Raises:
             Exceptions will be raised if the respond's HTTP code is not 200.
             Read exceptions for more information.
@@ -118,31 +284,31 @@ class NSApi():
             dict: Respond's content.
         """
 
-        self.set_req_count()
-
-        if self.respond.status_code == 200:
-            self.set_pin()
-        elif self.respond.status_code == 400:
-            raise exceptions.NSAPIReqError('Empty shard causes error when get world data')
-        elif self.respond.status_code == 404:
-            raise exceptions.NSAPIReqError('This region or nation does not exist')
-        elif self.respond.status_code == 403:
-            raise exceptions.NSAPIAuthError('Incorrect password')
-        elif self.respond.status_code == 429:
-            # In case someone override the internal
-            # ratelimiting mechanism
-            raise exceptions.NSAPIRateLimitError('NationStates has temporarily banned you for'
-                                                 'violating the rate limit.'
-                                                 'Re-try after {}'.format(self.respond.headers['X-Retry-After']))
-        elif self.respond.status_code == 500:
-            raise exceptions.NSAPIError('NS API returned an internal server error')
-        else:
-            raise exceptions.NSAPIError('An unknown API error has occured')
+        self.check_respond(respond)
+
+        return self.process_xml(respond)
 
-        return self.process_xml()
+    def check_respond(self, respond):
+        """Check the status of the respond returned after a request is sent.
 
-    def get_data(self, api_type="", name="", shards="", shard_params=None):
+        Args:
+            respond (requests.Response): Respond.
+
+        Raises:
+            Exceptions will be raised if the respond's HTTP code is not 200.
+            Read exceptions for more information.
+        """
+
+        self.set_req_count(respond)
+        check_status(respond, self.rate_limiter)
+        self.set_pin(respond)
+
+    def get_data(self, api_type="", name="", shards="", shard_params=None, typed=False, stream=False):
         """Get data about something from the API.
+        Responds of slow-changing shards are cached if caching is enabled.
+        Concurrent requests about the same entity are merged
+        into one request if coalescing is enabled.
+        Streamed requests are neither cached nor merged.
 
         Args:
             api_type (str, optional): API type. (nation/region/wa)
@@ -152,6 +318,10 @@ class NSApi():
             shards (str|list): Shard.
                 Use a list for multiple shards.
             shard_params (dict, optional): Shard parameters.
+            typed (bool, optional): Defaults to False. Convert values of known shards
+                into Python types. Read decoders.TYPED_DECODERS for more information.
+            stream (bool, optional): Defaults to False. Parse the respond while it is
+                downloaded to lower the peak memory of large shards.
 
         Returns:
             dict: Respond content.
@@ -185,17 +355,115 @@ class NSApi():
             '1833.28'
         """
 
+        if stream:
+            result = {}
+            for tag, value in self.iter_data(api_type, name, shards, shard_params, typed):
+                decoders.add_value(result, tag, value)
+            return result
+
+        if self.cache is not None:
+            result = self.cache.get_data(api_type, name, shards, shard_params)
+        else:
+            result = self.fetch_data(api_type, name, shards, shard_params)
+
+        if typed:
+            return decoders.decode_typed(result)
+
+        return result
+
+    def fetch_data(self, api_type="", name="", shards="", shard_params=None):
+        """Get data from the API without the cache.
+
+        Args:
+            api_type (str, optional): API type. (nation/region/wa)
+                Leave empty for the world API.
+            name (str, optional): Name of nation/region.
+                Leave empty for the wa or world API.
+            shards (str|list): Shard.
+                Use a list for multiple shards.
+            shard_params (dict, optional): Shard parameters.
+
+        Returns:
+            dict: Respond content.
+        """
+
+        if self.coalescer is not None:
+            return self.coalescer.get_data(api_type, name, shards, shard_params)
+
+        return self.request_data(api_type, name, shards, shard_params)
+
+    def request_data(self, api_type="", name="", shards="", shard_params=None):
+        """Send a request for data and get its respond.
+
+        Args:
+            api_type (str, optional): API type. (nation/region/wa)
+                Leave empty for the world API.
+            name (str, optional): Name of nation/region.
+                Leave empty for the wa or world API.
+            shards (str|list): Shard.
+                Use a list for multiple shards.
+            shard_params (dict, optional): Shard parameters.
+
+        Returns:
+            dict: Respond content.
+        """
+
+        respond = self.send_req(self.get_url(api_type, name, shards, shard_params))
+
+        return self.get_respond(respond)
+
+    def iter_data(self, api_type="", name="", shards="", shard_params=None, typed=False):
+        """Send a streamed request for data and parse its respond
+        while it is downloaded. Responds are not cached.
+
+        Args:
+            api_type (str, optional): API type. (nation/region/wa)
+                Leave empty for the world API.
+            name (str, optional): Name of nation/region.
+                Leave empty for the wa or world API.
+            shards (str|list): Shard.
+                Use a list for multiple shards.
+            shard_params (dict, optional): Shard parameters.
+            typed (bool, optional): Defaults to False. Convert values of known shards
+                into Python types.
+
+        Raises:
+            Exceptions will be raised if the respond's HTTP code is not 200.
+            Read exceptions for more information.
+
+        Yields:
+            tuple: Tag and value of a shard as soon as it is downloaded.
+        """
+
+        respond = self.send_req(self.get_url(api_type, name, shards, shard_params), stream=True)
+
+        try:
+            self.check_respond(respond)
+            yield from decoders.iter_shards(respond.iter_content(STREAM_CHUNK_SIZE), typed)
+        finally:
+            respond.close()
+
+    def get_url(self, api_type, name, shards, shard_params):
+        """Construct the URL of a request.
+
+        Args:
+            api_type (str): API type.
+            name (str): Name of nation/region.
+            shards (str|list): Shard.
+            shard_params (dict): Shard parameters.
+
+        Returns:
+            str: URL.
+        """
+
         params = {api_type: name, 'q': shards}
         params.update(shard_params or {})
 
-        url = helpers.construct_url(params, API_URL_BEGINNING,
-                                    API_PARAM_DELIMITER,
-                                    API_VALUE_DELIMITER)
-
-        self.send_req(url)
-        return self.get_respond()
+        return helpers.construct_url(params, API_URL_BEGINNING,
+                                     API_PARAM_DELIMITER,
+                                     API_VALUE_DELIMITER)
 
-    def get_nation(self, name, shards, shard_params=None):
+    def get_nation(self, name, shards, shard_params=None, typed=False, stream=False):
         """Get data about a nation.
 
         Args:
@@ -203,6 +471,11 @@ class NSApi():
             shards (str|list): Shard.
                 Use a list for multiple shards.
             shard_params (dict, optional): Shard parameters.
+            typed (bool, optional): Defaults to False. Convert values of known shards
+                into Python types.
+            stream (bool, optional): Defaults to False. Parse the respond
+                while it is downloaded.
+
         Returns:
             dict: Respond content.
 
@@ -235,9 +508,9 @@ class NSApi():
             '12345.0'
         """
 
-        return self.get_data('nation', name, shards, shard_params)
+        return self.get_data('nation', name, shards, shard_params, typed, stream)
 
-    def get_region(self, name, shards, shard_params=None):
+    def get_region(self, name, shards, shard_params=None, typed=False, stream=False):
         """Get data about a region.
 
         Args:
@@ -245,6 +518,10 @@ class NSApi():
             shards (str|list): Shard.
                 Use a list for multiple shards.
             shard_params (dict, optional): Shard parameters.
+            typed (bool, optional): Defaults to False. Convert values of known shards
+                into Python types.
+            stream (bool, optional): Defaults to False. Parse the respond
+                while it is downloaded.
 
         Returns:
             dict: Respond content.
@@ -278,9 +555,9 @@ class NSApi():
             '17776.3'
         """
 
-        return self.get_data('region', name, shards, shard_params)
+        return self.get_data('region', name, shards, shard_params, typed, stream)
 
-    def get_wa(self, council, shards, shard_params=None):
+    def get_wa(self, council, shards, shard_params=None, typed=False, stream=False):
         """Get data about the World Assembly.
 
         Args:
@@ -290,6 +567,10 @@ class NSApi():
             shards (str|list): Shard.
                 Use a list for multiple shards.
             shard_params (dict, optional): Shard parameters.
+            typed (bool, optional): Defaults to False. Convert values of known shards
+                into Python types.
+            stream (bool, optional): Defaults to False. Parse the respond
+                while it is downloaded.
 
         Returns:
             dict: Respond content.
@@ -317,15 +598,19 @@ class NSApi():
         elif council == 'sc':
             name = '2'
 
-        return self.get_data('wa', name, shards, shard_params)
+        return self.get_data('wa', name, shards, shard_params, typed, stream)
 
-    def get_world(self, shards, shard_params=None):
+    def get_world(self, shards, shard_params=None, typed=False, stream=False):
         """Get data about the world.
 
         Args:
             shards (str|list): Shard.
                 Use a list for multiple shards.
             shard_params (dict, optional): Shard parameters.
+            typed (bool, optional): Defaults to False. Convert values of known shards
+                into Python types.
+            stream (bool, optional): Defaults to False. Parse the respond
+                while it is downloaded.
 
         Returns:
             dict: Respond content.
@@ -357,4 +642,4 @@ class NSApi():
             '@@homura_chan@@ was founded in %%the_east_pacific%%.
         """
 
-        return self.get_data('', '', shards, shard_params)
+        return self.get_data('', '', shards, shard_params, typed, stream)
@@ -0,0 +1,144 @@
+"""Sliding-window rate limiter for NationStates API requests.
+"""
+
+
+import collections
+import threading
+import time
+
+
+class RateLimiter():
+    """Thread-safe sliding-window rate limiter.
+    Callers block until a request can be sent without
+    exceeding the limit in any window of the period.
+
+    Args:
+        limit (int): Maximum number of requests in a period.
+        period (float): Period in seconds.
+    """
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+
+        # Send times of requests in the current window
+        self.sent_times = collections.deque()
+        # No request is sent before this time
+        self.blocked_until = 0
+        self._cond = threading.Condition()
+
+    def expire(self, now):
+        """Forget requests sent before the current window."""
+
+        while self.sent_times and self.sent_times[0] <= now - self.period:
+            self.sent_times.popleft()
+
+    def get_wait_time(self, now):
+        """Get the number of seconds until a request can be sent.
+
+        Args:
+            now (float): Current monotonic time.
+
+        Returns:
+            float: Seconds to wait. 0 if a request can be sent now.
+        """
+
+        self.expire(now)
+
+        if self.blocked_until > now:
+            return self.blocked_until - now
+
+        if len(self.sent_times) < self.limit:
+            return 0
+
+        return self.sent_times[len(self.sent_times) - self.limit] + self.period - now
+
+    def acquire(self, timeout=None):
+        """Wait for a free slot and take it.
+
+        Args:
+            timeout (float, optional): Defaults to None. Maximum seconds to wait.
+                Waits as long as needed if None.
+
+        Returns:
+            bool: False if no slot was free before the timeout.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait_time = self.get_wait_time(now)
+                if wait_time <= 0:
+                    self.sent_times.append(now)
+                    return True
+
+                if deadline is not None:
+                    if now >= deadline:
+                        return False
+                    wait_time = min(wait_time, deadline - now)
+
+                self._cond.wait(wait_time)
+
+    def try_acquire(self):
+        """Take a free slot without waiting.
+        Lets callers which must not block, such as coroutines, wait in their own way.
+
+        Returns:
+            float: 0 if a slot was taken. Otherwise seconds until one may be free.
+        """
+
+        with self._cond:
+            now = time.monotonic()
+            wait_time = self.get_wait_time(now)
+            if wait_time <= 0:
+                self.sent_times.append(now)
+                return 0
+
+            return wait_time
+
+    def get_usage(self):
+        """Get the used part of the rate limit in the current window.
+
+        Returns:
+            float: Number of requests in the window divided by the limit.
+                1 if requests are blocked.
+        """
+
+        with self._cond:
+            now = time.monotonic()
+            if self.blocked_until > now:
+                return 1
+
+            self.expire(now)
+
+            return len(self.sent_times) / self.limit
+
+    def sync(self, requests_seen):
+        """Account for requests NationStates counted which this limiter did not send,
+        such as requests of other clients with the same IP address.
+
+        Args:
+            requests_seen (int): Number of requests NationStates counted in its current window.
+        """
+
+        with self._cond:
+            now = time.monotonic()
+            self.expire(now)
+
+            # Unknown requests are assumed to have been sent just now
+            # so they take their slots for a whole period.
+            for i in range(requests_seen - len(self.sent_times)):
+                self.sent_times.append(now)
+
+    def block(self, seconds):
+        """Block all requests for a while.
+
+        Args:
+            seconds (float): Seconds to block.
+        """
+
+        with self._cond:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self._cond.notify_all()
@@ -7,6 +7,8 @@ import logging
 import requests
 
 from meguca import plugin_categories
+from meguca import profiling
+from meguca import transport
 from meguca.plugins.src.ns_site import helpers
 from meguca.plugins.src.ns_site import exceptions
 
@@ -23,6 +25,7 @@ class NSSitePlugin(plugin_categories.Service):
         if 'X-Pin' in ns_api.session.headers:
             pin = ns_api.session.headers['X-Pin']
             ns_site = NSSite(config['meguca']['auth']['user_agent'], pin)
+            transport.mount(ns_site.session, config['meguca'].get('transport', {}))
             ns_site.set_localid()
 
             return ns_site
@@ -50,6 +53,7 @@ class NSSite():
         """Set local ID for a request."""
 
         resp = self.session.get(LOCALID_URL)
+        profiling.count_request('ns_site')
         helpers.handle_errors(resp)
 
         self.localid = helpers.get_localid(resp.text)
@@ -63,6 +67,7 @@ class NSSite():
         url = ACTION_URL.format(action)
 
         resp = self.session.post(url, data=params, )
+        profiling.count_request('ns_site')
 
         logger.debug('Sent POST request: %s', action)
 
@@ -14,8 +14,8 @@ logger = logging.getLogger(__name__)
 
 class RegionalEndoStats(plugin_categories.Stat):
     def run(self, data):
-        total_endocount = data['wa_nations'].number_of_edges()
-        cross_endo = nx.density(data['wa_nations']) * 100
+        total_endocount = data['endos'].number_of_edges()
+        cross_endo = nx.density(data['endos']) * 100
 
         result = {'total_ec': total_endocount,
                   'cross_endo': cross_endo}
@@ -12,14 +12,14 @@ logger = logging.getLogger(__name__)
 
 class WAStats(plugin_categories.Stat):
     def run(self, ns_api, config):
-        wa_data = ns_api.get_wa('ga', ['numnations', 'members'])
-
-        ns_wa_num = int(wa_data['NUMNATIONS'])
-
-        region_nations = set(ns_api.get_region(config['meguca']['general']['region'],
-                                               'nations')['NATIONS'].split(':'))
-        ns_wa_nations = set(wa_data['MEMBERS'].split(','))
-        region_wa_nations = list(region_nations & ns_wa_nations)
+        # The member list is large and changes often so it is streamed.
+        # The nation number is requested on its own so it is cached.
+        wa_members = ns_api.get_wa('ga', 'members', typed=True, stream=True)['MEMBERS']
+        ns_wa_num = ns_api.get_wa('ga', 'numnations', typed=True)['NUMNATIONS']
+
+        region_nations = ns_api.get_region(config['meguca']['general']['region'],
+                                           'nations', typed=True, stream=True)['NATIONS']
+        region_wa_nations = list(region_nations & wa_members)
 
         result = {'region_wa': region_wa_nations,
                   'ns_wa_num': ns_wa_num}
@@ -0,0 +1,196 @@
+"""This module runs plugins in worker processes so CPU-bound plugins
+do not hold the GIL of the main process.
+
+Data is shipped between processes in a compact form:
+graphs are sent as a node list and an array of edge indexes
+instead of pickled networkx objects. Graphs are only encoded again
+after they change.
+"""
+
+
+import array
+import collections
+import importlib.util
+import logging
+import os
+import threading
+
+import networkx as nx
+
+from meguca import data
+
+
+logger = logging.getLogger(__name__)
+
+
+# A graph as a node list and a flat array of node indexes of its edges.
+# Node and edge attributes are not kept.
+EncodedGraph = collections.namedtuple('EncodedGraph', ['graph_class', 'nodes', 'edges'])
+
+# Plugin objects loaded in a worker process.
+_plugin_objects = {}
+
+
+def encode_graph(graph):
+    """Encode a graph into compact form.
+
+    Args:
+        graph (networkx.Graph): Graph.
+
+    Returns:
+        EncodedGraph: Encoded graph.
+    """
+
+    nodes = list(graph)
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = array.array('L', (index[node] for edge in graph.edges for node in edge))
+
+    return EncodedGraph(type(graph), nodes, edges)
+
+
+def decode_graph(encoded_graph):
+    """Rebuild a graph from its compact form.
+
+    Args:
+        encoded_graph (EncodedGraph): Encoded graph.
+
+    Returns:
+        networkx.Graph: Graph.
+    """
+
+    nodes = encoded_graph.nodes
+    edges = encoded_graph.edges
+
+    graph = encoded_graph.graph_class()
+    graph.add_nodes_from(nodes)
+    graph.add_edges_from((nodes[edges[i]], nodes[edges[i + 1]]) for i in range(0, len(edges), 2))
+
+    return graph
+
+
+def encode_data(data_dict):
+    """Encode values of a data dict to ship to another process.
+
+    Args:
+        data_dict (dict): Data.
+
+    Returns:
+        dict: Encoded data.
+    """
+
+    return {key: encode_graph(value) if isinstance(value, nx.Graph) else value
+            for key, value in data_dict.items()}
+
+
+class EncodingCache():
+    """Encoded graphs of data keys. A graph is encoded once
+    per version of its key instead of on every plugin call.
+    """
+
+    def __init__(self):
+        # Version, graph and encoded graph by key
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def encode_data(self, snapshot, keys):
+        """Encode values of keys of a data snapshot to ship to another process.
+
+        Args:
+            snapshot (data.DataSnapshot): Data snapshot.
+            keys (list): Keys to encode.
+
+        Returns:
+            dict: Encoded data.
+        """
+
+        versions = snapshot.versions
+        encoded_data = {}
+
+        for key in keys:
+            value = snapshot[key]
+            if not isinstance(value, nx.Graph):
+                encoded_data[key] = value
+                continue
+
+            with self._lock:
+                entry = self.entries.get(key)
+
+            # The graph is compared too since a replaced data store
+            # may reuse versions.
+            if entry is None or entry[0] != versions[key] or entry[1] is not value:
+                entry = (versions[key], value, encode_graph(value))
+                with self._lock:
+                    self.entries[key] = entry
+
+            encoded_data[key] = entry[2]
+
+        return encoded_data
+
+
+def decode_data(encoded_data):
+    """Decode values of an encoded data dict.
+
+    Args:
+        encoded_data (dict): Encoded data.
+
+    Returns:
+        dict: Data.
+    """
+
+    return {key: decode_graph(value) if isinstance(value, EncodedGraph) else value
+            for key, value in encoded_data.items()}
+
+
+def load_plugin_object(module_path, class_name):
+    """Load a plugin object in a worker process.
+    Plugin objects are loaded once per worker process
+    and loaded again if their module file changes.
+
+    Args:
+        module_path (str): Path to the plugin module file.
+        class_name (str): Plugin class name.
+
+    Returns:
+        Plugin object.
+    """
+
+    key = (module_path, class_name, os.path.getmtime(module_path))
+
+    if key not in _plugin_objects:
+        spec = importlib.util.spec_from_file_location('meguca_worker_plugin_{}'.format(len(_plugin_objects)),
+                                                      module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _plugin_objects[key] = getattr(module, class_name)()
+
+    return _plugin_objects[key]
+
+
+def run_plugin(module_path, class_name, plg_config, entry_method, entry_args):
+    """Run a plugin's entry method in a worker process.
+
+    Args:
+        module_path (str): Path to the plugin module file.
+        class_name (str): Plugin class name.
+        plg_config (dict): Plugin's configuration.
+        entry_method (str): Name of entry method.
+        entry_args (dict): Entry method arguments. Data must be encoded.
+
+    Returns:
+        dict: Encoded returned data.
+    """
+
+    plg_object = load_plugin_object(module_path, class_name)
+    plg_object.plg_config = plg_config
+
+    if 'data' in entry_args:
+        data_store = data.DataStore()
+        data_store.update(decode_data(entry_args['data']))
+        entry_args = dict(entry_args, data=data_store)
+
+    return_data = getattr(plg_object, entry_method)(**entry_args)
+
+    if return_data:
+        return encode_data(return_data)
+
+    return return_data
@@ -0,0 +1,201 @@
+"""This module measures plugin runs.
+
+Every entry method call records its wall time, CPU time,
+peak traced memory allocation and the number of requests services
+sent on its behalf. Rolling aggregates are kept per plugin.
+"""
+
+
+import collections
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+import tracemalloc
+
+
+logger = logging.getLogger(__name__)
+
+
+# Record of the plugin run in progress in the current thread or task.
+_current_record = contextvars.ContextVar('meguca_plugin_run_record', default=None)
+
+
+def count_request(service):
+    """Count a request sent by a service for the plugin run in progress.
+
+    Args:
+        service (str): Service name.
+    """
+
+    record = _current_record.get()
+    if record is not None:
+        record['{}_requests'.format(service)] += 1
+
+
+def percentile(sorted_values, percent):
+    """Get a percentile of sorted values using the nearest-rank method.
+
+    Args:
+        sorted_values (list): Sorted values.
+        percent (int): Percent.
+
+    Returns:
+        Value at the percentile.
+    """
+
+    rank = max(int(round(percent / 100 * len(sorted_values))) - 1, 0)
+
+    return sorted_values[rank]
+
+
+class Profiler():
+    """Measure plugin runs and keep rolling aggregates.
+
+    CPU time is the time of the thread a run happens on. Coroutines share
+    the event loop thread so their CPU time includes other coroutines
+    interleaved with them. Memory allocation is traced process-wide,
+    so peak memory is only recorded for runs which did not overlap
+    another profiled run.
+
+    Args:
+        window (int): Number of latest runs aggregates are calculated over.
+        trace_malloc (bool): Trace peak memory allocation of runs.
+    """
+
+    def __init__(self, window=100, trace_malloc=False):
+        self.window = window
+        self.trace_malloc = trace_malloc
+
+        # Latest run records of each plugin entry method.
+        self.records = {}
+        # Number of runs of each plugin entry method.
+        self.counts = collections.Counter()
+        # Number of runs in progress and of runs started so far.
+        # Tell if a run overlapped another one.
+        self.active_runs = 0
+        self.started_runs = 0
+        self._lock = threading.Lock()
+
+        if trace_malloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def profile(self, plg_name, entry_method):
+        """Measure a plugin run in a with block.
+
+        Args:
+            plg_name (str): Plugin name.
+            entry_method (str): Name of entry method.
+        """
+
+        record = collections.Counter()
+        token = _current_record.set(record)
+
+        with self._lock:
+            self.active_runs += 1
+            self.started_runs += 1
+            run_num = self.started_runs
+            sequential = self.active_runs == 1
+            if self.trace_malloc and sequential:
+                tracemalloc.reset_peak()
+                start_mem = tracemalloc.get_traced_memory()[0]
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.thread_time()
+
+        try:
+            yield record
+        finally:
+            record['wall_time'] = time.perf_counter() - start_wall_time
+            record['cpu_time'] = time.thread_time() - start_cpu_time
+            with self._lock:
+                # The peak is shared by runs which overlap.
+                sequential = sequential and self.started_runs == run_num
+                if self.trace_malloc and sequential:
+                    record['peak_mem'] = max(tracemalloc.get_traced_memory()[1] - start_mem, 0)
+                self.active_runs -= 1
+
+            _current_record.reset(token)
+            self.add_record(plg_name, entry_method, record)
+
+    async def profile_coro(self, plg_name, entry_method, coro):
+        """Measure a plugin run of a coroutine entry method.
+
+        Args:
+            plg_name (str): Plugin name.
+            entry_method (str): Name of entry method.
+            coro (coroutine): Coroutine object of the entry method.
+
+        Returns:
+            Result of the coroutine.
+        """
+
+        with self.profile(plg_name, entry_method):
+            return await coro
+
+    def add_record(self, plg_name, entry_method, record):
+        """Add a run record.
+
+        Args:
+            plg_name (str): Plugin name.
+            entry_method (str): Name of entry method.
+            record (dict): Measurements of the run.
+        """
+
+        key = (plg_name, entry_method)
+
+        with self._lock:
+            if key not in self.records:
+                self.records[key] = collections.deque(maxlen=self.window)
+            self.records[key].append(record)
+            self.counts[key] += 1
+
+        logger.debug('Plugin "%s" %s() took %.3f s wall time, %.3f s CPU time',
+                     plg_name, entry_method, record['wall_time'], record['cpu_time'])
+
+    def summary(self):
+        """Get aggregates of recorded runs.
+
+        Returns:
+            dict: Aggregates of each plugin and entry method. E.g:
+                {'Plugin': {'run': {'count': 10,
+                                    'wall_time': {'p50': 0.1, 'p95': 0.3, 'max': 0.4},
+                                    ...}}}
+        """
+
+        with self._lock:
+            records = {key: list(key_records) for key, key_records in self.records.items()}
+            counts = dict(self.counts)
+
+        summary = {}
+        for (plg_name, entry_method), key_records in records.items():
+            aggregates = {'count': counts[(plg_name, entry_method)]}
+
+            metrics = set()
+            for record in key_records:
+                metrics.update(record)
+
+            for metric in sorted(metrics):
+                values = sorted(record[metric] for record in key_records if metric in record)
+                aggregates[metric] = {'p50': percentile(values, 50),
+                                      'p95': percentile(values, 95),
+                                      'max': values[-1]}
+
+            summary.setdefault(plg_name, {})[entry_method] = aggregates
+
+        return summary
+
+    def log_summary(self):
+        """Log a summary line of each plugin's run() aggregates."""
+
+        for plg_name, entry_methods in sorted(self.summary().items()):
+            if 'run' not in entry_methods:
+                continue
+
+            aggregates = entry_methods['run']
+            line = ', '.join('{} p50={:.3g} p95={:.3g} max={:.3g}'.format(metric, values['p50'],
+                                                                          values['p95'], values['max'])
+                             for metric, values in aggregates.items() if metric != 'count')
+
+            logger.info('Plugin "%s" ran %d times: %s', plg_name, aggregates['count'], line)
@@ -0,0 +1,280 @@
+"""This module runs scheduled jobs by priority and measures
+how well the scheduler keeps up with their schedules.
+"""
+
+
+import collections
+import concurrent.futures
+import datetime
+import itertools
+import logging
+import queue
+import threading
+
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_ERROR
+from apscheduler.executors.base import BaseExecutor, run_job
+
+from meguca import profiling
+
+
+logger = logging.getLogger(__name__)
+
+
+class PriorityThreadPool():
+    """Thread pool which runs queued calls with higher priority first.
+    Calls with the same priority run in submission order.
+    Threads are started when needed up to the maximum.
+
+    Args:
+        max_workers (int): Maximum number of threads.
+        thread_name_prefix (str): Prefix of thread names.
+    """
+
+    def __init__(self, max_workers, thread_name_prefix='meguca-job'):
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+
+        self.queue = queue.PriorityQueue()
+        self.threads = []
+        # Breaks ties so calls with the same priority keep their order.
+        self._counter = itertools.count()
+        self._idle = threading.Semaphore(0)
+        self._lock = threading.Lock()
+
+    def submit(self, fn, priority=0):
+        """Queue a call.
+
+        Args:
+            fn (callable): Callable with no arguments.
+            priority (int, optional): Defaults to 0. Higher runs first.
+
+        Returns:
+            concurrent.futures.Future: Result of the call.
+        """
+
+        future = concurrent.futures.Future()
+        self.queue.put((-priority, next(self._counter), future, fn))
+        self.adjust_threads()
+
+        return future
+
+    def adjust_threads(self):
+        """Start a thread if no thread is idle and the maximum is not reached."""
+
+        if self._idle.acquire(timeout=0):
+            return
+
+        with self._lock:
+            if len(self.threads) < self.max_workers:
+                thread = threading.Thread(target=self.work, daemon=True,
+                                          name='{}-{}'.format(self.thread_name_prefix, len(self.threads)))
+                thread.start()
+                self.threads.append(thread)
+
+    def work(self):
+        """Run queued calls until a stop item is received."""
+
+        while True:
+            _, _, future, fn = self.queue.get()
+            if future is None:
+                return
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn()
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+
+            self._idle.release()
+
+    def shutdown(self, wait=True):
+        """Stop threads after queued calls finish.
+
+        Args:
+            wait (bool, optional): Defaults to True. Wait for threads to stop.
+        """
+
+        with self._lock:
+            threads = list(self.threads)
+
+        # Stop items sort after every call.
+        for thread in threads:
+            self.queue.put((float('inf'), next(self._counter), None, None))
+
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+class JobCounter():
+    """Thread-safe count of jobs which were handed to an executor
+    and have not finished yet.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._cond = threading.Condition()
+
+    def increment(self):
+        with self._cond:
+            self.count += 1
+
+    def decrement(self):
+        with self._cond:
+            self.count -= 1
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """Wait for all jobs to finish.
+
+        Args:
+            timeout (float, optional): Defaults to None. Maximum seconds to wait.
+
+        Returns:
+            bool: False if the timeout passed before all jobs finished.
+        """
+
+        with self._cond:
+            return self._cond.wait_for(lambda: self.count <= 0, timeout)
+
+
+class PriorityThreadPoolExecutor(BaseExecutor):
+    """APScheduler executor which runs jobs with higher priority first
+    when all its threads are busy.
+
+    Args:
+        max_workers (int, optional): Defaults to 10. Maximum number of threads.
+        priorities (dict, optional): Defaults to None. Priority of jobs by job Id.
+            Jobs have priority 0 if not set.
+        metrics (JobMetrics, optional): Defaults to None. Records scheduling lag.
+        job_counter (JobCounter, optional): Defaults to None. Counts jobs from
+            the moment they are queued until they finish.
+    """
+
+    def __init__(self, max_workers=10, priorities=None, metrics=None, job_counter=None):
+        super().__init__()
+        self.pool = PriorityThreadPool(max_workers)
+        self.priorities = priorities if priorities is not None else {}
+        self.metrics = metrics
+        self.job_counter = job_counter if job_counter is not None else JobCounter()
+
+    def _do_submit_job(self, job, run_times):
+        def run():
+            try:
+                if self.metrics is not None:
+                    self.metrics.record_start(job.id, run_times[-1])
+                return run_job(job, job._jobstore_alias, run_times, self._logger.name)
+            finally:
+                self.job_counter.decrement()
+
+        def callback(future):
+            exc = future.exception()
+            if exc is not None:
+                self._run_job_error(job.id, exc, exc.__traceback__)
+            else:
+                self._run_job_success(job.id, future.result())
+
+        # Counted before it is queued so a job which starts at once
+        # is never missed by someone waiting for jobs to finish.
+        self.job_counter.increment()
+        future = self.pool.submit(run, self.priorities.get(job.id, 0))
+        future.add_done_callback(callback)
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait)
+
+
+class JobMetrics():
+    """Scheduling metrics of jobs: lag between scheduled and actual start,
+    missed runs (misfires), runs skipped because the previous run
+    was still running (overlaps) and errors.
+
+    Args:
+        window (int, optional): Defaults to 100. Number of latest runs
+            lag aggregates are calculated over.
+    """
+
+    def __init__(self, window=100):
+        self.window = window
+
+        # Latest lags in seconds by job Id
+        self.lags = {}
+        # Number of runs, misfires, overlaps and errors by job Id
+        self.counts = collections.defaultdict(collections.Counter)
+        self._lock = threading.Lock()
+
+    def record_start(self, job_id, scheduled_time):
+        """Record a job run starting.
+
+        Args:
+            job_id (str): Job Id.
+            scheduled_time (datetime.datetime): Time the run was scheduled at.
+        """
+
+        lag = (datetime.datetime.now(datetime.timezone.utc) - scheduled_time).total_seconds()
+
+        with self._lock:
+            if job_id not in self.lags:
+                self.lags[job_id] = collections.deque(maxlen=self.window)
+            self.lags[job_id].append(max(lag, 0))
+            self.counts[job_id]['runs'] += 1
+
+    def handle_event(self, event):
+        """Count misfires, overlaps and errors from scheduler events.
+
+        Args:
+            event (apscheduler.events.JobEvent): Scheduler event.
+        """
+
+        if event.code == EVENT_JOB_MISSED:
+            metric = 'misfires'
+        elif event.code == EVENT_JOB_MAX_INSTANCES:
+            metric = 'overlaps'
+        elif event.code == EVENT_JOB_ERROR:
+            metric = 'errors'
+        else:
+            return
+
+        with self._lock:
+            self.counts[event.job_id][metric] += 1
+
+    def summary(self):
+        """Get metrics of all jobs.
+
+        Returns:
+            dict: Metrics of each job by job Id. E.g:
+                {'job': {'runs': 10, 'misfires': 1, 'overlaps': 0, 'errors': 0,
+                         'lag': {'p50': 0.01, 'p95': 0.5, 'max': 2.1}}}
+        """
+
+        with self._lock:
+            lags = {job_id: sorted(job_lags) for job_id, job_lags in self.lags.items()}
+            counts = {job_id: dict(job_counts) for job_id, job_counts in self.counts.items()}
+
+        summary = {}
+        for job_id, job_counts in counts.items():
+            job_summary = {metric: job_counts.get(metric, 0)
+                           for metric in ('runs', 'misfires', 'overlaps', 'errors')}
+
+            job_lags = lags.get(job_id)
+            if job_lags:
+                job_summary['lag'] = {'p50': profiling.percentile(job_lags, 50),
+                                      'p95': profiling.percentile(job_lags, 95),
+                                      'max': job_lags[-1]}
+
+            summary[job_id] = job_summary
+
+        return summary
+
+    def log_summary(self):
+        """Log a summary line of each job's metrics."""
+
+        for job_id, job_summary in sorted(self.summary().items()):
+            lag = job_summary.get('lag', {'p50': 0, 'p95': 0, 'max': 0})
+            logger.info('Job "%s" ran %d times, %d misfires, %d overlaps, %d errors, '
+                        'lag p50=%.3g p95=%.3g max=%.3g',
+                        job_id, job_summary['runs'], job_summary['misfires'],
+                        job_summary['overlaps'], job_summary['errors'],
+                        lag['p50'], lag['p95'], lag['max'])
@@ -0,0 +1,141 @@
+"""This module creates service objects when plugins first need them.
+"""
+
+
+import collections.abc
+import logging
+import threading
+
+from meguca import exceptions
+
+
+logger = logging.getLogger(__name__)
+
+
+def close_service(plg_id, instance):
+    """Close a service object if it has a close() method.
+
+    Args:
+        plg_id (str): Service Id.
+        instance: Service object.
+    """
+
+    close = getattr(instance, 'close', None)
+    if close is None:
+        return
+
+    try:
+        close()
+    except Exception:
+        logger.exception('Could not close service "%s"', plg_id)
+    else:
+        logger.debug('Closed service "%s"', plg_id)
+
+
+class ServiceRegistry(collections.abc.Mapping):
+    """Map service Ids to service objects.
+    A service object is created from its plugin on first lookup.
+
+    Args:
+        create (callable): Create a service object from a service plugin.
+            Dependencies of the service are looked up from this registry
+            so they are created first.
+    """
+
+    def __init__(self, create):
+        self.create = create
+
+        # Service plugins by Id
+        self.plugins = {}
+        # Created service objects by Id
+        self.instances = {}
+
+        self._lock = threading.RLock()
+        # Ids of services being created by the thread holding the lock.
+        self._creating = []
+
+    def register(self, plg_id, plg):
+        """Register a service plugin.
+
+        Args:
+            plg_id (str): Service Id.
+            plg (yapsy.PluginInfo): Plugin metadata object.
+        """
+
+        self.plugins[plg_id] = plg
+
+    def __getitem__(self, plg_id):
+        """Get a service object. Create it if it does not exist.
+
+        Args:
+            plg_id (str): Service Id.
+
+        Raises:
+            KeyError: Raises if the service is not registered.
+            exceptions.DependencyError: Raises if services depend on each other.
+
+        Returns:
+            Service object.
+        """
+
+        try:
+            return self.instances[plg_id]
+        except KeyError:
+            pass
+
+        plg = self.plugins[plg_id]
+
+        with self._lock:
+            # Another thread may have created it while we waited.
+            if plg_id in self.instances:
+                return self.instances[plg_id]
+
+            if plg_id in self._creating:
+                raise exceptions.DependencyError('Dependency cycle between services: {}'
+                                                 .format(' -> '.join(self._creating + [plg_id])))
+
+            self._creating.append(plg_id)
+            try:
+                self.instances[plg_id] = self.create(plg)
+            finally:
+                self._creating.pop()
+
+        logger.debug('Created service "%s"', plg.name)
+
+        return self.instances[plg_id]
+
+    def remove(self, plg_id):
+        """Remove a created service object so it is created again
+        on next lookup. The object is closed if it has a close() method.
+
+        Args:
+            plg_id (str): Service Id.
+        """
+
+        with self._lock:
+            instance = self.instances.pop(plg_id, None)
+
+        if instance is not None:
+            close_service(plg_id, instance)
+
+    def close(self):
+        """Close all created service objects which have a close() method.
+        Services are closed in reverse creation order so a service
+        is closed before the services it uses.
+        """
+
+        with self._lock:
+            instances = list(self.instances.items())
+            self.instances.clear()
+
+        for plg_id, instance in reversed(instances):
+            close_service(plg_id, instance)
+
+    def __iter__(self):
+        return iter(self.plugins)
+
+    def __len__(self):
+        return len(self.plugins)
+
+    def __contains__(self, plg_id):
+        return plg_id in self.plugins
@@ -0,0 +1,469 @@
+"""This module keeps bounded histories of numeric plugin data.
+
+Each tracked key has a ring buffer of raw samples and optional
+rollups which downsample samples into fixed-interval buckets.
+Memory use is fixed by the capacity of each buffer.
+"""
+
+
+import array
+import threading
+
+
+# Interval in seconds of each rollup resolution
+ROLLUP_INTERVALS = {
+    'hourly': 3600,
+    'daily': 86400
+}
+
+# Aggregate functions queries support
+AGGREGATES = ('count', 'sum', 'mean', 'min', 'max', 'first', 'last')
+
+
+class RingBuffer():
+    """Fixed-capacity buffer of rows of floats.
+    The oldest row is overwritten when the buffer is full.
+    The first column must not decrease so it can be searched.
+
+    Args:
+        capacity (int): Maximum number of rows.
+        column_num (int): Number of columns.
+    """
+
+    def __init__(self, capacity, column_num):
+        if capacity < 1:
+            raise ValueError('Capacity must be positive')
+
+        self.capacity = capacity
+        self.columns = [array.array('d', bytes(8 * capacity)) for i in range(column_num)]
+        # Physical index of the oldest row
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def physical_index(self, i):
+        """Get the physical index of a row.
+
+        Args:
+            i (int): Logical index. 0 is the oldest row.
+
+        Returns:
+            int: Physical index.
+        """
+
+        return (self.start + i) % self.capacity
+
+    def get(self, i):
+        """Get a row.
+
+        Args:
+            i (int): Logical index. Negative indexes count from the newest row.
+
+        Returns:
+            tuple: Row.
+        """
+
+        if i < 0:
+            i += self.size
+        index = self.physical_index(i)
+
+        return tuple(column[index] for column in self.columns)
+
+    def append(self, row):
+        """Append a row.
+
+        Args:
+            row (tuple): Row.
+
+        Raises:
+            ValueError: Raises if the first column would decrease.
+        """
+
+        if self.size and row[0] < self.columns[0][self.physical_index(self.size - 1)]:
+            raise ValueError('Values of the first column must not decrease')
+
+        if self.size < self.capacity:
+            index = self.physical_index(self.size)
+            self.size += 1
+        else:
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+
+        for column, value in zip(self.columns, row):
+            column[index] = value
+
+    def replace_last(self, row):
+        """Replace the newest row.
+
+        Args:
+            row (tuple): Row.
+        """
+
+        index = self.physical_index(self.size - 1)
+        for column, value in zip(self.columns, row):
+            column[index] = value
+
+    def bisect(self, value, right=False):
+        """Find the logical index to insert a value of the first column at.
+
+        Args:
+            value (float): Value of the first column.
+            right (bool, optional): Defaults to False. Insert after equal values.
+
+        Returns:
+            int: Logical index.
+        """
+
+        first_column = self.columns[0]
+        low, high = 0, self.size
+
+        while low < high:
+            middle = (low + high) // 2
+            middle_value = first_column[self.physical_index(middle)]
+            if middle_value < value or (right and middle_value == value):
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def slice_column(self, column_index, low, high):
+        """Get values of a column between two logical indexes.
+
+        Args:
+            column_index (int): Column index.
+            low (int): Start logical index.
+            high (int): End logical index (excluded).
+
+        Returns:
+            array.array: Values.
+        """
+
+        column = self.columns[column_index]
+
+        if low >= high:
+            return array.array('d')
+
+        physical_low = self.physical_index(low)
+        physical_high = physical_low + (high - low)
+
+        if physical_high <= self.capacity:
+            return column[physical_low:physical_high]
+
+        return column[physical_low:] + column[:physical_high - self.capacity]
+
+    def find_range(self, start=None, end=None):
+        """Find logical indexes of rows whose first column is within a range.
+
+        Args:
+            start (float, optional): Defaults to None. Start of the range.
+            end (float, optional): Defaults to None. End of the range (included).
+
+        Returns:
+            tuple: Start and end logical indexes.
+        """
+
+        low = 0 if start is None else self.bisect(start)
+        high = self.size if end is None else self.bisect(end, right=True)
+
+        return low, high
+
+
+class TimeSeries():
+    """Raw samples of a value.
+
+    Args:
+        capacity (int): Maximum number of samples.
+    """
+
+    def __init__(self, capacity):
+        self.buffer = RingBuffer(capacity, 2)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def add(self, timestamp, value):
+        """Add a sample.
+
+        Args:
+            timestamp (float): UNIX timestamp.
+            value (float): Value.
+        """
+
+        self.buffer.append((timestamp, value))
+
+    def range(self, start=None, end=None):
+        """Get samples within a time range.
+
+        Args:
+            start (float, optional): Defaults to None. Start timestamp.
+            end (float, optional): Defaults to None. End timestamp (included).
+
+        Returns:
+            list: Timestamp and value of each sample.
+        """
+
+        low, high = self.buffer.find_range(start, end)
+
+        return list(zip(self.buffer.slice_column(0, low, high),
+                        self.buffer.slice_column(1, low, high)))
+
+    def aggregate(self, func, start=None, end=None):
+        """Aggregate samples within a time range.
+
+        Args:
+            func (str): Aggregate function. One of AGGREGATES.
+            start (float, optional): Defaults to None. Start timestamp.
+            end (float, optional): Defaults to None. End timestamp (included).
+
+        Returns:
+            float: Result. None if there is no sample.
+        """
+
+        low, high = self.buffer.find_range(start, end)
+        if func == 'count':
+            return high - low
+        if low >= high:
+            return None
+
+        if func == 'first':
+            return self.buffer.get(low)[1]
+        if func == 'last':
+            return self.buffer.get(high - 1)[1]
+
+        values = self.buffer.slice_column(1, low, high)
+        if func == 'sum':
+            return sum(values)
+        if func == 'mean':
+            return sum(values) / len(values)
+        if func == 'min':
+            return min(values)
+        if func == 'max':
+            return max(values)
+
+        raise ValueError('Unknown aggregate function "{}"'.format(func))
+
+
+class Rollup():
+    """Samples downsampled into fixed-interval buckets.
+    Each bucket keeps the count, sum, minimum, maximum,
+    first and last value of its samples.
+
+    Args:
+        interval (float): Bucket interval in seconds.
+        capacity (int): Maximum number of buckets.
+    """
+
+    # Columns of a bucket row
+    COLUMNS = ('time', 'count', 'sum', 'min', 'max', 'first', 'last')
+
+    def __init__(self, interval, capacity):
+        self.interval = interval
+        self.buffer = RingBuffer(capacity, len(self.COLUMNS))
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def add(self, timestamp, value):
+        """Add a sample to its bucket.
+
+        Args:
+            timestamp (float): UNIX timestamp.
+            value (float): Value.
+        """
+
+        bucket_time = timestamp - timestamp % self.interval
+
+        if self.buffer.size:
+            last_bucket = self.buffer.get(-1)
+            if last_bucket[0] == bucket_time:
+                self.buffer.replace_last((bucket_time, last_bucket[1] + 1, last_bucket[2] + value,
+                                          min(last_bucket[3], value), max(last_bucket[4], value),
+                                          last_bucket[5], value))
+                return
+
+        self.buffer.append((bucket_time, 1, value, value, value, value, value))
+
+    def range(self, start=None, end=None):
+        """Get mean values of buckets which start within a time range.
+
+        Args:
+            start (float, optional): Defaults to None. Start timestamp.
+            end (float, optional): Defaults to None. End timestamp (included).
+
+        Returns:
+            list: Start timestamp and mean value of each bucket.
+        """
+
+        low, high = self.buffer.find_range(start, end)
+
+        return [(bucket_time, bucket_sum / count)
+                for bucket_time, count, bucket_sum in zip(self.buffer.slice_column(0, low, high),
+                                                          self.buffer.slice_column(1, low, high),
+                                                          self.buffer.slice_column(2, low, high))]
+
+    def aggregate(self, func, start=None, end=None):
+        """Aggregate samples of buckets which start within a time range.
+
+        Args:
+            func (str): Aggregate function. One of AGGREGATES.
+            start (float, optional): Defaults to None. Start timestamp.
+            end (float, optional): Defaults to None. End timestamp (included).
+
+        Returns:
+            float: Result. None if there is no sample.
+        """
+
+        low, high = self.buffer.find_range(start, end)
+        if low >= high:
+            return 0 if func == 'count' else None
+
+        if func == 'first':
+            return self.buffer.get(low)[5]
+        if func == 'last':
+            return self.buffer.get(high - 1)[6]
+
+        count = sum(self.buffer.slice_column(1, low, high))
+        if func == 'count':
+            return int(count)
+        if func == 'sum':
+            return sum(self.buffer.slice_column(2, low, high))
+        if func == 'mean':
+            return sum(self.buffer.slice_column(2, low, high)) / count
+        if func == 'min':
+            return min(self.buffer.slice_column(3, low, high))
+        if func == 'max':
+            return max(self.buffer.slice_column(4, low, high))
+
+        raise ValueError('Unknown aggregate function "{}"'.format(func))
+
+
+class TimeSeriesStore():
+    """Histories of numeric data keys.
+
+    Args:
+        keys (list): Data keys to keep histories of.
+        capacity (int): Maximum number of raw samples of each key.
+        rollups (dict): Maximum number of buckets of each rollup resolution
+            in ROLLUP_INTERVALS. E.g: {'hourly': 720, 'daily': 365}
+    """
+
+    def __init__(self, keys, capacity, rollups=None):
+        self.keys = set(keys)
+        self.capacity = capacity
+        self.rollups = rollups or {}
+
+        for resolution in self.rollups:
+            if resolution not in ROLLUP_INTERVALS:
+                raise ValueError('Unknown rollup resolution "{}"'.format(resolution))
+
+        # Series of each resolution of each key
+        self.series = {}
+        # Samples are never recorded before this time
+        # so a clock going backwards does not break the order.
+        self.last_timestamp = float('-inf')
+        self._lock = threading.Lock()
+
+    def record(self, changes, timestamp):
+        """Record numeric values of tracked keys.
+
+        Args:
+            changes (dict): Changed data.
+            timestamp (float): UNIX timestamp.
+        """
+
+        with self._lock:
+            timestamp = max(timestamp, self.last_timestamp)
+            self.last_timestamp = timestamp
+
+            for key, value in changes.items():
+                if key not in self.keys:
+                    continue
+                # bool is a subclass of int but is not a measurement.
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+
+                if key not in self.series:
+                    self.series[key] = {'raw': TimeSeries(self.capacity)}
+                    for resolution, capacity in self.rollups.items():
+                        self.series[key][resolution] = Rollup(ROLLUP_INTERVALS[resolution], capacity)
+
+                for series in self.series[key].values():
+                    series.add(timestamp, value)
+
+    def get_series(self, key, resolution):
+        """Get the series of a resolution of a key.
+
+        Args:
+            key (str): Data key.
+            resolution (str): 'raw' or a rollup resolution.
+
+        Raises:
+            KeyError: Raises if the key or resolution is not kept.
+
+        Returns:
+            TimeSeries|Rollup: Series. None if no value was recorded yet.
+        """
+
+        try:
+            return self.series[key][resolution]
+        except KeyError:
+            if key not in self.keys:
+                raise KeyError('Key "{}" has no history'.format(key))
+            if resolution != 'raw' and resolution not in self.rollups:
+                raise KeyError('Resolution "{}" is not kept'.format(resolution))
+            return None
+
+    def range(self, key, start=None, end=None, resolution='raw'):
+        """Get values of a key within a time range.
+
+        Args:
+            key (str): Data key.
+            start (float, optional): Defaults to None. Start timestamp.
+            end (float, optional): Defaults to None. End timestamp (included).
+            resolution (str, optional): Defaults to 'raw'. 'raw' or a rollup resolution.
+                Rollups return the mean value of each bucket.
+
+        Raises:
+            KeyError: Raises if the key or resolution is not kept.
+
+        Returns:
+            list: Timestamp and value of each sample or bucket.
+        """
+
+        with self._lock:
+            series = self.get_series(key, resolution)
+            if series is None:
+                return []
+
+            return series.range(start, end)
+
+    def aggregate(self, key, func, start=None, end=None, resolution='raw'):
+        """Aggregate values of a key within a time range.
+
+        Args:
+            key (str): Data key.
+            func (str): Aggregate function. One of AGGREGATES.
+            start (float, optional): Defaults to None. Start timestamp.
+            end (float, optional): Defaults to None. End timestamp (included).
+            resolution (str, optional): Defaults to 'raw'. 'raw' or a rollup resolution.
+
+        Raises:
+            KeyError: Raises if the key or resolution is not kept.
+            ValueError: Raises if the aggregate function is unknown.
+
+        Returns:
+            float: Result. None if there is no value.
+        """
+
+        if func not in AGGREGATES:
+            raise ValueError('Unknown aggregate function "{}"'.format(func))
+
+        with self._lock:
+            series = self.get_series(key, resolution)
+            if series is None:
+                return 0 if func == 'count' else None
+
+            return series.aggregate(func, start, end)
@@ -0,0 +1,354 @@
+"""This module replaces the HTTP transport of service sessions
+so services can run against recorded fixtures instead of NationStates.
+
+In record mode, real responses are saved to a fixture file (cassette)
+which replay mode later answers requests from.
+
+A fixture file is a JSON object with a list of interactions.
+Each interaction has a request (method and URL) and its response
+(status code, headers, body and optionally the seconds it took). E.g:
+
+    {"version": 1,
+     "interactions": [{"request": {"method": "GET",
+                                   "url": "https://www.nationstates.net/cgi-bin/api.cgi?q=numnations"},
+                       "response": {"status": 200,
+                                    "headers": {"Content-Type": "text/xml"},
+                                    "body": "<WORLD><NUMNATIONS>1</NUMNATIONS></WORLD>",
+                                    "elapsed": 0.25}}]}
+
+Parameters which change on every request, such as the sincetime
+of happenings, are ignored when replayed requests are matched.
+"""
+
+
+import atexit
+import collections
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import requests
+import requests.adapters
+import requests.structures
+
+from meguca import exceptions
+
+
+logger = logging.getLogger(__name__)
+
+
+# Version of the fixture file format
+FIXTURE_VERSION = 1
+
+# Transport modes
+LIVE_MODE = 'live'
+RECORD_MODE = 'record'
+REPLAY_MODE = 'replay'
+
+# URL parameters ignored when requests are matched in replay mode
+VOLATILE_PARAMS = ('sincetime', 'beforetime', 'sinceid', 'beforeid')
+
+# Cassettes being recorded by file path.
+# Sessions recording to the same file share one cassette.
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+def load_fixtures(path):
+    """Load interactions from a fixture file.
+
+    Args:
+        path (str): Fixture file path.
+
+    Raises:
+        exceptions.TransportError: Raises if the file has another format version.
+
+    Returns:
+        list: Interactions.
+    """
+
+    with open(path, encoding='utf-8') as f:
+        fixtures = json.load(f)
+
+    if fixtures.get('version') != FIXTURE_VERSION:
+        raise exceptions.TransportError('Fixture file "{}" has an unsupported format version'.format(path))
+
+    return fixtures['interactions']
+
+
+def save_fixtures(path, interactions):
+    """Save interactions to a fixture file atomically.
+
+    Args:
+        path (str): Fixture file path.
+        interactions (list): Interactions.
+    """
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': FIXTURE_VERSION, 'interactions': interactions}, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def normalize_url(url, volatile_params):
+    """Remove volatile parameters from a URL so requests which
+    only differ in them match the same recorded responses.
+
+    Args:
+        url (str): URL.
+        volatile_params (tuple): Names of parameters to remove.
+
+    Returns:
+        str: Normalized URL.
+    """
+
+    base, sep, query = url.partition('?')
+    if not sep:
+        return url
+
+    params = [param for param in re.split('[;&]', query)
+              if param and param.split('=', 1)[0] not in volatile_params]
+
+    return '{}?{}'.format(base, ';'.join(params))
+
+
+def build_response(request, recorded):
+    """Build a response from a recorded one.
+
+    Args:
+        request (requests.PreparedRequest): Request the response answers.
+        recorded (dict): Recorded status code, headers and body.
+
+    Returns:
+        requests.Response: Response.
+    """
+
+    resp = requests.Response()
+    resp.status_code = recorded['status']
+    resp.headers = requests.structures.CaseInsensitiveDict(recorded.get('headers', {}))
+    resp._content = recorded.get('body', '').encode('utf-8')
+    # Streamed reads iterate over the recorded body
+    resp._content_consumed = True
+    resp.encoding = 'utf-8'
+    resp.url = request.url
+    resp.request = request
+    resp.reason = recorded.get('reason', '')
+
+    return resp
+
+
+def serialize_response(resp):
+    """Convert a response into a recorded one.
+
+    Args:
+        resp (requests.Response): Response.
+
+    Returns:
+        dict: Status code, reason, headers, body and seconds the response took.
+    """
+
+    return {'status': resp.status_code,
+            'reason': resp.reason,
+            'headers': dict(resp.headers),
+            'body': resp.content.decode(resp.encoding or 'utf-8', errors='replace'),
+            'elapsed': resp.elapsed.total_seconds()}
+
+
+class Cassette():
+    """Interactions recorded to a fixture file.
+    The file is saved when Meguca exits or save() is called.
+
+    Args:
+        path (str): Fixture file path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.interactions = []
+        self._lock = threading.Lock()
+
+        atexit.register(self.save)
+
+    def record(self, request, resp):
+        """Record an interaction.
+
+        Args:
+            request (requests.PreparedRequest): Request.
+            resp (requests.Response): Response.
+        """
+
+        interaction = {'request': {'method': request.method.upper(), 'url': request.url},
+                       'response': serialize_response(resp)}
+
+        with self._lock:
+            self.interactions.append(interaction)
+
+        logger.debug('Recorded response for %s %s', request.method, request.url)
+
+    def save(self):
+        """Save recorded interactions."""
+
+        with self._lock:
+            interactions = list(self.interactions)
+
+        save_fixtures(self.path, interactions)
+        logger.info('Saved %d recorded responses to "%s"', len(interactions), self.path)
+
+
+def get_cassette(path):
+    """Get the cassette recording to a file.
+
+    Args:
+        path (str): Fixture file path.
+
+    Returns:
+        Cassette: Cassette.
+    """
+
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+
+        return _cassettes[path]
+
+
+class RecordAdapter(requests.adapters.BaseAdapter):
+    """Transport adapter which sends requests through another adapter
+    and records their responses. The wrapped adapter keeps its
+    connection pool settings.
+
+    Args:
+        cassette (Cassette): Cassette to record to.
+        adapter (requests.adapters.BaseAdapter): Adapter to send requests with.
+    """
+
+    def __init__(self, cassette, adapter):
+        super().__init__()
+        self.cassette = cassette
+        self.adapter = adapter
+
+    def send(self, request, **kwargs):
+        resp = self.adapter.send(request, **kwargs)
+        self.cassette.record(request, resp)
+
+        return resp
+
+    def close(self):
+        self.adapter.close()
+
+
+class ReplayAdapter(requests.adapters.BaseAdapter):
+    """Transport adapter which answers requests with recorded responses.
+
+    Requests are matched by method and URL without volatile parameters.
+    Responses to the same request are replayed in recorded order.
+    The last one is repeated once all of them are replayed
+    so a request can be replayed any number of times.
+
+    Args:
+        interactions (list): Recorded interactions.
+        latency (float|str, optional): Defaults to None. Seconds to wait
+            before answering. 'recorded' waits as long as the recorded response took.
+        volatile_params (tuple, optional): Defaults to VOLATILE_PARAMS.
+            URL parameters to ignore when requests are matched.
+    """
+
+    def __init__(self, interactions, latency=None, volatile_params=VOLATILE_PARAMS):
+        super().__init__()
+        self.latency = latency
+        self.volatile_params = tuple(volatile_params)
+
+        # Recorded responses by request method and normalized URL
+        self.responses = collections.defaultdict(list)
+        for interaction in interactions:
+            request = interaction['request']
+            key = (request['method'].upper(), normalize_url(request['url'], self.volatile_params))
+            self.responses[key].append(interaction['response'])
+
+        # Number of times each request was replayed
+        self.replay_counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        """Answer a request.
+
+        Args:
+            request (requests.PreparedRequest): Request.
+
+        Raises:
+            exceptions.TransportError: Raises if the request was not recorded.
+
+        Returns:
+            requests.Response: Recorded response.
+        """
+
+        key = (request.method.upper(), normalize_url(request.url, self.volatile_params))
+        recorded_responses = self.responses.get(key)
+        if not recorded_responses:
+            raise exceptions.TransportError('No recorded response for {} {}'.format(request.method,
+                                                                                   request.url))
+
+        with self._lock:
+            index = min(self.replay_counts[key], len(recorded_responses) - 1)
+            self.replay_counts[key] += 1
+
+        recorded = recorded_responses[index]
+
+        if self.latency == 'recorded':
+            time.sleep(recorded.get('elapsed', 0))
+        elif self.latency:
+            time.sleep(self.latency)
+
+        logger.debug('Replayed response for %s %s', request.method, request.url)
+
+        return build_response(request, recorded)
+
+    def close(self):
+        pass
+
+
+def mount(session, transport_config):
+    """Mount the configured transport on a session.
+
+    Args:
+        session (requests.Session): Session.
+        transport_config (dict): Transport configuration.
+            mode -- 'live' (default), 'record' or 'replay'
+            path -- Fixture file path
+            latency -- Simulated latency of replayed responses in seconds
+                or 'recorded' to use the recorded latency
+            volatile_params -- URL parameters to ignore when replayed
+                requests are matched. Defaults to VOLATILE_PARAMS.
+
+    Raises:
+        exceptions.ConfigError: Raises if the mode is unknown.
+    """
+
+    mode = transport_config.get('mode', LIVE_MODE)
+
+    if mode == LIVE_MODE:
+        return
+
+    if mode == RECORD_MODE:
+        cassette = get_cassette(transport_config['path'])
+        # Existing adapters are wrapped so their pool settings are kept.
+        # An adapter mounted on both prefixes gets one wrapper.
+        wrappers = {}
+        for prefix in ('https://', 'http://'):
+            adapter = session.adapters.get(prefix) or requests.adapters.HTTPAdapter()
+            if id(adapter) not in wrappers:
+                wrappers[id(adapter)] = RecordAdapter(cassette, adapter)
+            session.mount(prefix, wrappers[id(adapter)])
+    elif mode == REPLAY_MODE:
+        adapter = ReplayAdapter(load_fixtures(transport_config['path']),
+                                transport_config.get('latency'),
+                                transport_config.get('volatile_params', VOLATILE_PARAMS))
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+    else:
+        raise exceptions.ConfigError('Unknown transport mode "{}"'.format(mode))
+
+    logger.debug('Mounted %s transport', mode)
@@ -1,4 +1,5 @@
 import os
+import inspect
 import configparser
 from unittest import mock
 
@@ -9,9 +10,20 @@ import pytest
 @pytest.fixture
 def mock_plg():
     """A mock plugin with standard entry methods and config.
-    It behaves like a real plugin."""
+    It behaves like a real plugin.
+
+    The generator takes:
+        name, id: Plugin name and Id.
+        service: Give the plugin only a get() entry method.
+        category: Category name.
+        produces, consumes: Keys of the Data section. No Data section is added if both are None.
+        plugin_object: Plugin object to use instead of a mock one.
+        signature: Function whose signature the run() entry method gets.
+        **entry_methods: Entry methods which replace standard ones.
+    """
 
-    def gen_mock_plg(name='Test', id='test', service=False):
+    def gen_mock_plg(name='Test', id='test', service=False, category=None, produces=None, consumes=None,
+                     plugin_object=None, signature=None, **entry_methods):
         def stub_run():
             return {name: 'Test'}
 
@@ -21,19 +33,33 @@ def mock_plg():
         def stub_dry_run():
             return {name: 'TestDry'}
 
-        if service:
-            def stub_get():
-                return 'TestGet'
-            mock_plg_obj = mock.Mock(get=stub_get)
-        else:
-            mock_plg_obj = mock.Mock(run=stub_run, prepare=stub_prepare, dry_run=stub_dry_run)
+        if plugin_object is None:
+            if service:
+                def stub_get():
+                    return 'TestGet'
+                methods = {'get': stub_get}
+            else:
+                methods = {'run': stub_run, 'prepare': stub_prepare, 'dry_run': stub_dry_run}
+            methods.update(entry_methods)
+            plugin_object = mock.Mock(**methods)
+
+        if signature is not None:
+            plugin_object.run.__signature__ = inspect.signature(signature)
 
         config = configparser.ConfigParser()
         config['Core'] = {'ConfigFile': 'TestFile', 'Id': id}
-
-        mock_plg = mock.Mock(plugin_object=mock_plg_obj,
+        if produces is not None or consumes is not None:
+            config['Data'] = {}
+            if produces is not None:
+                config['Data']['Produces'] = produces
+            if consumes is not None:
+                config['Data']['Consumes'] = consumes
+
+        mock_plg = mock.Mock(plugin_object=plugin_object,
                              details=config)
         type(mock_plg).name = mock.PropertyMock(return_value=name)
+        if category is not None:
+            mock_plg.category = category
 
         return mock_plg
 
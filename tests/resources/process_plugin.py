@@ -0,0 +1,7 @@
+from meguca import plugin_categories
+
+
+class EdgeCount(plugin_categories.Stat):
+    def run(self, data):
+        return {'edge_num': data['endos'].number_of_edges(),
+                'endos_copy': data['endos']}
@@ -0,0 +1,83 @@
+import configparser
+import tracemalloc
+from unittest import mock
+
+import pytest
+
+from meguca import bench
+from meguca import meguca
+
+
+def gen_plg(name, plg_id, **entry_methods):
+    details = configparser.ConfigParser()
+    details['Core'] = {'Id': plg_id}
+
+    plg = mock.Mock(plugin_object=mock.Mock(spec=list(entry_methods), **entry_methods),
+                    details=details, category='Collector')
+    type(plg).name = mock.PropertyMock(return_value=name)
+
+    return plg
+
+
+class TestBench():
+    def test_summarize(self):
+        samples = [{'wall_time': wall_time, 'cpu_time': 0.1} for wall_time in (0.1, 0.2, 0.3, 0.4)]
+        memory_samples = [{'peak_mem': peak_mem, 'allocated_blocks': 2} for peak_mem in (10, 5)]
+
+        summary = bench.summarize(samples, memory_samples)
+
+        assert summary['runs'] == 4
+        assert summary['latency']['p50'] == 0.2
+        assert summary['latency']['max'] == 0.4
+        assert summary['latency']['mean'] == pytest.approx(0.25)
+        assert summary['throughput'] == pytest.approx(4)
+        assert summary['peak_mem'] == 10
+        assert summary['allocated_blocks'] == 2
+
+    def test_measure_time_without_tracing(self):
+        tracing = []
+
+        bench.measure_time(lambda: tracing.append(tracemalloc.is_tracing()))
+
+        assert tracing == [False]
+
+    def test_measure_memory(self):
+        sample = bench.measure_memory(lambda: bytearray(1000000))
+
+        assert sample['peak_mem'] >= 1000000
+        assert not tracemalloc.is_tracing()
+
+    def test_bench_plugins(self):
+        run = mock.Mock(return_value={'Test': 1})
+        plg = gen_plg('Test', 'test', prepare=lambda: {'Test': 0}, run=run)
+        other_plg = gen_plg('Other', 'other', run=lambda: None)
+        plg_manager = mock.Mock(get_plugins=mock.Mock(return_value=[]),
+                                get_all_plugins=mock.Mock(return_value=[plg, other_plg]))
+        meguca_ins = meguca.Meguca(plg_manager, {}, {})
+
+        results = bench.bench(meguca_ins, ['test'], runs=3, warmup=1)
+
+        assert list(results['plugins']) == ['test']
+        assert set(results['plugins']['test']) == {'prepare', 'run'}
+        assert results['plugins']['test']['run']['runs'] == 3
+        assert results['process_peak_rss'] is None or results['process_peak_rss'] > 0
+        # Warmup, timed and traced runs
+        assert run.call_count == 5
+        assert meguca_ins.data['Test'] == 1
+        meguca_ins.shutdown()
+
+    def test_bench_plugin_without_phase(self):
+        plg = gen_plg('Test', 'test', run=lambda: None)
+        plg_manager = mock.Mock(get_plugins=mock.Mock(return_value=[]),
+                                get_all_plugins=mock.Mock(return_value=[plg]))
+        meguca_ins = meguca.Meguca(plg_manager, {}, {})
+
+        results = bench.bench(meguca_ins, ['test'], runs=1, warmup=0)
+
+        assert list(results['plugins']['test']) == ['run']
+        meguca_ins.shutdown()
+
+    @pytest.mark.parametrize('option', ['--runs', '--memory-runs'])
+    def test_parse_args_rejects_no_runs(self, option):
+        with pytest.raises(SystemExit):
+            bench.parse_args(['test', '--fixtures', 'fixtures.json', option, '0'])
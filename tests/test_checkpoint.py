@@ -0,0 +1,56 @@
+import gzip
+import os
+import pickle
+import time
+from unittest import mock
+
+import networkx as nx
+
+from meguca import checkpoint
+
+
+class TestCheckpoint():
+    def test_save_and_load(self, tmp_path):
+        path = str(tmp_path / 'checkpoint.pkl.gz')
+        graph = nx.DiGraph([('nation1', 'nation2')])
+
+        checkpoint.save(path, {'endos': graph, 'Test': 1}, {'plugin': {'cursor': '1'}})
+        saved = checkpoint.load(path)
+
+        assert saved['data']['Test'] == 1
+        assert list(saved['data']['endos'].edges) == [('nation1', 'nation2')]
+        assert isinstance(saved['data']['endos'], nx.DiGraph)
+        assert saved['plugins'] == {'plugin': {'cursor': '1'}}
+        assert not os.path.exists(path + '.tmp')
+
+    def test_save_replaces_old_checkpoint(self, tmp_path):
+        path = str(tmp_path / 'checkpoint.pkl.gz')
+
+        checkpoint.save(path, {'Test': 1}, {})
+        checkpoint.save(path, {'Test': 2}, {})
+
+        assert checkpoint.load(path)['data'] == {'Test': 2}
+
+    def test_load_non_existent_checkpoint(self, tmp_path):
+        assert checkpoint.load(str(tmp_path / 'checkpoint.pkl.gz')) is None
+
+    def test_load_corrupted_checkpoint(self, tmp_path):
+        path = tmp_path / 'checkpoint.pkl.gz'
+        path.write_bytes(b'Test')
+
+        assert checkpoint.load(str(path)) is None
+
+    def test_load_checkpoint_with_other_version(self, tmp_path):
+        path = str(tmp_path / 'checkpoint.pkl.gz')
+        with gzip.open(path, 'wb') as f:
+            pickle.dump({'version': 0}, f)
+
+        assert checkpoint.load(path) is None
+
+    def test_load_too_old_checkpoint(self, tmp_path):
+        path = str(tmp_path / 'checkpoint.pkl.gz')
+        with mock.patch('time.time', return_value=time.time() - 100):
+            checkpoint.save(path, {'Test': 1}, {})
+
+        assert checkpoint.load(path, max_age=50) is None
+        assert checkpoint.load(path, max_age=200)['data'] == {'Test': 1}
@@ -1,6 +1,9 @@
+import threading
+
 import pytest
 
 from meguca import data
+from meguca import timeseries
 from meguca import exceptions
 
 
@@ -31,3 +34,135 @@ class TestDataStore():
         ins.raise_notyetexist = True
 
         assert ins.raise_notyetexist == True
+
+    def test_setitem_changes_version(self):
+        ins = data.DataStore()
+
+        ins['a'] = 1
+        ins['a'] = 2
+
+        assert ins.versions['a'] == 2
+
+    def test_setitem_with_equal_value_keeps_version(self):
+        ins = data.DataStore()
+
+        ins['a'] = [1]
+        ins['a'] = [1]
+
+        assert ins.versions['a'] == 1
+
+    def test_setitem_with_same_object_changes_version(self):
+        ins = data.DataStore()
+        value = [1]
+        ins['a'] = value
+
+        value.append(2)
+        ins['a'] = value
+
+        assert ins.versions['a'] == 2
+
+    def test_track_reads(self):
+        ins = data.DataStore()
+        ins.update({'a': 1, 'b': 2})
+        ins['a'] = 3
+
+        with data.track_reads() as reads:
+            ins['a']
+            'c' in ins
+
+        assert reads == {'a': 2, 'c': 0}
+
+    def test_reads_are_not_recorded_outside_tracking(self):
+        ins = data.DataStore()
+        ins.update({'a': 1})
+
+        with data.track_reads() as reads:
+            pass
+        ins['a']
+
+        assert reads == {}
+
+    def test_snapshot_is_not_affected_by_later_commits(self):
+        ins = data.DataStore()
+        ins.update({'a': 1, 'b': 2})
+
+        snapshot = ins.snapshot()
+        ins.update({'a': 3, 'c': 4})
+        del ins['b']
+
+        assert dict(snapshot) == {'a': 1, 'b': 2}
+        assert ins == {'a': 3, 'c': 4}
+
+    def test_snapshot_with_non_existing_item(self):
+        ins = data.DataStore(raise_notyetexist=True)
+
+        with pytest.raises(exceptions.NotYetExist):
+            ins.snapshot()['a']
+
+    def test_commit_with_non_existing_deleted_key_applies_no_change(self):
+        ins = data.DataStore()
+        ins.update({'a': 1})
+
+        with pytest.raises(KeyError):
+            ins.commit({'a': 2}, deleted=('b',))
+
+        assert ins == {'a': 1}
+        assert ins.versions['a'] == 1
+
+    def test_readers_never_see_half_applied_commits(self):
+        ins = data.DataStore()
+        ins.update({'a': 0, 'b': 0})
+        stop = threading.Event()
+
+        def write():
+            i = 0
+            while not stop.is_set():
+                i += 1
+                ins.update({'a': i, 'b': i})
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for i in range(10000):
+                snapshot = ins.snapshot()
+                assert snapshot['a'] == snapshot['b']
+        finally:
+            stop.set()
+            writer.join()
+
+    def test_record_timeseries(self):
+        ins = data.DataStore()
+        ins.timeseries = timeseries.TimeSeriesStore(['a'], 10)
+
+        ins.update({'a': 1, 'b': 2})
+        ins.record_timeseries()
+        ins['a'] = 2
+        ins['a'] = 3
+        ins.record_timeseries()
+        ins.record_timeseries()
+
+        assert [value for timestamp, value in ins.timeseries.range('a')] == [1, 3, 3]
+        assert ins.snapshot().timeseries is ins.timeseries
+
+    def test_track_reads_of_keys_and_length(self):
+        ins = data.DataStore()
+        ins['a'] = 1
+        snapshot = ins.snapshot()
+
+        for accessor in (lambda: list(ins), lambda: len(ins), lambda: list(snapshot.items()),
+                         lambda: len(snapshot)):
+            with data.track_reads() as reads:
+                accessor()
+
+            assert data.UNTRACKED in reads
+
+    def test_track_reads_of_timeseries_and_profiler(self):
+        ins = data.DataStore()
+        snapshot = ins.snapshot()
+
+        for accessor in (lambda: ins.timeseries, lambda: snapshot.timeseries,
+                         lambda: ins.profiler, lambda: snapshot.profiler):
+            with data.track_reads() as reads:
+                accessor()
+
+            assert data.UNTRACKED in reads
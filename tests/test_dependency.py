@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from meguca import dependency
+from meguca import exceptions
+from meguca import plugin
+
+
+class TestGetDeclaredKeys():
+    def test_with_declared_keys(self, mock_plg):
+        plg = mock_plg(id='a', produces='key1, key2')
+
+        assert dependency.get_declared_keys(plg, 'Produces') == ['key1', 'key2']
+
+    def test_with_no_data_section(self, mock_plg):
+        plg = mock_plg(id='a')
+
+        assert dependency.get_declared_keys(plg, 'Consumes') == []
+
+
+class TestBuildGraph():
+    def test_with_dependent_plugins(self, mock_plg):
+        plugins = [mock_plg(id='a', produces='key1'), mock_plg(id='b', consumes='key1')]
+
+        graph = dependency.build_graph(plugins)
+
+        assert list(graph.edges) == [('a', 'b')]
+
+    def test_with_key_from_available_keys(self, mock_plg):
+        plugins = [mock_plg(id='a', consumes='key1')]
+
+        graph = dependency.build_graph(plugins, {'key1'})
+
+        assert list(graph.edges) == []
+
+    def test_with_missing_producer(self, mock_plg):
+        plugins = [mock_plg(id='a', consumes='key1')]
+
+        with pytest.raises(exceptions.DependencyError):
+            dependency.build_graph(plugins)
+
+    def test_with_duplicate_producers(self, mock_plg):
+        plugins = [mock_plg(id='a', produces='key1'), mock_plg(id='b', produces='key1')]
+
+        with pytest.raises(exceptions.DependencyError):
+            dependency.build_graph(plugins)
+
+    def test_with_cycle(self, mock_plg):
+        plugins = [mock_plg(id='a', produces='key1', consumes='key2'),
+                   mock_plg(id='b', produces='key2', consumes='key1')]
+
+        with pytest.raises(exceptions.DependencyError):
+            dependency.build_graph(plugins)
+
+
+class TestSortPlugins():
+    def test_sort_plugins_with_chain_of_three(self, mock_plg):
+        plugins = [mock_plg(id='c', consumes='key2'),
+                   mock_plg(id='b', produces='key2', consumes='key1'),
+                   mock_plg(id='a', produces='key1')]
+        graph = dependency.build_graph(plugins)
+
+        result = dependency.sort_plugins(graph)
+
+        assert [plg.details['Core']['Id'] for plg in result] == ['a', 'b', 'c']
+
+
+class TestGroupPlugins():
+    def test_group_plugins(self, mock_plg):
+        plugins = [mock_plg(id='c', consumes='key1, key2'),
+                   mock_plg(id='b', produces='key2'),
+                   mock_plg(id='a', produces='key1')]
+        graph = dependency.build_graph(plugins)
+
+        result = dependency.group_plugins(graph)
+
+        assert [[plg.details['Core']['Id'] for plg in level] for level in result] == [['a', 'b'], ['c']]
+
+
+class TestBundledPlugins():
+    def test_build_graph_from_bundled_plugins(self):
+        plg_manager = plugin.PlgManager(os.path.join(os.path.dirname(plugin.__file__), 'plugins'), 'plugin')
+        plg_manager.load_plugins()
+        available_keys = set()
+        for plg in plg_manager.get_plugins('Collector'):
+            available_keys.update(dependency.get_declared_keys(plg, 'Produces'))
+
+        graph = dependency.build_graph(plg_manager.get_plugins('Stat'), available_keys)
+
+        assert 'region_endo_stats' in graph
@@ -0,0 +1,30 @@
+from meguca import file_watcher
+
+
+class TestFileWatcher():
+    def test_poll_with_no_changes(self, tmp_path):
+        (tmp_path / 'test.py').write_text('a = 1')
+        watcher = file_watcher.FileWatcher([str(tmp_path)], ('.py',))
+
+        assert watcher.poll() == []
+
+    def test_poll_with_modified_added_and_removed_files(self, tmp_path):
+        (tmp_path / 'modified.py').write_text('a = 1')
+        (tmp_path / 'removed.py').write_text('a = 1')
+        watcher = file_watcher.FileWatcher([str(tmp_path)], ('.py',))
+
+        (tmp_path / 'modified.py').write_text('a = 10')
+        (tmp_path / 'removed.py').unlink()
+        (tmp_path / 'added.py').write_text('a = 1')
+
+        assert watcher.poll() == [str(tmp_path / 'added.py'), str(tmp_path / 'modified.py'),
+                                  str(tmp_path / 'removed.py')]
+        assert watcher.poll() == []
+
+    def test_poll_ignores_unwatched_extensions(self, tmp_path):
+        watcher = file_watcher.FileWatcher([str(tmp_path)], ('.py', '.toml'))
+
+        (tmp_path / 'test.txt').write_text('a')
+        (tmp_path / 'test.toml').write_text('a = 1')
+
+        assert watcher.poll() == [str(tmp_path / 'test.toml')]
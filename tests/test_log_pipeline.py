@@ -0,0 +1,167 @@
+import queue
+import logging
+from unittest import mock
+
+import pytest
+
+from meguca import info
+from meguca import log_pipeline
+
+
+def gen_record(msg, *args, name='test', level=logging.DEBUG):
+    return logging.LogRecord(name, level, __file__, 0, msg, args, None)
+
+
+class TestSummarize():
+    def test_summarize_long_string(self):
+        assert log_pipeline.summarize('a' * 10, 5, 5) == "'aaaaa'... (10 characters)"
+
+    def test_summarize_large_collection(self):
+        assert log_pipeline.summarize(list(range(10)), 5, 5) == '<list with 10 items>'
+
+    def test_summarize_small_values(self):
+        assert log_pipeline.summarize('abc', 5, 5) == 'abc'
+        assert log_pipeline.summarize([1, 2], 5, 5) == [1, 2]
+        assert log_pipeline.summarize(123456789, 5, 5) == 123456789
+
+
+class TestIsImmutable():
+    @pytest.mark.parametrize('value, expected', [
+        ('a', True), (1, True), (None, True), (('a', (1, 2.0)), True),
+        (log_pipeline.Summary('<list with 10 items>'), True),
+        ([1], False), (('a', [1]), False), ({'a': 1}, False)
+    ])
+    def test_is_immutable(self, value, expected):
+        assert log_pipeline.is_immutable(value) == expected
+
+
+class TestSummarizingQueueHandler():
+    def test_prepare_summarizes_args(self):
+        handler = log_pipeline.SummarizingQueueHandler(queue.SimpleQueue(), max_items=5)
+
+        record = handler.prepare(gen_record('Events: %r', list(range(10))))
+
+        assert record.getMessage() == 'Events: <list with 10 items>'
+
+    def test_prepare_in_verbose_mode(self):
+        handler = log_pipeline.SummarizingQueueHandler(queue.SimpleQueue(), verbose=True, max_items=5)
+
+        record = handler.prepare(gen_record('Events: %r', list(range(10))))
+
+        assert record.getMessage() == 'Events: {!r}'.format(list(range(10)))
+
+    def test_prepare_leaves_formatting_to_listener(self):
+        handler = log_pipeline.SummarizingQueueHandler(queue.SimpleQueue())
+        handler.format = mock.Mock()
+
+        record = handler.prepare(gen_record('Nation %s has %d endorsements', 'a', 2))
+
+        handler.format.assert_not_called()
+        assert record.args == ('a', 2)
+        assert record.getMessage() == 'Nation a has 2 endorsements'
+
+    def test_prepare_builds_message_of_mutable_args(self):
+        handler = log_pipeline.SummarizingQueueHandler(queue.SimpleQueue())
+        events = [1]
+
+        record = handler.prepare(gen_record('Events: %r', events))
+        events.append(2)
+
+        assert record.args is None
+        assert record.getMessage() == 'Events: [1]'
+
+    def test_prepare_does_not_change_original_record(self):
+        handler = log_pipeline.SummarizingQueueHandler(queue.SimpleQueue(), max_items=5)
+        original = gen_record('Events: %r', list(range(10)))
+
+        handler.prepare(original)
+
+        assert original.args == (list(range(10)),)
+
+    def test_prepare_record_with_suppressed_records(self):
+        handler = log_pipeline.SummarizingQueueHandler(queue.SimpleQueue())
+        record = gen_record('Test')
+        record.suppressed = 3
+
+        record = handler.prepare(record)
+
+        assert record.getMessage() == 'Test [3 earlier messages suppressed]'
+
+
+class TestRateLimitFilter():
+    @mock.patch('time.monotonic', return_value=0)
+    def test_filter_drops_records_beyond_burst(self, mocked_monotonic):
+        rate_limit = log_pipeline.RateLimitFilter(1, 2)
+
+        results = [rate_limit.filter(gen_record('Test')) for i in range(4)]
+
+        assert results == [True, True, False, False]
+
+    def test_filter_passes_records_after_refill(self):
+        rate_limit = log_pipeline.RateLimitFilter(1, 1)
+
+        with mock.patch('time.monotonic', return_value=0):
+            rate_limit.filter(gen_record('Test'))
+            rate_limit.filter(gen_record('Test'))
+        with mock.patch('time.monotonic', return_value=1):
+            record = gen_record('Test')
+            result = rate_limit.filter(record)
+
+        assert result
+        assert record.suppressed == 1
+
+    @mock.patch('time.monotonic', return_value=0)
+    def test_filter_limits_loggers_separately(self, mocked_monotonic):
+        rate_limit = log_pipeline.RateLimitFilter(1, 1)
+
+        rate_limit.filter(gen_record('Test', name='a'))
+
+        assert rate_limit.filter(gen_record('Test', name='b'))
+
+    @mock.patch('time.monotonic', return_value=0)
+    def test_filter_never_drops_warnings(self, mocked_monotonic):
+        rate_limit = log_pipeline.RateLimitFilter(1, 1)
+        rate_limit.filter(gen_record('Test'))
+
+        assert rate_limit.filter(gen_record('Test', level=logging.WARNING))
+
+
+class TestSetup():
+    @pytest.fixture
+    def memory_logging(self):
+        config = {'version': 1,
+                  'disable_existing_loggers': False,
+                  'handlers': {'memory': {'class': 'logging.handlers.BufferingHandler',
+                                          'capacity': 100}},
+                  'root': {'level': 'DEBUG', 'handlers': ['memory']}}
+
+        log_pipeline.setup(config, {'max_items': 5})
+        memory_handler = log_pipeline._listener.handlers[0]
+
+        yield memory_handler
+
+        log_pipeline.setup(info.LOGGING_CONFIG, info.LOG_PIPELINE_CONFIG)
+
+    def test_yapsy_debug_records_are_dropped(self):
+        log_pipeline.setup(info.LOGGING_CONFIG, info.LOG_PIPELINE_CONFIG)
+
+        assert not logging.getLogger('yapsy').isEnabledFor(logging.DEBUG)
+        assert logging.getLogger('yapsy').isEnabledFor(logging.WARNING)
+
+    def test_records_reach_handlers_through_queue(self, memory_logging):
+        root_logger = logging.getLogger()
+
+        logging.getLogger('test').debug('Events: %r', list(range(10)))
+        log_pipeline.stop()
+
+        assert isinstance(root_logger.handlers[0], log_pipeline.SummarizingQueueHandler)
+        assert [record.getMessage() for record in memory_logging.buffer] == ['Events: <list with 10 items>']
+
+    def test_exceptions_are_formatted_by_listener(self, memory_logging):
+        try:
+            raise ValueError('Test')
+        except ValueError:
+            logging.getLogger('test').exception('Failed')
+        log_pipeline.stop()
+
+        assert 'ValueError: Test' in logging.Formatter().format(memory_logging.buffer[0])
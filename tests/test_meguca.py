@@ -1,10 +1,15 @@
+import os
 import time
-import configparser
+import shutil
+import signal
+import asyncio
+import threading
 from unittest import mock
 
 import pytest
 import freezegun
 
+from meguca import data
 from meguca import meguca
 from meguca import plugin
 from meguca import utils
@@ -116,6 +121,169 @@ class TestRunPlugin():
         assert meguca_ins.data['Test'] == 'Test'
 
 
+class TestProfilePlugin():
+    @pytest.mark.usefixtures('mock_plg')
+    def test_run_plugin_records_profile(self, mock_plg):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+
+        meguca_ins.run_plugin(mock_plg(), 'run')
+
+        assert meguca_ins.data.profiler.summary()['Test']['run']['count'] == 1
+
+    @pytest.mark.usefixtures('mock_plg')
+    def test_run_plugin_with_coroutine_entry_method_records_profile(self, mock_plg):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+
+        async def stub_run():
+            return {'Test': 'Test'}
+
+        mock_plg = mock_plg()
+        mock_plg.plugin_object.run = stub_run
+
+        meguca_ins.run_plugin(mock_plg, 'run')
+        meguca_ins.event_loop.stop()
+
+        assert meguca_ins.profiler.summary()['Test']['run']['count'] == 1
+
+
+class TestRunAsyncPlugin():
+    @pytest.mark.usefixtures('mock_plg')
+    def test_run_plugin_with_coroutine_entry_method(self, mock_plg):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+        meguca_ins.data.update({'TestData': 'Test Data'})
+
+        async def stub_run(data):
+            await asyncio.sleep(0)
+            return {'Test': data['TestData']}
+
+        mock_plg = mock_plg()
+        mock_plg.plugin_object.run = stub_run
+
+        meguca_ins.run_plugin(mock_plg, 'run')
+        meguca_ins.event_loop.stop()
+
+        assert meguca_ins.data['Test'] == 'Test Data'
+
+    @pytest.mark.usefixtures('mock_plg')
+    def test_submit_plugin(self, mock_plg):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+
+        async def stub_run():
+            await asyncio.sleep(0)
+            return {'Test': 'Test'}
+
+        mock_plg = mock_plg()
+        mock_plg.plugin_object.run = stub_run
+
+        meguca_ins.submit_plugin(mock_plg, 'run')
+        meguca_ins.pending_coros['test'].result()
+        meguca_ins.event_loop.stop()
+
+        assert meguca_ins.data['Test'] == 'Test'
+
+    @pytest.mark.usefixtures('mock_plg')
+    def test_submit_plugin_with_previous_run_not_finished(self, mock_plg):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+        release = threading.Event()
+        calls = []
+
+        async def stub_run():
+            calls.append(1)
+            while not release.is_set():
+                await asyncio.sleep(0.01)
+
+        mock_plg = mock_plg()
+        mock_plg.plugin_object.run = stub_run
+
+        meguca_ins.submit_plugin(mock_plg, 'run')
+        meguca_ins.submit_plugin(mock_plg, 'run')
+        release.set()
+        meguca_ins.pending_coros['test'].result()
+        meguca_ins.event_loop.stop()
+
+        assert calls == [1]
+
+    @pytest.mark.usefixtures('mock_plg')
+    def test_schedule_plugins_with_coroutine_entry_method(self, mock_plg, general_config):
+        async def stub_run():
+            return {'Test': 'Test'}
+
+        mock_plg = mock_plg()
+        mock_plg.plugin_object.run = stub_run
+        plg_manager = mock.Mock(get_plugins=mock.Mock(return_value=[mock_plg]))
+        general_config['plugin_schedule'] = {'test': {'schedule_mode': 'interval', 'seconds': 1}}
+        meguca_ins = meguca.Meguca(plg_manager, general_config, {})
+
+        meguca_ins.schedule_plugins('Collector')
+
+        assert meguca_ins.scheduler.get_jobs()[0].func == meguca_ins.submit_plugin
+
+
+class TestArgsPlan():
+    @pytest.mark.usefixtures('mock_plg')
+    def test_compile_args_plan_ignores_local_variables(self, mock_plg):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+        meguca_ins.services = {'service': 'Test'}
+
+        def stub_run(data):
+            service = None
+            return {'Test': service}
+
+        mock_plg = mock_plg()
+        mock_plg.plugin_object.run = stub_run
+
+        assert meguca_ins.compile_args_plan(mock_plg, 'run') == ('data',)
+
+    @pytest.mark.usefixtures('mock_plg')
+    def test_compile_args_plan_with_unknown_dependency(self, mock_plg):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+
+        def stub_run(data, unknown):
+            pass
+
+        mock_plg = mock_plg()
+        mock_plg.plugin_object.run = stub_run
+
+        with pytest.raises(exceptions.PluginError):
+            meguca_ins.compile_args_plan(mock_plg, 'run')
+
+    @pytest.mark.usefixtures('mock_plg')
+    def test_compile_args_plan_with_unknown_param_with_default_value(self, mock_plg):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+
+        def stub_run(config, unknown=None, **kwargs):
+            pass
+
+        mock_plg = mock_plg()
+        mock_plg.plugin_object.run = stub_run
+
+        assert meguca_ins.compile_args_plan(mock_plg, 'run') == ('config',)
+
+    @pytest.mark.usefixtures('mock_plg')
+    def test_get_args_plan_compiles_once(self, mock_plg):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+        mock_plg = mock_plg()
+
+        with mock.patch.object(meguca_ins, 'compile_args_plan', return_value=()) as compile_args_plan:
+            meguca_ins.get_args_plan(mock_plg, 'run')
+            meguca_ins.get_args_plan(mock_plg, 'run')
+
+        compile_args_plan.assert_called_once()
+
+    @pytest.mark.usefixtures('mock_plg')
+    def test_compile_args_plans_fails_on_preparation(self, mock_plg):
+        def stub_run(unknown):
+            pass
+
+        mock_plg = mock_plg()
+        mock_plg.plugin_object.run = stub_run
+        plg_manager = mock.Mock(get_plugins=mock.Mock(return_value=[mock_plg]))
+        meguca_ins = meguca.Meguca(plg_manager, {}, {})
+
+        with pytest.raises(exceptions.PluginError):
+            meguca_ins.compile_args_plans()
+
+
 class TestRunStatPlugins():
     @mock.patch('meguca.meguca.Meguca.run_plugin', side_effect=exceptions.NotFound(''))
     def test_run_stat_plugins_with_plugin_indexes_non_existent_key_of_data_dict(self, run_plugin, meguca_standard_plg):
@@ -126,33 +294,271 @@ class TestRunStatPlugins():
         with pytest.raises(exceptions.NotFound):
             meguca_ins.run_stat_plugins('run')
 
-    def test_run_stat_plugins_with_plugin_indexes_not_yet_exist_key_of_data_dict(self, mock_plg):
+    def test_run_stat_plugins_in_dependency_order(self, mock_plg):
         def stub_run_1():
             return {'TestData1': 'Test Data'}
 
         def stub_run_2(data):
             return {'TestData2': data['TestData1']}
 
-        mock_plg_config_1 = configparser.ConfigParser()
-        mock_plg_config_1['Core'] = {'Id': '1'}
-        mock_plg_1 = mock.Mock(plugin_object=mock.Mock(run=stub_run_1),
-                               details=mock_plg_config_1)
+        mock_plg_1 = mock_plg(id='1', produces='TestData1', run=stub_run_1)
+        mock_plg_2 = mock_plg(id='2', produces='TestData2', consumes='TestData1', run=stub_run_2)
 
-        mock_plg_config_2 = configparser.ConfigParser()
-        mock_plg_config_2['Core'] = {'Id': '2'}
-        mock_plg_2 = mock.Mock(plugin_object=mock.Mock(run=stub_run_2),
-                               details=mock_plg_config_2)
+        def get_plugins(category):
+            if category == 'Stat':
+                return [mock_plg_2, mock_plg_1]
+            return []
 
-        plg_manager = mock.Mock(get_plugins=mock.Mock(return_value=[mock_plg_2, mock_plg_1]))
+        plg_manager = mock.Mock(get_plugins=mock.Mock(side_effect=get_plugins))
         general_config = {'general': {'blacklist': []}}
         meguca_ins = meguca.Meguca(plg_manager, general_config, None)
-        meguca_ins.data = mock.Mock(__getitem__=mock.Mock(), update=mock.Mock())
-        type(meguca_ins.data).raise_notyetexist = mock.PropertyMock(return_value=False)
 
         meguca_ins.run_stat_plugins('run')
 
-        meguca_ins.data.__getitem__.assert_called_with('TestData1')
-        meguca_ins.data.update.assert_called_with({'TestData1': 'Test Data'})
+        assert meguca_ins.data['TestData2'] == 'Test Data'
+
+    def test_resolve_stat_plugins_with_missing_producer(self, mock_plg):
+        mock_plg = mock_plg(id='1', consumes='TestData')
+
+        def get_plugins(category):
+            if category == 'Stat':
+                return [mock_plg]
+            return []
+
+        plg_manager = mock.Mock(get_plugins=mock.Mock(side_effect=get_plugins))
+        meguca_ins = meguca.Meguca(plg_manager, {}, None)
+
+        with pytest.raises(exceptions.DependencyError):
+            meguca_ins.resolve_stat_plugins()
+
+    def test_resolve_stat_plugins_with_key_produced_by_collector(self, mock_plg):
+        mock_plg_1 = mock_plg(id='1', produces='TestData')
+        mock_plg_2 = mock_plg(id='2', consumes='TestData')
+
+        def get_plugins(category):
+            if category == 'Collector':
+                return [mock_plg_1]
+            return [mock_plg_2]
+
+        plg_manager = mock.Mock(get_plugins=mock.Mock(side_effect=get_plugins))
+        meguca_ins = meguca.Meguca(plg_manager, {}, None)
+
+        meguca_ins.resolve_stat_plugins()
+
+        assert meguca_ins.stat_plugins == [mock_plg_2]
+
+
+class TestInjectDataSnapshot():
+    @pytest.mark.parametrize('category', ['Stat', 'View'])
+    def test_call_plugin_with_snapshot_category(self, category, mock_plg):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+        meguca_ins.data.update({'Test': 1})
+        plg = mock_plg(id=category.lower(), category=category, run=mock.Mock(return_value=None),
+                       signature=lambda data: None)
+
+        meguca_ins.call_plugin(plg, 'run')
+
+        injected = plg.plugin_object.run.call_args[1]['data']
+        assert isinstance(injected, data.DataSnapshot)
+        assert injected == {'Test': 1}
+
+    def test_call_collector_plugin(self, mock_plg):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+        plg = mock_plg(id='collector', category='Collector', run=mock.Mock(return_value=None),
+                       signature=lambda data: None)
+
+        meguca_ins.call_plugin(plg, 'run')
+
+        assert plg.plugin_object.run.call_args[1]['data'] is meguca_ins.data
+
+
+class TestSkipUnchangedStatPlugins():
+    @staticmethod
+    def gen_meguca(mock_plg, run, signature, general_config=None):
+        plg = mock_plg(id='stat', produces='Output', run=run, signature=signature)
+
+        def get_plugins(category):
+            if category == 'Stat':
+                return [plg]
+            return []
+
+        plg_manager = mock.Mock(get_plugins=mock.Mock(side_effect=get_plugins))
+        meguca_ins = meguca.Meguca(plg_manager, general_config or {}, {})
+        meguca_ins.data.update({'Input': 1})
+        meguca_ins.services.register('service', mock_plg(id='service', service=True, get=lambda: 'Service'))
+
+        return meguca_ins
+
+    def test_skip_stat_plugin_with_unchanged_inputs(self, mock_plg):
+        run = mock.Mock(side_effect=lambda data: {'Output': data['Input']})
+        meguca_ins = self.gen_meguca(mock_plg, run, lambda data: None)
+
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.run_stat_plugins('run')
+
+        assert run.call_count == 1
+        assert meguca_ins.data['Output'] == 1
+
+    def test_run_stat_plugin_with_changed_inputs(self, mock_plg):
+        run = mock.Mock(side_effect=lambda data: {'Output': data['Input']})
+        meguca_ins = self.gen_meguca(mock_plg, run, lambda data: None)
+
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.data['Input'] = 2
+        meguca_ins.run_stat_plugins('run')
+
+        assert run.call_count == 2
+        assert meguca_ins.data['Output'] == 2
+
+    def test_run_stat_plugin_after_config_reload(self, mock_plg):
+        run = mock.Mock(return_value={'Output': 1})
+        meguca_ins = self.gen_meguca(mock_plg, run, lambda config: None)
+
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.config_version += 1
+        meguca_ins.run_stat_plugins('run')
+
+        assert run.call_count == 2
+
+    def test_record_timeseries_of_skipped_stat_plugin(self, mock_plg):
+        run = mock.Mock(side_effect=lambda data: {'Output': data['Input']})
+        meguca_ins = self.gen_meguca(mock_plg, run, lambda data: None, {'timeseries': {'keys': ['Output']}})
+
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.run_stat_plugins('run')
+
+        assert run.call_count == 1
+        assert meguca_ins.data.timeseries.aggregate('Output', 'count') == 2
+
+    def test_always_run_stat_plugin_reading_timeseries(self, mock_plg):
+        def stub_run(data):
+            data.timeseries
+            return {'Output': data['Input']}
+
+        run = mock.Mock(side_effect=stub_run)
+        meguca_ins = self.gen_meguca(mock_plg, run, lambda data: None)
+
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.run_stat_plugins('run')
+
+        assert run.call_count == 2
+
+    def test_run_stat_plugin_iterating_keys_after_key_added(self, mock_plg):
+        run = mock.Mock(side_effect=lambda data: {'Output': len([key for key in data if key != 'Output'])
+                                                  + data['Input']})
+        meguca_ins = self.gen_meguca(mock_plg, run, lambda data: None)
+
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.data['New'] = 1
+        meguca_ins.run_stat_plugins('run')
+
+        assert run.call_count == 2
+        assert meguca_ins.data['Output'] == 3
+
+    def test_always_run_stat_plugin_reading_no_data(self, mock_plg):
+        run = mock.Mock(return_value={'Output': 1})
+        meguca_ins = self.gen_meguca(mock_plg, run, lambda data: None)
+
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.run_stat_plugins('run')
+
+        assert run.call_count == 2
+
+    def test_always_run_stat_plugin_using_services(self, mock_plg):
+        run = mock.Mock(return_value={'Output': 1})
+        meguca_ins = self.gen_meguca(mock_plg, run, lambda service: None)
+
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.run_stat_plugins('run')
+
+        assert run.call_count == 2
+
+    def test_always_run_stat_plugin_with_cache_disabled(self, mock_plg):
+        run = mock.Mock(return_value={'Output': 1})
+        meguca_ins = self.gen_meguca(mock_plg, run, lambda: None, {'stat_plugins_cache': {'enable': False}})
+
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.run_stat_plugins('run')
+
+        assert run.call_count == 2
+
+    def test_skip_stat_plugin_with_unchanged_inputs_concurrently(self, mock_plg):
+        run = mock.Mock(side_effect=lambda data: {'Output': data['Input']})
+        meguca_ins = self.gen_meguca(mock_plg, run, lambda data: None, {'stat_plugins_concurrency': {'enable': True}})
+
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.data['Input'] = 2
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.stat_executor.shutdown()
+
+        assert run.call_count == 2
+        assert meguca_ins.data['Output'] == 2
+
+
+class TestRunStatPluginsConcurrently():
+    @staticmethod
+    def gen_meguca(stat_plugins):
+        def get_plugins(category):
+            if category == 'Stat':
+                return stat_plugins
+            return []
+
+        plg_manager = mock.Mock(get_plugins=mock.Mock(side_effect=get_plugins))
+        general_config = {'stat_plugins_concurrency': {'enable': True, 'max_workers': 4}}
+
+        return meguca.Meguca(plg_manager, general_config, None)
+
+    def test_run_independent_stat_plugins_at_same_time(self, mock_plg):
+        # Each plugin waits for the other one, which only returns if both run at the same time.
+        barrier = threading.Barrier(2, timeout=5)
+
+        def stub_run_1():
+            barrier.wait()
+            return {'TestData1': 'Test'}
+
+        def stub_run_2():
+            barrier.wait()
+            return {'TestData2': 'Test'}
+
+        meguca_ins = self.gen_meguca([mock_plg(id='1', run=stub_run_1),
+                                      mock_plg(id='2', run=stub_run_2)])
+
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.stat_executor.shutdown()
+
+        assert meguca_ins.data == {'TestData1': 'Test', 'TestData2': 'Test'}
+
+    def test_run_dependent_stat_plugins(self, mock_plg):
+        def stub_run_1():
+            return {'TestData1': 'Test Data'}
+
+        def stub_run_2(data):
+            return {'TestData2': data['TestData1']}
+
+        meguca_ins = self.gen_meguca([mock_plg(id='2', produces='TestData2', consumes='TestData1', run=stub_run_2),
+                                      mock_plg(id='1', produces='TestData1', run=stub_run_1)])
+
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.stat_executor.shutdown()
+
+        assert meguca_ins.data['TestData2'] == 'Test Data'
+
+    def test_store_returned_data_in_plugin_id_order(self, mock_plg):
+        def stub_run_1():
+            time.sleep(0.2)
+            return {'TestData': '1'}
+
+        def stub_run_2():
+            return {'TestData': '2'}
+
+        meguca_ins = self.gen_meguca([mock_plg(id='2', run=stub_run_2),
+                                      mock_plg(id='1', run=stub_run_1)])
+
+        meguca_ins.run_stat_plugins('run')
+        meguca_ins.stat_executor.shutdown()
+
+        assert meguca_ins.data['TestData'] == '2'
 
 
 class TestPluginSchedulingMethods():
@@ -183,21 +589,123 @@ class TestPluginSchedulingMethods():
         assert meguca_ins.scheduler.get_jobs()[1].name == 'Collector2'
         assert meguca_ins.scheduler.get_jobs()[2].name == 'Stat plugins'
         assert meguca_ins.scheduler.get_jobs()[3].name == 'View1'
+        assert meguca_ins.scheduler.get_jobs()[5].name == 'Profiling summary'
+
+
+class TestScheduleJobOptions():
+    def test_schedule_with_job_options(self):
+        meguca_ins = meguca.Meguca(mock.Mock(), {'scheduler': {'executors': {'critical': 2}}}, {})
+
+        meguca_ins.schedule(mock.Mock(), name='Test', job_id='test',
+                            schedule_config={'schedule_mode': 'interval', 'seconds': 10,
+                                             'executor': 'critical', 'max_instances': 2,
+                                             'misfire_grace_time': 30, 'priority': 5})
+
+        job = meguca_ins.scheduler.get_job('test')
+        assert job.executor == 'critical'
+        assert job.max_instances == 2
+        assert job.misfire_grace_time == 30
+        assert meguca_ins.job_priorities['test'] == 5
+
+    def test_schedule_with_non_existent_executor(self):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+
+        with pytest.raises(exceptions.ConfigError):
+            meguca_ins.schedule(mock.Mock(), name='Test',
+                                schedule_config={'schedule_mode': 'interval', 'seconds': 10,
+                                                 'executor': 'critical'})
+
+    def test_reschedule_job_with_job_options(self):
+        meguca_ins = meguca.Meguca(mock.Mock(), {'scheduler': {'executors': {'critical': 2}}}, {})
+        meguca_ins.schedule(mock.Mock(), name='Test', job_id='test',
+                            schedule_config={'schedule_mode': 'interval', 'seconds': 10})
+
+        meguca_ins.reschedule_job('test', {'schedule_mode': 'interval', 'seconds': 20,
+                                           'executor': 'critical', 'priority': 5})
+
+        job = meguca_ins.scheduler.get_job('test')
+        assert job.executor == 'critical'
+        assert job.trigger.interval.total_seconds() == 20
+        assert meguca_ins.job_priorities['test'] == 5
 
 
 class TestLoadServices():
-    def test_load_services(self):
+    def test_load_services(self, mock_plg):
         def get():
             return 'Test'
-        plg_info = configparser.ConfigParser()
-        plg_info['Core'] = {'Id': 'Test'}
-        mock_plg = mock.Mock(plugin_object=mock.Mock(get=get), details=plg_info)
-        plg_manager = mock.Mock(get_plugins=mock.Mock(return_value=[mock_plg]))
+        plg_manager = mock.Mock(get_plugins=mock.Mock(return_value=[mock_plg(id='Test', service=True, get=get)]))
         meguca_ins = meguca.Meguca(plg_manager, {}, {})
 
         meguca_ins.load_services()
 
-        assert meguca_ins.services == {'Test': 'Test'}
+        assert meguca_ins.services.instances == {}
+        assert meguca_ins.services['Test'] == 'Test'
+
+    def test_load_services_with_service_dependency(self, mock_plg):
+        def get_a():
+            return 'A'
+
+        def get_b(a):
+            return 'B uses ' + a
+
+        plg_manager = mock.Mock(get_plugins=mock.Mock(return_value=[mock_plg(id='b', service=True, get=get_b),
+                                                                    mock_plg(id='a', service=True, get=get_a)]))
+        meguca_ins = meguca.Meguca(plg_manager, {}, {})
+
+        meguca_ins.load_services()
+
+        assert meguca_ins.services['b'] == 'B uses A'
+
+    def test_load_services_with_dependency_cycle(self, mock_plg):
+        def get_a(b):
+            pass
+
+        def get_b(a):
+            pass
+
+        plg_manager = mock.Mock(get_plugins=mock.Mock(return_value=[mock_plg(id='a', service=True, get=get_a),
+                                                                    mock_plg(id='b', service=True, get=get_b)]))
+        meguca_ins = meguca.Meguca(plg_manager, {}, {})
+
+        with pytest.raises(exceptions.DependencyError):
+            meguca_ins.load_services()
+
+    @pytest.mark.usefixtures('mock_plg')
+    def test_service_of_blacklisted_plugin_is_not_created(self, mock_plg):
+        get = mock.Mock(return_value='Test')
+        service_plg = mock_plg(id='service', service=True, get=get)
+
+        def stub_run(service):
+            pass
+
+        mock_plg = mock_plg()
+        mock_plg.plugin_object.run = stub_run
+
+        def get_plugins(category):
+            if category == 'Service':
+                return [service_plg]
+            return [mock_plg]
+
+        plg_manager = mock.Mock(get_plugins=mock.Mock(side_effect=get_plugins))
+        general_config = {'general': {'blacklist': ['test']},
+                          'stat_plugins_schedule': {'schedule_mode': 'interval', 'seconds': 1},
+                          'dry_run': {'enable': True}}
+        meguca_ins = meguca.Meguca(plg_manager, general_config, {})
+
+        meguca_ins.prepare()
+
+        get.assert_not_called()
+
+
+    def test_blacklisted_service_is_not_registered(self, mock_plg):
+        get = mock.Mock(return_value='Test')
+        plg_manager = mock.Mock(get_plugins=mock.Mock(return_value=[mock_plg(id='service', service=True, get=get)]))
+        meguca_ins = meguca.Meguca(plg_manager, {'general': {'blacklist': ['service']}}, {})
+
+        meguca_ins.load_services()
+
+        assert 'service' not in meguca_ins.services
+        get.assert_not_called()
 
 
 class TestRunMeguca():
@@ -242,6 +750,246 @@ class TestRunMeguca():
         assert meguca_ins.data == {'Test1': 'TestDry', 'Test2': 'TestDry'}
 
 
+class TestShutdown():
+    @staticmethod
+    def gen_meguca_with_running_job(job_time, drain_timeout):
+        meguca_ins = meguca.Meguca(mock.Mock(), {'shutdown': {'drain_timeout': drain_timeout}}, {})
+        started = threading.Event()
+        finished = threading.Event()
+
+        def job():
+            started.set()
+            time.sleep(job_time)
+            finished.set()
+
+        meguca_ins.scheduler.add_job(job)
+        meguca_ins.scheduler.start()
+        started.wait()
+
+        return meguca_ins, finished
+
+    def test_shutdown_waits_for_running_jobs(self):
+        meguca_ins, finished = self.gen_meguca_with_running_job(0.3, 5)
+
+        meguca_ins.shutdown()
+
+        assert finished.is_set()
+        assert not meguca_ins.scheduler.running
+
+    def test_shutdown_with_drain_timeout_passed(self):
+        meguca_ins, finished = self.gen_meguca_with_running_job(1, 0.1)
+
+        start = time.perf_counter()
+        meguca_ins.shutdown()
+
+        assert time.perf_counter() - start < 0.8
+        assert not finished.is_set()
+
+    def test_shutdown_when_scheduler_not_running(self):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+
+        meguca_ins.shutdown()
+
+    def test_shutdown_closes_services(self):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+        service = mock.Mock()
+        meguca_ins.services.instances['test'] = service
+
+        meguca_ins.shutdown()
+
+        service.close.assert_called_once_with()
+
+    def test_wait_for_jobs_with_pending_coroutine(self):
+        meguca_ins = meguca.Meguca(mock.Mock(), {}, {})
+
+        async def coro():
+            await asyncio.sleep(0.2)
+
+        meguca_ins.pending_coros['test'] = meguca_ins.event_loop.submit(coro())
+
+        assert not meguca_ins.wait_for_jobs(0.01)
+        assert meguca_ins.wait_for_jobs(2)
+        meguca_ins.event_loop.stop()
+
+
+class TestHandleStopSignals():
+    @pytest.mark.parametrize('signum', [signal.SIGTERM, signal.SIGINT, signal.SIGHUP])
+    def test_stop_signal_sets_event(self, signum):
+        original_handlers = {getattr(signal, name): signal.getsignal(getattr(signal, name))
+                             for name in meguca.STOP_SIGNALS}
+        stop_event = threading.Event()
+
+        meguca.handle_stop_signals(stop_event)
+        os.kill(os.getpid(), signum)
+
+        for original_signum, handler in original_handlers.items():
+            signal.signal(original_signum, handler)
+
+        assert stop_event.wait(1)
+
+
+class TestCheckpoint():
+    @staticmethod
+    def gen_meguca(mock_plg, tmp_path, plg_object):
+        plg = mock_plg(name='Collector', id='collector', plugin_object=plg_object)
+
+        def get_plugins(category=None):
+            if category in ('Collector', None):
+                return [plg]
+            return []
+
+        plg_manager = mock.Mock(get_plugins=mock.Mock(side_effect=get_plugins),
+                                get_all_plugins=mock.Mock(side_effect=get_plugins))
+        general_config = {'checkpoint': {'path': str(tmp_path / 'checkpoint.pkl.gz')},
+                          'dry_run': {'enable': True}}
+
+        return meguca.Meguca(plg_manager, general_config, {})
+
+    def test_warm_start_restores_data_and_plugin_states(self, tmp_path, mock_plg):
+        def stub_prepare():
+            return {'Test': 'TestPrep'}
+
+        old_plg_object = mock.Mock(prepare=stub_prepare,
+                                   checkpoint=mock.Mock(return_value={'cursor': '1'}))
+        meguca_ins = self.gen_meguca(mock_plg, tmp_path, old_plg_object)
+        meguca_ins.prepare()
+        meguca_ins.data['Test'] = 'TestRun'
+        meguca_ins.save_checkpoint()
+
+        plg_object = mock.Mock(prepare=mock.Mock(return_value={'Test': 'TestPrep'}))
+        meguca_ins = self.gen_meguca(mock_plg, tmp_path, plg_object)
+        meguca_ins.prepare(warm_start=True)
+
+        assert meguca_ins.data == {'Test': 'TestRun'}
+        plg_object.restore.assert_called_with({'cursor': '1'})
+        plg_object.prepare.assert_not_called()
+
+    def test_warm_start_without_checkpoint(self, tmp_path, mock_plg):
+        plg_object = mock.Mock(prepare=mock.Mock(return_value={'Test': 'TestPrep'}))
+        meguca_ins = self.gen_meguca(mock_plg, tmp_path, plg_object)
+
+        meguca_ins.prepare(warm_start=True)
+
+        assert meguca_ins.data == {'Test': 'TestPrep'}
+        plg_object.restore.assert_not_called()
+
+    def test_parse_args(self):
+        assert meguca.parse_args(['--warm-start']).warm_start
+        assert not meguca.parse_args([]).warm_start
+
+
+class TestHotReload():
+    @pytest.fixture
+    def meguca_hot_reload(self, tmp_path):
+        """A Meguca instance with real plugins copied to a temporary directory."""
+
+        plugin_dir = tmp_path / 'plugins'
+        shutil.copytree('tests/resources/plugins', str(plugin_dir))
+        config_file = str(plugin_dir / 'madoka_config.toml')
+        madoka_desc = (plugin_dir / 'madoka.plugin').read_text()
+        (plugin_dir / 'madoka.plugin').write_text(
+            madoka_desc.replace('tests/resources/plugins/madoka_config.toml', config_file))
+
+        general_config = {'general': {'blacklist': ['blacklisted']},
+                          'stat_plugins_schedule': {'schedule_mode': 'interval', 'seconds': 60},
+                          'plugin_schedule': {'sayaka': {'schedule_mode': 'interval', 'seconds': 60},
+                                              'mami': {'schedule_mode': 'interval', 'seconds': 60}},
+                          'hot_reload': {'enable': True, 'dirs': [str(plugin_dir)]}}
+        plg_manager = plugin.PlgManager(str(plugin_dir), 'plugin')
+        plugin_config = plg_manager.load_plugins()
+
+        meguca_ins = meguca.Meguca(plg_manager, general_config, plugin_config)
+        meguca_ins.prepare()
+
+        return meguca_ins, plugin_dir
+
+    @staticmethod
+    def get_plg(meguca_ins, name):
+        return [plg for plg in meguca_ins.plg_manager.get_all_plugins() if plg.name == name][0]
+
+    def test_reload_changed_plugin_module(self, meguca_hot_reload):
+        meguca_ins, plugin_dir = meguca_hot_reload
+        sayaka = self.get_plg(meguca_ins, 'Sayaka')
+        sayaka.plugin_object.state = 'Test'
+        (plugin_dir / 'sayaka.py').write_text(
+            'from meguca import plugin_categories\n\n\n'
+            'class Test4(plugin_categories.Collector):\n'
+            '    def run(self, data):\n'
+            '        return {\'Sayaka\': data[\'SayakaPrep\'] + self.state}\n')
+
+        meguca_ins.reload_changed_files()
+        meguca_ins.scheduler.get_job('sayaka').func(**meguca_ins.scheduler.get_job('sayaka').kwargs)
+
+        assert meguca_ins.data['Sayaka'] == 'TestValTest'
+        assert meguca_ins.args_plans[('sayaka', 'run')] == ('data',)
+
+    def test_reload_changed_plugin_config(self, meguca_hot_reload):
+        meguca_ins, plugin_dir = meguca_hot_reload
+        (plugin_dir / 'madoka_config.toml').write_text('[TestSection]\nTestKey = \'Reloaded\'\n')
+
+        meguca_ins.reload_changed_files()
+        meguca_ins.run_stat_plugins('run')
+
+        assert meguca_ins.config['plugins']['Madoka'] == {'TestSection': {'TestKey': 'Reloaded'}}
+        assert meguca_ins.data['Madoka'] == 'Reloaded'
+
+    def test_reload_plugin_with_unknown_dependency(self, meguca_hot_reload):
+        meguca_ins, plugin_dir = meguca_hot_reload
+        sayaka = self.get_plg(meguca_ins, 'Sayaka')
+        old_plugin_object = sayaka.plugin_object
+        (plugin_dir / 'sayaka.py').write_text(
+            'from meguca import plugin_categories\n\n\n'
+            'class Test4(plugin_categories.Collector):\n'
+            '    def run(self, unknown):\n'
+            '        pass\n')
+
+        with pytest.raises(exceptions.PluginError):
+            meguca_ins.reload_plugin(sayaka)
+
+        assert sayaka.plugin_object is old_plugin_object
+        assert meguca_ins.args_plans[('sayaka', 'run')] == ('config',)
+
+    def test_reload_service_recreates_dependent_services(self, mock_plg):
+        ns_api = mock_plg(id='ns_api', service=True, category='Service', get=lambda: object())
+        service_plugins = [
+            ns_api,
+            mock_plg(id='async_ns_api', service=True, category='Service', get=lambda ns_api: ('async', ns_api)),
+            mock_plg(id='ns_site', service=True, category='Service', get=lambda ns_api: ('site', ns_api)),
+            mock_plg(id='wrapper', service=True, category='Service',
+                     get=lambda async_ns_api: ('wrapper', async_ns_api)),
+            mock_plg(id='other', service=True, category='Service', get=lambda: object())]
+        plg_manager = mock.Mock(get_plugins=mock.Mock(side_effect=lambda category: service_plugins
+                                                      if category == 'Service' else []))
+        meguca_ins = meguca.Meguca(plg_manager, {}, {})
+        meguca_ins.load_services()
+        old_ns_api = meguca_ins.services['ns_api']
+        old_other = meguca_ins.services['other']
+        for plg_id in ('async_ns_api', 'ns_site', 'wrapper'):
+            meguca_ins.services[plg_id]
+
+        meguca_ins.reload_plugin(ns_api)
+        new_ns_api = meguca_ins.services['ns_api']
+
+        assert new_ns_api is not old_ns_api
+        assert meguca_ins.services['async_ns_api'] == ('async', new_ns_api)
+        assert meguca_ins.services['ns_site'] == ('site', new_ns_api)
+        assert meguca_ins.services['wrapper'] == ('wrapper', ('async', new_ns_api))
+        assert meguca_ins.services['other'] is old_other
+
+    def test_reload_general_config(self, meguca_hot_reload, tmp_path):
+        meguca_ins, plugin_dir = meguca_hot_reload
+        general_config_path = tmp_path / 'general_config.toml'
+        general_config_path.write_text('[plugin_schedule.sayaka]\nschedule_mode = \'interval\'\nseconds = 10\n'
+                                       '[plugin_schedule.mami]\nschedule_mode = \'interval\'\nseconds = 60\n'
+                                       '[stat_plugins_schedule]\nschedule_mode = \'interval\'\nseconds = 60\n')
+
+        with mock.patch('meguca.info.GENERAL_CONFIG_PATH', str(general_config_path)):
+            meguca_ins.reload_file(str(general_config_path))
+
+        assert meguca_ins.scheduler.get_job('sayaka').trigger.interval.total_seconds() == 10
+        assert meguca_ins.scheduler.get_job('mami').trigger.interval.total_seconds() == 60
+
+
 class TestMegucaIntegration():
     @freezegun.freeze_time('2018-01-01 00:00:00', tick=True)
     def test_run_meguca_with_real_plugins_and_config(self):
@@ -271,3 +1019,33 @@ class TestMegucaIntegration():
 
         assert meguca_ins.data == {'MadokaDry': 'TestVal', 'SayakaPrep': 'TestVal',
                                    'SayakaDry': 'TestVal'}
+
+    def test_dry_run_meguca_with_plugin_manifest(self, tmp_path):
+        general_config = utils.load_config('tests/resources/general_config_dryrun.toml')
+        manifest_path = str(tmp_path / 'manifest.json')
+        plugin.PlgManager('tests/resources/plugins', 'plugin', manifest_path).load_plugins()
+        plg_manager = plugin.PlgManager('tests/resources/plugins', 'plugin', manifest_path)
+        plugin_config = plg_manager.load_plugins()
+
+        meguca_ins = meguca.Meguca(plg_manager, general_config, plugin_config)
+
+        meguca_ins.prepare()
+        meguca_ins.run()
+
+        assert meguca_ins.data == {'MadokaDry': 'TestVal', 'SayakaPrep': 'TestVal',
+                                   'SayakaDry': 'TestVal'}
+        blacklisted = [plg for plg in plg_manager.get_all_plugins() if plg.name == 'Blacklisted'][0]
+        assert not blacklisted.is_loaded
+
+    def test_compile_args_plans_with_plugin_manifest_does_not_import(self, tmp_path):
+        manifest_path = str(tmp_path / 'manifest.json')
+        plugin.PlgManager('tests/resources/plugins', 'plugin', manifest_path).load_plugins()
+        plg_manager = plugin.PlgManager('tests/resources/plugins', 'plugin', manifest_path)
+        plugin_config = plg_manager.load_plugins()
+        meguca_ins = meguca.Meguca(plg_manager, {}, plugin_config)
+
+        meguca_ins.load_services()
+        meguca_ins.compile_args_plans()
+
+        assert ('madoka', 'run') in meguca_ins.args_plans
+        assert not any(plg.is_loaded for plg in plg_manager.get_all_plugins())
@@ -1,3 +1,5 @@
+import json
+import shutil
 from unittest import mock
 
 import pytest
@@ -60,3 +62,112 @@ class TestPlugins():
         plugins_ins = plugin.PlgManager('','')
 
         assert plugins_ins.get_all_plugins() == 'Test'
+
+
+class TestPluginManifest():
+    def get_plg_manager(self, tmp_path):
+        return plugin.PlgManager('tests/resources/plugins', 'plugin',
+                                 str(tmp_path / 'manifest.json'))
+
+    def test_load_plugins_without_manifest(self, tmp_path):
+        plg_manager = self.get_plg_manager(tmp_path)
+
+        plg_config = plg_manager.load_plugins()
+
+        assert (tmp_path / 'manifest.json').exists()
+        assert plg_config['Madoka'] == {'TestSection': {'TestKey': 'TestVal'}}
+        assert all(plg.is_loaded for plg in plg_manager.get_all_plugins())
+
+    def test_load_plugins_with_manifest(self, tmp_path):
+        self.get_plg_manager(tmp_path).load_plugins()
+        plg_manager = self.get_plg_manager(tmp_path)
+
+        plg_config = plg_manager.load_plugins()
+        plugins = plg_manager.get_all_plugins()
+
+        assert plg_config['Madoka'] == {'TestSection': {'TestKey': 'TestVal'}}
+        assert {plg.name for plg in plugins} == {'Madoka', 'Homura', 'Sayaka', 'Mami',
+                                                 'Nagisa', 'Blacklisted'}
+        assert not any(plg.is_loaded for plg in plugins)
+
+    def test_plugin_object_is_imported_on_first_access(self, tmp_path):
+        self.get_plg_manager(tmp_path).load_plugins()
+        plg_manager = self.get_plg_manager(tmp_path)
+        plg_manager.load_plugins()
+
+        plg = [plg for plg in plg_manager.get_plugins('Stat') if plg.name == 'Madoka'][0]
+
+        assert plg.plugin_object.plg_config == {'TestSection': {'TestKey': 'TestVal'}}
+        assert plg.plugin_object is plg.plugin_object
+        assert plg.details['Core']['Id'] == 'madoka'
+
+    def test_entry_params_are_read_from_manifest(self, tmp_path):
+        self.get_plg_manager(tmp_path).load_plugins()
+        plg_manager = self.get_plg_manager(tmp_path)
+        plg_manager.load_plugins()
+        plg = [plg for plg in plg_manager.get_all_plugins() if plg.name == 'Madoka'][0]
+
+        assert plugin.get_entry_params(plg, 'run') == []
+        assert plugin.get_entry_params(plg, 'get') is None
+        assert not plg.is_loaded
+
+    def test_manifest_is_rebuilt_if_desc_file_changed(self, tmp_path):
+        self.get_plg_manager(tmp_path).load_plugins()
+        with open(str(tmp_path / 'manifest.json')) as f:
+            manifest = json.load(f)
+        desc_file = sorted(manifest['desc_files'])[0]
+        manifest['desc_files'][desc_file] -= 1
+        with open(str(tmp_path / 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+        plg_manager = self.get_plg_manager(tmp_path)
+        plg_manager.load_plugins()
+
+        assert all(plg.is_loaded for plg in plg_manager.get_all_plugins())
+
+    def test_get_plugins_by_category(self, tmp_path):
+        plg_manager = self.get_plg_manager(tmp_path)
+        plg_manager.load_plugins()
+
+        assert {plg.name for plg in plg_manager.get_plugins('Service')} == {'Nagisa'}
+        assert plg_manager.get_plugins('Test') == []
+
+
+class TestReloadPlugin():
+    def test_reload_plugin_keeps_attributes(self, tmp_path):
+        shutil.copytree('tests/resources/plugins', str(tmp_path / 'plugins'))
+        plg_manager = plugin.PlgManager(str(tmp_path / 'plugins'), 'plugin')
+        plg_manager.load_plugins()
+        plg = [plg for plg in plg_manager.get_plugins('Stat') if plg.name == 'Madoka'][0]
+        old_plugin_object = plg.plugin_object
+        old_plugin_object.state = 'Test'
+        with open(str(tmp_path / 'plugins' / 'madoka.py'), 'a') as f:
+            f.write('\n    def reloaded(self):\n        return True\n')
+
+        plg_manager.reload_plugin(plg)
+
+        assert plg.plugin_object is not old_plugin_object
+        assert plg.plugin_object.reloaded()
+        assert plg.plugin_object.state == 'Test'
+        assert plg.plugin_object.plg_config == {'TestSection': {'TestKey': 'TestVal'}}
+
+    def test_reload_lazy_plugin_not_imported(self, tmp_path):
+        manifest_path = str(tmp_path / 'manifest.json')
+        plugin.PlgManager('tests/resources/plugins', 'plugin', manifest_path).load_plugins()
+        plg_manager = plugin.PlgManager('tests/resources/plugins', 'plugin', manifest_path)
+        plg_manager.load_plugins()
+        plg = plg_manager.get_plugins('Stat')[0]
+
+        plg_manager.reload_plugin(plg)
+
+        assert not plg.is_loaded
+        assert plg.entry_methods is None
+
+
+class TestInspectParams():
+    def test_inspect_params(self):
+        def stub_run(data, config=None, *args, **kwargs):
+            pass
+
+        assert plugin.inspect_params(stub_run) == [{'name': 'data', 'required': True},
+                                                   {'name': 'config', 'required': False}]
@@ -147,8 +147,20 @@ class TestEndoDataCollector():
         ns_api = mock.Mock(get_world=mock.Mock(return_value=events))
         endos = nx.DiGraph([('nation1', 'nation3')])
 
-        ins.run(data={'endos': endos}, ns_api=ns_api, config=prep_config)
+        data = {'endos': endos}
 
-        assert ('nation1', 'nation2') in endos.edges
-        assert ('nation1', 'nation3') not in endos.edges
+        ins.run(data=data, ns_api=ns_api, config=prep_config)
+
+        assert ('nation1', 'nation2') in data['endos'].edges
+        assert ('nation1', 'nation3') not in data['endos'].edges
+        assert ('nation1', 'nation3') in endos.edges
         assert ins.last_evt_time == '2'
+
+    def test_checkpoint_and_restore(self):
+        ins = endo_collector.EndoDataCollector()
+        ins.last_evt_time = '2'
+
+        restored_ins = endo_collector.EndoDataCollector()
+        restored_ins.restore(ins.checkpoint())
+
+        assert restored_ins.last_evt_time == '2'
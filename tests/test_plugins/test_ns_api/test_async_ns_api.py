@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from meguca.plugins.src.ns_api import async_ns_api
+from meguca.plugins.src.ns_api import exceptions
+from meguca.plugins.src.ns_api import ns_api
+
+
+def gen_resp(text='<A><a>homuraisbestgirl</a></A>', status_code=200, headers=None):
+    return mock.Mock(status_code=status_code, text=text, headers=headers or {})
+
+
+@pytest.fixture
+def api():
+    async_api = async_ns_api.AsyncNSApi(ns_api.NSApi('Test'), max_connections=4)
+
+    yield async_api
+
+    async_api.close()
+
+
+class TestAsyncNSApi():
+    @mock.patch('requests.Session.get', return_value=gen_resp())
+    def test_get_nation(self, mocked_session_get, api):
+        assert asyncio.run(api.get_nation('test', 'name')) == {'a': 'homuraisbestgirl'}
+        assert mocked_session_get.call_args[0][0] == ('https://www.nationstates.net/cgi-bin/'
+                                                      'api.cgi?nation=test;q=name;')
+
+    @mock.patch('requests.Session.get',
+                return_value=gen_resp('<WA><NUMNATIONS>2</NUMNATIONS><MEMBERS>a,b</MEMBERS></WA>'))
+    def test_get_wa_typed(self, mocked_session_get, api):
+        result = asyncio.run(api.get_wa('ga', ['numnations', 'members'], typed=True))
+
+        assert result == {'NUMNATIONS': 2, 'MEMBERS': {'a', 'b'}}
+        assert 'wa=1;' in mocked_session_get.call_args[0][0]
+
+    @mock.patch('requests.Session.get', return_value=gen_resp())
+    def test_get_region_and_world(self, mocked_session_get, api):
+        asyncio.run(api.get_region('test', 'name'))
+        asyncio.run(api.get_world('numnations'))
+
+        assert [call[0][0] for call in mocked_session_get.call_args_list] == [
+            'https://www.nationstates.net/cgi-bin/api.cgi?region=test;q=name;',
+            'https://www.nationstates.net/cgi-bin/api.cgi?q=numnations;']
+
+    @mock.patch('requests.Session.get', return_value=gen_resp(headers={'X-Pin': '12345'}))
+    def test_pin_shared_with_sync_api(self, mocked_session_get):
+        sync_api = ns_api.NSApi('Test', 'password')
+        api = async_ns_api.AsyncNSApi(sync_api)
+
+        asyncio.run(api.get_nation('test', 'ping'))
+        asyncio.run(api.get_nation('test', 'name'))
+
+        assert mocked_session_get.call_args_list[0][1]['headers']['X-Password'] == 'password'
+        assert mocked_session_get.call_args_list[1][1]['headers']['X-Pin'] == '12345'
+        assert 'X-Password' not in mocked_session_get.call_args_list[1][1]['headers']
+        assert sync_api.session.headers['X-Pin'] == '12345'
+        api.close()
+
+    @mock.patch('requests.Session.get', return_value=gen_resp())
+    def test_rate_limiter_shared_with_sync_api(self, mocked_session_get, api):
+        api.ns_api.get_nation('test', 'name')
+        asyncio.run(api.get_nation('test', 'name'))
+
+        assert api.rate_limiter is api.ns_api.rate_limiter
+        assert len(api.rate_limiter.sent_times) == 2
+
+    @mock.patch('requests.Session.get', return_value=gen_resp(headers={'x-ratelimit-requests-seen': '10'}))
+    def test_get_data_syncs_rate_limiter(self, mocked_session_get, api):
+        asyncio.run(api.get_nation('test', 'name'))
+
+        assert api.ns_api.req_count == 10
+        assert len(api.rate_limiter.sent_times) == 10
+
+    @mock.patch('requests.Session.get',
+                return_value=gen_resp(status_code=429, headers={'X-Retry-After': '900'}))
+    def test_get_data_with_ratelimit_exceeded_blocks_requests(self, mocked_session_get, api):
+        with pytest.raises(exceptions.NSAPIRateLimitError):
+            asyncio.run(api.get_nation('test', 'name'))
+
+        assert not api.ns_api.rate_limiter.acquire(timeout=0)
+
+    @mock.patch('requests.Session.get', return_value=gen_resp(status_code=404))
+    def test_get_data_with_error_status_code(self, mocked_session_get, api):
+        with pytest.raises(exceptions.NSAPIReqError):
+            asyncio.run(api.get_nation('test', 'name'))
+
+    def test_requests_run_concurrently_within_pool_size(self, api):
+        in_flight = []
+        max_in_flight = []
+        lock = threading.Lock()
+
+        def get(url, headers):
+            with lock:
+                in_flight.append(url)
+                max_in_flight.append(len(in_flight))
+            time.sleep(0.05)
+            with lock:
+                in_flight.remove(url)
+
+            return gen_resp()
+
+        async def get_all():
+            return await asyncio.gather(*[api.get_nation('nation{}'.format(i), 'name') for i in range(8)])
+
+        with mock.patch.object(api.session, 'get', side_effect=get):
+            results = asyncio.run(get_all())
+
+        assert len(results) == 8
+        assert max(max_in_flight) == 4
+
+    @mock.patch('requests.Session.get', return_value=gen_resp())
+    def test_waits_for_rate_limiter_without_blocking_event_loop(self, mocked_session_get, api):
+        api.rate_limiter = ns_api.rate_limiter.RateLimiter(1, 0.1)
+        ticks = []
+
+        async def tick():
+            for i in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(api.get_nation('a', 'name'), api.get_nation('b', 'name'), tick())
+
+        start_time = time.monotonic()
+        asyncio.run(run())
+
+        assert time.monotonic() - start_time >= 0.1
+        # Other coroutines kept running while the second request waited.
+        assert ticks[-1] - start_time < 0.09
+
+    @mock.patch('requests.Session.get',
+                return_value=gen_resp('<REGION><NUMNATIONS>1</NUMNATIONS></REGION>'))
+    def test_get_data_shares_cache_with_sync_api(self, mocked_session_get):
+        sync_api = ns_api.NSApi('Test', cache_ttls={'numnations': 60})
+        api = async_ns_api.AsyncNSApi(sync_api)
+
+        result = asyncio.run(api.get_region('test', 'numnations'))
+
+        assert sync_api.get_region('test', 'numnations') == result == {'NUMNATIONS': '1'}
+        assert asyncio.run(api.get_region('test', 'numnations')) is result
+        assert mocked_session_get.call_count == 1
+        api.close()
+
+
+class TestAsyncNSApiPlugin():
+    def test_get(self):
+        sync_api = ns_api.NSApi('Test')
+        config = {'meguca': {'ns_api': {'async_max_connections': 2}}}
+
+        api = async_ns_api.AsyncNSApiPlugin().get(ns_api=sync_api, config=config)
+
+        assert api.ns_api is sync_api
+        assert api.executor._max_workers == 2
+        assert api.session.get_adapter('https://www.nationstates.net')._pool_maxsize == 2
+        api.close()
@@ -0,0 +1,127 @@
+import time
+from unittest import mock
+
+import pytest
+
+from meguca.plugins.src.ns_api import cache
+
+
+def gen_cache(budget_tight=False, **kwargs):
+    fetch_func = mock.Mock(side_effect=lambda api_type, name, shards, shard_params=None: {'N': time.monotonic()})
+    response_cache = cache.ResponseCache(fetch_func, {'numnations': 10, 'delegate': 5},
+                                         is_budget_tight=lambda: budget_tight, **kwargs)
+
+    return response_cache, fetch_func
+
+
+class TestResponseCache():
+    def test_get_data_caches_respond(self):
+        response_cache, fetch_func = gen_cache()
+
+        first_result = response_cache.get_data('region', 'Test', 'numnations')
+        second_result = response_cache.get_data('region', 'test', ['numnations'])
+
+        assert first_result is second_result
+        fetch_func.assert_called_once()
+        assert response_cache.stats() == {'hits': 1, 'stale_hits': 0, 'misses': 1,
+                                          'refreshes': 0, 'size': 1}
+
+    def test_get_data_does_not_cache_shard_without_ttl(self):
+        response_cache, fetch_func = gen_cache()
+
+        response_cache.get_data('region', 'test', ['numnations', 'nations'])
+        response_cache.get_data('region', 'test', ['numnations', 'nations'])
+
+        assert fetch_func.call_count == 2
+        assert response_cache.stats()['size'] == 0
+
+    def test_get_data_with_different_params(self):
+        response_cache, fetch_func = gen_cache()
+
+        response_cache.get_data('region', 'test', 'numnations', {'scale': '65'})
+        response_cache.get_data('region', 'test', 'numnations', {'scale': '66'})
+
+        assert fetch_func.call_count == 2
+
+    def test_get_data_with_expired_respond(self):
+        response_cache, fetch_func = gen_cache()
+
+        with mock.patch('time.monotonic', return_value=0):
+            response_cache.get_data('region', 'test', 'numnations')
+        with mock.patch('time.monotonic', return_value=11):
+            result = response_cache.get_data('region', 'test', 'numnations')
+
+        assert result == {'N': 11}
+        assert fetch_func.call_count == 2
+
+    def test_get_data_uses_shortest_ttl(self):
+        response_cache, fetch_func = gen_cache()
+
+        with mock.patch('time.monotonic', return_value=0):
+            response_cache.get_data('region', 'test', ['numnations', 'delegate'])
+        with mock.patch('time.monotonic', return_value=6):
+            response_cache.get_data('region', 'test', ['numnations', 'delegate'])
+
+        assert fetch_func.call_count == 2
+
+    def test_get_data_with_expired_respond_and_tight_budget(self):
+        response_cache, fetch_func = gen_cache(budget_tight=True)
+
+        with mock.patch('time.monotonic', return_value=0):
+            response_cache.get_data('region', 'test', 'numnations')
+        with mock.patch('time.monotonic', return_value=11):
+            result = response_cache.get_data('region', 'test', 'numnations')
+        response_cache.close()
+
+        assert response_cache._refresh_executor is None
+        assert result == {'N': 0}
+        assert fetch_func.call_count == 2
+        assert response_cache.stats()['stale_hits'] == 1
+        assert response_cache.stats()['refreshes'] == 1
+        assert response_cache.get_data('region', 'test', 'numnations')['N'] > 0
+
+    def test_get_data_with_too_stale_respond(self):
+        response_cache, fetch_func = gen_cache(budget_tight=True, max_stale=5)
+
+        with mock.patch('time.monotonic', return_value=0):
+            response_cache.get_data('region', 'test', 'numnations')
+        with mock.patch('time.monotonic', return_value=16):
+            result = response_cache.get_data('region', 'test', 'numnations')
+
+        assert result == {'N': 16}
+        assert response_cache.stats()['misses'] == 2
+
+    def test_store_evicts_least_recently_used(self):
+        response_cache, fetch_func = gen_cache(max_size=2)
+
+        response_cache.get_data('region', 'a', 'numnations')
+        response_cache.get_data('region', 'b', 'numnations')
+        response_cache.get_data('region', 'a', 'numnations')
+        response_cache.get_data('region', 'c', 'numnations')
+
+        assert [key[1] for key in response_cache.entries] == ['a', 'c']
+
+    def test_get_data_with_error_is_not_cached(self):
+        response_cache, fetch_func = gen_cache()
+        fetch_func.side_effect = ValueError
+
+        with pytest.raises(ValueError):
+            response_cache.get_data('region', 'test', 'numnations')
+
+        assert response_cache.stats()['size'] == 0
+
+    def test_lookup_does_not_fetch(self):
+        response_cache, fetch_func = gen_cache()
+
+        result, key, ttl = response_cache.lookup('region', 'test', 'numnations')
+        response_cache.store(key, {'N': 1}, ttl)
+
+        assert result is cache.MISS
+        assert ttl == 10
+        assert response_cache.lookup('region', 'test', 'numnations')[0] == {'N': 1}
+        fetch_func.assert_not_called()
+
+    def test_lookup_shard_without_ttl(self):
+        response_cache, fetch_func = gen_cache()
+
+        assert response_cache.lookup('region', 'test', 'name') == (cache.MISS, None, 0)
@@ -0,0 +1,95 @@
+import concurrent.futures
+from unittest import mock
+
+import pytest
+
+from meguca.plugins.src.ns_api import coalescing
+from meguca.plugins.src.ns_api import exceptions
+
+
+def request_func(api_type, name, shards, shard_params=None):
+    result = {'@id': name}
+    result.update({shard.upper(): shard for shard in shards})
+
+    return result
+
+
+def get_data_concurrently(coalescer, calls):
+    with concurrent.futures.ThreadPoolExecutor(len(calls)) as executor:
+        futures = [executor.submit(coalescer.get_data, *call) for call in calls]
+
+        return [future.result() for future in futures]
+
+
+class TestSliceResult():
+    def test_slice_result(self):
+        result = {'@id': 'test', 'NUMNATIONS': '1', 'DELEGATE': 'a', 'UNSTATUS': 'WA Member'}
+
+        assert coalescing.slice_result(result, ['numnations', 'wa'],
+                                       ['numnations', 'delegate', 'wa']) == {'@id': 'test',
+                                                                             'NUMNATIONS': '1',
+                                                                             'UNSTATUS': 'WA Member'}
+
+
+class TestCoalescer():
+    def test_get_data_merges_concurrent_requests(self):
+        mock_request_func = mock.Mock(side_effect=request_func)
+        coalescer = coalescing.Coalescer(mock_request_func, 0.1)
+
+        results = get_data_concurrently(coalescer, [('region', 'test', 'numnations'),
+                                                    ('region', 'test', ['delegate', 'founder']),
+                                                    ('region', 'test', 'numnations')])
+
+        mock_request_func.assert_called_once()
+        assert sorted(mock_request_func.call_args[0][2]) == ['delegate', 'founder', 'numnations']
+        assert results == [{'@id': 'test', 'NUMNATIONS': 'numnations'},
+                           {'@id': 'test', 'DELEGATE': 'delegate', 'FOUNDER': 'founder'},
+                           {'@id': 'test', 'NUMNATIONS': 'numnations'}]
+
+    def test_get_data_does_not_merge_different_entities(self):
+        mock_request_func = mock.Mock(side_effect=request_func)
+        coalescer = coalescing.Coalescer(mock_request_func, 0.1)
+
+        results = get_data_concurrently(coalescer, [('region', 'test1', 'numnations'),
+                                                    ('region', 'test2', 'numnations'),
+                                                    ('region', 'test1', 'census', {'scale': '65'})])
+
+        assert mock_request_func.call_count == 3
+        assert results[1] == {'@id': 'test2', 'NUMNATIONS': 'numnations'}
+
+    def test_get_data_sequential_requests(self):
+        mock_request_func = mock.Mock(side_effect=request_func)
+        coalescer = coalescing.Coalescer(mock_request_func, 0)
+
+        coalescer.get_data('region', 'test', 'numnations')
+        coalescer.get_data('region', 'test', 'delegate')
+
+        assert mock_request_func.call_count == 2
+        assert coalescer.pending == {}
+
+    def test_get_data_with_invalid_shard_retries_requests_alone(self):
+        def failing_request_func(api_type, name, shards, shard_params=None):
+            if 'invalid' in shards:
+                raise exceptions.NSAPIReqError
+            return request_func(api_type, name, shards, shard_params)
+
+        coalescer = coalescing.Coalescer(failing_request_func, 0.1)
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            valid_future = executor.submit(coalescer.get_data, 'region', 'test', 'numnations')
+            invalid_future = executor.submit(coalescer.get_data, 'region', 'test', 'invalid')
+
+        assert valid_future.result() == {'@id': 'test', 'NUMNATIONS': 'numnations'}
+        with pytest.raises(exceptions.NSAPIReqError):
+            invalid_future.result()
+
+    def test_get_data_with_error_raises_in_all_requests(self):
+        coalescer = coalescing.Coalescer(mock.Mock(side_effect=exceptions.NSAPIError), 0.1)
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            futures = [executor.submit(coalescer.get_data, 'region', 'test', shard)
+                       for shard in ('numnations', 'delegate')]
+
+        for future in futures:
+            with pytest.raises(exceptions.NSAPIError):
+                future.result()
@@ -0,0 +1,108 @@
+import pytest
+
+from meguca.plugins.src.ns_api import decoders
+
+
+SAMPLES = [
+    '<NATION id="testlandia"><NAME>Testlandia</NAME><POPULATION>33107</POPULATION></NATION>',
+    '<REGION id="tsp"><NATIONS>nation1:nation2</NATIONS><DELEGATE>0</DELEGATE><FOUNDER></FOUNDER></REGION>',
+    ('<NATION id="test"><CENSUS><SCALE id="66"><SCORE>3.00</SCORE><RANK>5</RANK></SCALE>'
+     '<SCALE id="65"><SCORE>1833.28</SCORE><RANK>2</RANK></SCALE></CENSUS></NATION>'),
+    ('<WORLD><HAPPENINGS><EVENT id="1"><TIMESTAMP>2</TIMESTAMP><TEXT>@@a@@ endorsed @@b@@.</TEXT></EVENT>'
+     '<EVENT id="0"><TIMESTAMP>1</TIMESTAMP><TEXT>@@b@@ endorsed @@a@@.</TEXT></EVENT></HAPPENINGS></WORLD>'),
+    '<WORLD><HAPPENINGS><EVENT id="0"><TIMESTAMP>1</TIMESTAMP><TEXT>Test</TEXT></EVENT></HAPPENINGS></WORLD>',
+    '<WA council="1">\n  <NUMNATIONS>2</NUMNATIONS>\n  <MEMBERS>nation1,nation3</MEMBERS>\n</WA>',
+    '<?xml version="1.0" encoding="iso-8859-1"?><NATION id="t"><NAME>Ã©</NAME></NATION>',
+    '<A><a>homuraisbestgirl</a></A>',
+    '<A></A>'
+]
+
+
+class TestDecodeEtree():
+    @pytest.mark.parametrize('text', SAMPLES)
+    def test_decode_etree_same_as_xmltodict(self, text):
+        assert decoders.decode_etree(text) == decoders.decode_xmltodict(text)
+
+
+class TestDecodeTyped():
+    def test_decode_typed_nation_lists(self):
+        result = decoders.decode_typed(decoders.decode_etree(SAMPLES[5]))
+
+        assert result == {'@council': '1', 'NUMNATIONS': 2, 'MEMBERS': {'nation1', 'nation3'}}
+
+    def test_decode_typed_region_nations(self):
+        result = decoders.decode_typed(decoders.decode_etree(SAMPLES[1]))
+
+        assert result['NATIONS'] == {'nation1', 'nation2'}
+        assert result['DELEGATE'] == '0'
+
+    def test_decode_typed_census(self):
+        result = decoders.decode_typed(decoders.decode_etree(SAMPLES[2]))
+
+        assert result['CENSUS'] == {66: {'SCORE': 3.0, 'RANK': 5.0},
+                                    65: {'SCORE': 1833.28, 'RANK': 2.0}}
+
+    @pytest.mark.parametrize('points, expected', [
+        ('<POINT><TIMESTAMP>1</TIMESTAMP><SCORE>3.00</SCORE></POINT>'
+         '<POINT><TIMESTAMP>2</TIMESTAMP><SCORE>3.50</SCORE></POINT>', ((1, 3.0), (2, 3.5))),
+        ('<POINT><TIMESTAMP>1</TIMESTAMP><SCORE>3.00</SCORE></POINT>', ((1, 3.0),))
+    ])
+    def test_decode_typed_census_history(self, points, expected):
+        text = '<NATION id="test"><CENSUS><SCALE id="66">{}</SCALE></CENSUS></NATION>'.format(points)
+
+        result = decoders.decode_typed(decoders.decode_etree(text))
+
+        assert result['CENSUS'] == {66: expected}
+
+    @pytest.mark.parametrize('text, expected', [
+        (SAMPLES[3], ((2, '@@a@@ endorsed @@b@@.'), (1, '@@b@@ endorsed @@a@@.'))),
+        (SAMPLES[4], ((1, 'Test'),)),
+        ('<WORLD><HAPPENINGS></HAPPENINGS></WORLD>', ())
+    ])
+    def test_decode_typed_happenings(self, text, expected):
+        assert decoders.decode_typed(decoders.decode_etree(text))['HAPPENINGS'] == expected
+
+    def test_decode_typed_empty_nation_list(self):
+        assert decoders.decode_typed({'ENDORSEMENTS': None}) == {'ENDORSEMENTS': set()}
+
+
+def split_chunks(text, size):
+    # The declared encoding of a sample is used for bytes
+    data = text.encode('iso-8859-1')
+
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestIterShards():
+    @pytest.mark.parametrize('text', SAMPLES[:-1])
+    @pytest.mark.parametrize('size', [1, 7, 1024])
+    def test_iter_shards_same_as_decode_etree(self, text, size):
+        result = {}
+        for tag, value in decoders.iter_shards(split_chunks(text, size)):
+            decoders.add_value(result, tag, value)
+
+        assert result == decoders.decode_etree(text)
+
+    @pytest.mark.parametrize('text', SAMPLES[:-1])
+    @pytest.mark.parametrize('size', [1, 7, 1024])
+    def test_iter_shards_typed_same_as_decode_typed(self, text, size):
+        result = dict(decoders.iter_shards(split_chunks(text, size), typed=True))
+
+        assert result == decoders.decode_typed(decoders.decode_etree(text))
+
+    def test_iter_shards_yields_shards_before_end_of_respond(self):
+        chunks = iter([b'<WA council="1"><NUMNATIONS>2</NUMNATIONS>', b'<MEMBERS>a,b</MEMBERS></WA>'])
+
+        shards = decoders.iter_shards(chunks)
+
+        assert next(shards) == ('@council', '1')
+        assert next(shards) == ('NUMNATIONS', '2')
+        assert next(chunks) == b'<MEMBERS>a,b</MEMBERS></WA>'
+
+    def test_iter_shards_empty_respond(self):
+        assert list(decoders.iter_shards([b'<A>', b'</A>'])) == []
+
+    def test_iter_shards_empty_nation_list(self):
+        result = dict(decoders.iter_shards([b'<NATION><ENDORSEMENTS></ENDORSEMENTS></NATION>'], typed=True))
+
+        assert result == {'ENDORSEMENTS': set()}
@@ -1,3 +1,6 @@
+import concurrent.futures
+import json
+import threading
 from unittest import mock
 
 import pytest
@@ -10,23 +13,18 @@ from meguca.plugins.src.ns_api import exceptions
 USER_AGENT = "Unit tests of Meguca | NS API Wrapper component"
 
 
-def get_ns_api(user_agent="", password=None, **kwargs):
-    """Get an NS API instance with mocked requests.Respond.
+def get_ns_api(user_agent="", password=None):
+    """Get an NS API instance.
 
     Args:
     user_agent (str, optional): Defaults to "". User agent.
     password (str, optional): Defaults to None. Password.
-    **kwargs: Arguments for mocked requests.Respond.
 
     Returns:
         NSApi: NS API instance.
     """
 
-    api = ns_api.NSApi(user_agent, password)
-    if kwargs is not None:
-        api.respond = mock.Mock(**kwargs)
-
-    return api
+    return ns_api.NSApi(user_agent, password)
 
 
 class TestNSApiLowLevel():
@@ -39,9 +37,9 @@ class TestNSApiLowLevel():
         assert api.session.headers['X-Password'] == 'Test'
 
     def test_set_req_count(self):
-        api = get_ns_api(headers={'x-ratelimit-requests-seen': '0'})
+        api = get_ns_api()
 
-        api.set_req_count()
+        api.set_req_count(mock.Mock(headers={'x-ratelimit-requests-seen': '0'}))
 
         assert api.req_count == 0
 
@@ -49,39 +47,74 @@ class TestNSApiLowLevel():
     def test_send_req(self, mocked_requests_session_get):
         api = ns_api.NSApi("")
 
-        api.send_req('Test')
+        assert api.send_req('Test') == 'Test'
 
-        assert api.respond == 'Test'
+    @mock.patch('requests.Session.get', return_value='Test')
+    def test_send_req_acquires_rate_limiter(self, mocked_requests_session_get):
+        api = ns_api.NSApi("")
+        api.rate_limiter = mock.Mock()
 
-    @mock.patch('requests.Session.get', return_value=mock.Mock(headers={'x-ratelimit-requests-seen': '0'}))
-    def test_send_req_when_ratelimit_exceeded(self, mocked_request_session_get):
-        ns_api.RATE_LIMIT = 0
-        api = get_ns_api()
-        api.req_count = 1
+        api.send_req('Test')
 
-        with pytest.raises(exceptions.NSAPIRateLimitError):
-            api.send_req('Test')
+        api.rate_limiter.acquire.assert_called_once_with()
 
     def test_set_pin(self):
-        api = get_ns_api(headers={'X-Pin': '0'})
-        api.session.headers['X-Password'] = '0'
+        api = get_ns_api(password='0')
 
-        api.set_pin()
+        api.set_pin(mock.Mock(headers={'X-Pin': '0'}))
 
         assert api.session.headers['X-Pin'] == '0'
         assert 'X-Password' not in api.session.headers
 
     def test_process_xml(self):
-        api = get_ns_api(text='<A><a>homuraisbestgirl</a></A>')
+        api = get_ns_api()
 
-        assert api.process_xml() == {'a': 'homuraisbestgirl'}
+        assert api.process_xml(mock.Mock(text='<A><a>homuraisbestgirl</a></A>')) == {'a': 'homuraisbestgirl'}
 
-    def test_process_respond_with_status_code_200(self):
-        api = get_ns_api(status_code=200, text='<A><a>homuraisbestgirl</a></A>',
-                         headers={'x-ratelimit-requests-seen': '0'})
+    def test_process_xml_with_xmltodict_decoder(self):
+        api = ns_api.NSApi("", xml_decoder='xmltodict')
+
+        assert api.process_xml(mock.Mock(text='<A><a>homuraisbestgirl</a></A>')) == {'a': 'homuraisbestgirl'}
+
+    @mock.patch('requests.Session.get',
+                return_value=mock.Mock(status_code=200,
+                                       text='<WA><NUMNATIONS>2</NUMNATIONS><MEMBERS>a,b</MEMBERS></WA>',
+                                       headers={}))
+    def test_get_data_typed(self, mocked_requests_session_get):
+        api = ns_api.NSApi("")
+
+        assert api.get_wa('ga', ['numnations', 'members'], typed=True) == {'NUMNATIONS': 2,
+                                                                           'MEMBERS': {'a', 'b'}}
+
+    @mock.patch('requests.Session.get')
+    def test_get_data_stream(self, mocked_requests_session_get):
+        mocked_resp = mock.Mock(status_code=200, headers={})
+        mocked_resp.iter_content.return_value = [b'<WA council="1"><NUMNATIONS>2</NUMNATIONS><MEM',
+                                                 b'BERS>a,b</MEMBERS></WA>']
+        mocked_requests_session_get.return_value = mocked_resp
+        api = ns_api.NSApi("")
+
+        result = api.get_wa('ga', ['numnations', 'members'], typed=True, stream=True)
+
+        assert result == {'@council': '1', 'NUMNATIONS': 2, 'MEMBERS': {'a', 'b'}}
+        assert mocked_requests_session_get.call_args[1] == {'stream': True}
+        mocked_resp.close.assert_called_once_with()
+
+    @mock.patch('requests.Session.get', return_value=mock.Mock(status_code=404, headers={}))
+    def test_get_data_stream_with_error_status_code(self, mocked_requests_session_get):
+        api = ns_api.NSApi("")
+
+        with pytest.raises(exceptions.NSAPIReqError):
+            api.get_nation('test', 'name', stream=True)
+
+        mocked_requests_session_get.return_value.close.assert_called_once_with()
 
+    def test_process_respond_with_status_code_200(self):
+        api = get_ns_api()
+        respond = mock.Mock(status_code=200, text='<A><a>homuraisbestgirl</a></A>',
+                            headers={'x-ratelimit-requests-seen': '0'})
 
-        assert api.get_respond() == {'a': 'homuraisbestgirl'}
+        assert api.get_respond(respond) == {'a': 'homuraisbestgirl'}
 
     @pytest.mark.parametrize('status_code, expected_exception', [
         (400, exceptions.NSAPIReqError),
@@ -92,11 +125,11 @@ class TestNSApiLowLevel():
         (900, exceptions.NSAPIError)
     ])
     def test_process_respond_with_error_status_code(self, status_code, expected_exception):
-        mocked_resp = mock.Mock()
-        api = get_ns_api(status_code=status_code, headers={'X-Retry-After': '0'})
+        api = get_ns_api()
+        respond = mock.Mock(status_code=status_code, headers={'X-Retry-After': '0'})
 
         with pytest.raises(expected_exception):
-            api.get_respond()
+            api.get_respond(respond)
 
 @mock.patch('requests.Session.get',
             return_value=mock.Mock(status_code=200,
@@ -164,14 +197,64 @@ class TestNSApiRateLimiter():
                 return_value=mock.Mock(status_code=200,
                                        text='<A><a>a</a></A>',
                                        headers={'x-ratelimit-requests-seen': '2'}))
-    def test_get_data_with_ratelimit_exceeded(self, mocked_request_session_get):
-        ns_api.RATE_LIMIT = 1
+    def test_get_data_syncs_rate_limiter(self, mocked_request_session_get):
         api = ns_api.NSApi("")
+
         api.get_data('Test','Test', 'Test')
 
+        assert len(api.rate_limiter.sent_times) == 2
+
+    @mock.patch('requests.Session.get',
+                return_value=mock.Mock(status_code=429,
+                                       text='',
+                                       headers={'X-Retry-After': '900'}))
+    def test_get_data_with_ratelimit_exceeded_blocks_requests(self, mocked_request_session_get):
+        api = ns_api.NSApi("")
+
         with pytest.raises(exceptions.NSAPIRateLimitError):
             api.get_data('Test','Test', 'Test')
 
+        assert not api.rate_limiter.acquire(timeout=0)
+
+
+class TestNSApiConcurrency():
+    """Tests for NSApi used from many threads at once."""
+
+    def test_concurrent_requests_get_own_responds(self):
+        api = get_ns_api()
+        barrier = threading.Barrier(4)
+
+        def get(url, stream=False):
+            # Every request is in flight before any respond is processed.
+            barrier.wait()
+            name = url.split('nation=')[1].split(';')[0]
+
+            return mock.Mock(status_code=200, text='<A><NAME>{}</NAME></A>'.format(name),
+                             headers={'X-Pin': name})
+
+        with mock.patch.object(api.session, 'get', side_effect=get):
+            with concurrent.futures.ThreadPoolExecutor(4) as executor:
+                names = ['nation{}'.format(i) for i in range(4)]
+                results = list(executor.map(lambda name: api.get_nation(name, 'name'), names))
+
+        assert [result['NAME'] for result in results] == names
+        assert api.session.headers['X-Pin'] in names
+
+    def test_set_pin_replaces_headers(self):
+        api = get_ns_api(password='Test')
+        old_headers = api.session.headers
+
+        api.set_pin(mock.Mock(headers={'X-Pin': '0'}))
+
+        assert old_headers['X-Password'] == 'Test'
+        assert api.session.headers['X-Pin'] == '0'
+        assert 'X-Password' not in api.session.headers
+
+    def test_pool_size(self):
+        api = ns_api.NSApi("", pool_size=20)
+
+        assert api.session.get_adapter(ns_api.API_URL_BEGINNING)._pool_maxsize == 20
+
 
 class TestNSApiIntegration():
     """Tests for NSApi high-level methods. Real API is used."""
@@ -192,6 +275,18 @@ class TestNSApiIntegration():
         assert api.get_world('lasteventid')['LASTEVENTID']
 
 
+class TestClose():
+    def test_close(self):
+        api = ns_api.NSApi('Test', cache_ttls={'numnations': 60})
+
+        with mock.patch.object(api.cache, 'close') as cache_close, \
+                mock.patch.object(api.session, 'close') as session_close:
+            api.close()
+
+        cache_close.assert_called_once_with()
+        session_close.assert_called_once_with()
+
+
 class TestNSApiPlugin():
     @mock.patch('requests.Session.get',
                 return_value=mock.Mock(headers={'X-Pin': '0'},
@@ -212,3 +307,65 @@ class TestNSApiPlugin():
         api = plg.get(config={'meguca': config})
 
         assert api.session.headers['user-agent'] == 'Test'
+
+    def test_get_with_replay_transport(self, tmp_path):
+        fixture_path = tmp_path / 'fixtures.json'
+        fixture_path.write_text(json.dumps({
+            'version': 1,
+            'interactions': [{'request': {'method': 'GET',
+                                          'url': 'https://www.nationstates.net/cgi-bin/api.cgi?nation=test;q=ping;'},
+                              'response': {'status': 200, 'headers': {'X-Pin': '0'},
+                                           'body': '<NATION><PING>1</PING></NATION>'}}]}))
+        plg = ns_api.NSApiPlugin()
+        config = {'auth': {'user_agent': 'Test', 'password': 'password', 'host_nation': 'Test'},
+                  'transport': {'mode': 'replay', 'path': str(fixture_path)}}
+
+        api = plg.get(config={'meguca': config})
+
+        assert api.session.headers['X-Pin'] == '0'
+
+    @mock.patch('requests.Session.get',
+                return_value=mock.Mock(status_code=200,
+                                       text='<REGION><NUMNATIONS>1</NUMNATIONS><DELEGATE>a</DELEGATE></REGION>',
+                                       headers={}))
+    def test_get_with_coalescing(self, mocked_requests_session_get):
+        plg = ns_api.NSApiPlugin()
+        config = {'auth': {'user_agent': 'Test'}, 'ns_api': {'coalesce_window': 0.01}}
+
+        api = plg.get(config={'meguca': config})
+
+        assert api.get_region('test', 'numnations') == {'NUMNATIONS': '1', 'DELEGATE': 'a'}
+        assert api.coalescer.window == 0.01
+
+    def test_get_without_coalescing_by_default(self):
+        plg = ns_api.NSApiPlugin()
+        config = {'auth': {'user_agent': 'Test'}}
+
+        api = plg.get(config={'meguca': config})
+
+        assert api.coalescer is None
+
+    def test_get_with_coalescing_when_stat_plugins_run_concurrently(self):
+        plg = ns_api.NSApiPlugin()
+        config = {'auth': {'user_agent': 'Test'}, 'stat_plugins_concurrency': {'enable': True}}
+
+        api = plg.get(config={'meguca': config})
+
+        assert api.coalescer.window == ns_api.COALESCE_WINDOW
+
+    @mock.patch('requests.Session.get',
+                return_value=mock.Mock(status_code=200,
+                                       text='<REGION><NUMNATIONS>1</NUMNATIONS></REGION>',
+                                       headers={}))
+    def test_get_with_cache(self, mocked_requests_session_get):
+        plg = ns_api.NSApiPlugin()
+        config = {'auth': {'user_agent': 'Test'},
+                  'ns_api': {'coalesce_window': 0, 'cache': {'ttls': {'nations': 60}}}}
+
+        api = plg.get(config={'meguca': config})
+        api.get_region('test', 'numnations')
+        api.get_region('test', 'numnations')
+
+        mocked_requests_session_get.assert_called_once()
+        assert api.cache.ttls['nations'] == 60
+        assert api.cache.stats()['hits'] == 1
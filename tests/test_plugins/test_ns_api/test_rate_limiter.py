@@ -0,0 +1,91 @@
+import time
+import threading
+
+from meguca.plugins.src.ns_api import rate_limiter
+
+
+class TestRateLimiter():
+    def test_acquire_under_limit(self):
+        limiter = rate_limiter.RateLimiter(2, 30)
+
+        assert limiter.acquire(timeout=0)
+        assert limiter.acquire(timeout=0)
+
+    def test_acquire_over_limit_times_out(self):
+        limiter = rate_limiter.RateLimiter(1, 30)
+        limiter.acquire()
+
+        assert not limiter.acquire(timeout=0.05)
+
+    def test_acquire_over_limit_waits_for_slot(self):
+        limiter = rate_limiter.RateLimiter(2, 0.2)
+        start_time = time.monotonic()
+
+        for i in range(5):
+            limiter.acquire()
+
+        # Requests 3-4 wait one period and request 5 waits two.
+        assert time.monotonic() - start_time >= 0.4
+
+    def test_acquire_never_exceeds_limit_in_window(self):
+        limiter = rate_limiter.RateLimiter(3, 0.2)
+        sent_times = []
+        lock = threading.Lock()
+
+        def send():
+            for i in range(3):
+                limiter.acquire()
+                with lock:
+                    sent_times.append(time.monotonic())
+
+        threads = [threading.Thread(target=send) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sent_times.sort()
+        assert len(sent_times) == 9
+        assert all(sent_times[i + 3] - sent_times[i] >= 0.19 for i in range(len(sent_times) - 3))
+
+    def test_try_acquire(self):
+        limiter = rate_limiter.RateLimiter(1, 30)
+
+        assert limiter.try_acquire() == 0
+        assert 29 < limiter.try_acquire() <= 30
+        assert len(limiter.sent_times) == 1
+
+    def test_sync_with_more_requests_seen(self):
+        limiter = rate_limiter.RateLimiter(3, 30)
+        limiter.acquire()
+
+        limiter.sync(3)
+
+        assert not limiter.acquire(timeout=0)
+
+    def test_sync_with_fewer_requests_seen(self):
+        limiter = rate_limiter.RateLimiter(3, 30)
+        limiter.acquire()
+        limiter.acquire()
+
+        limiter.sync(0)
+
+        assert len(limiter.sent_times) == 2
+
+    def test_block(self):
+        limiter = rate_limiter.RateLimiter(3, 30)
+
+        limiter.block(0.1)
+
+        assert not limiter.acquire(timeout=0.05)
+        assert limiter.acquire(timeout=0.2)
+
+    def test_get_usage(self):
+        limiter = rate_limiter.RateLimiter(4, 30)
+        limiter.acquire()
+
+        assert limiter.get_usage() == 0.25
+
+        limiter.block(30)
+
+        assert limiter.get_usage() == 1
@@ -5,7 +5,7 @@ from meguca.plugins.src import regional_endo_stats
 class TestRegionalEndoStats():
     def test(self):
         ins = regional_endo_stats.RegionalEndoStats()
-        data = {'wa_nations': nx.DiGraph([('nation1', 'nation2'), ('nation2', 'nation1')])}
+        data = {'endos': nx.DiGraph([('nation1', 'nation2'), ('nation2', 'nation1')])}
 
         result = ins.run(data)
 
@@ -7,8 +7,9 @@ from meguca.plugins.src import wa_stats
 class TestWAStats():
     def test(self):
         ins = wa_stats.WAStats()
-        ns_api = mock.Mock(get_wa=mock.Mock(return_value={'NUMNATIONS': '2', 'MEMBERS': 'nation1,nation3'}),
-                           get_region=mock.Mock(return_value={'NATIONS': 'nation1:nation2'}))
+        wa_data = {'numnations': {'NUMNATIONS': 2}, 'members': {'MEMBERS': {'nation1', 'nation3'}}}
+        ns_api = mock.Mock(get_wa=mock.Mock(side_effect=lambda council, shards, **kwargs: wa_data[shards]),
+                           get_region=mock.Mock(return_value={'NATIONS': {'nation1', 'nation2'}}))
 
         config = {'general': {'region': 'region'}}
 
@@ -16,3 +17,5 @@ class TestWAStats():
 
         assert result == {'region_wa': ['nation1'],
                           'ns_wa_num': 2}
+        assert ns_api.get_wa.call_args_list == [mock.call('ga', 'members', typed=True, stream=True),
+                                                mock.call('ga', 'numnations', typed=True)]
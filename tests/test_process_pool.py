@@ -0,0 +1,101 @@
+import os
+from unittest import mock
+
+import pytest
+import networkx as nx
+
+from meguca import meguca
+from meguca import data
+from meguca import process_pool
+from meguca import exceptions
+from tests.resources import process_plugin
+
+
+class TestEncodeGraph():
+    def test_encode_and_decode_digraph(self):
+        graph = nx.DiGraph([('a', 'b'), ('b', 'c')])
+        graph.add_node('d')
+
+        result = process_pool.decode_graph(process_pool.encode_graph(graph))
+
+        assert isinstance(result, nx.DiGraph)
+        assert set(result.edges) == {('a', 'b'), ('b', 'c')}
+        assert 'd' in result
+
+    def test_encode_data_only_encodes_graphs(self):
+        result = process_pool.encode_data({'graph': nx.DiGraph(), 'num': 1})
+
+        assert isinstance(result['graph'], process_pool.EncodedGraph)
+        assert result['num'] == 1
+
+
+class TestRunPlugin():
+    def test_run_plugin_in_current_process(self):
+        entry_args = {'data': process_pool.encode_data({'endos': nx.DiGraph([('a', 'b')])})}
+
+        result = process_pool.run_plugin(os.path.abspath(process_plugin.__file__), 'EdgeCount',
+                                         None, 'run', entry_args)
+
+        assert result['edge_num'] == 1
+        assert isinstance(result['endos_copy'], process_pool.EncodedGraph)
+
+
+class TestEncodingCache():
+    def test_encode_graph_once_per_version(self):
+        data_store = data.DataStore()
+        data_store['endos'] = nx.DiGraph([('a', 'b')])
+        data_store['num'] = 1
+        cache = process_pool.EncodingCache()
+
+        with mock.patch('meguca.process_pool.encode_graph', wraps=process_pool.encode_graph) as encode_graph:
+            first = cache.encode_data(data_store.snapshot(), ['endos', 'num'])
+            second = cache.encode_data(data_store.snapshot(), ['endos'])
+            data_store['endos'] = nx.DiGraph([('a', 'b'), ('b', 'a')])
+            third = cache.encode_data(data_store.snapshot(), ['endos'])
+
+        assert encode_graph.call_count == 2
+        assert first['num'] == 1
+        assert second['endos'] is first['endos']
+        assert len(third['endos'].edges) == 4
+
+
+class TestMegucaProcessPool():
+    @staticmethod
+    def gen_meguca(mock_plg, plg_object, consumes='endos'):
+        plg = mock_plg(id='edge_count', plugin_object=plg_object, consumes=consumes)
+        plg_manager = mock.Mock(get_plugins=mock.Mock(return_value=[]))
+        general_config = {'process_pool': {'plugins': ['edge_count'], 'max_workers': 1}}
+
+        return meguca.Meguca(plg_manager, general_config, None), plg
+
+    def test_run_plugin_in_worker_process(self, mock_plg):
+        meguca_ins, plg = self.gen_meguca(mock_plg, process_plugin.EdgeCount())
+        meguca_ins.data['endos'] = nx.DiGraph([('a', 'b'), ('b', 'a')])
+
+        meguca_ins.run_plugin(plg, 'run')
+        meguca_ins.process_executor.shutdown()
+
+        assert meguca_ins.data['edge_num'] == 2
+        assert set(meguca_ins.data['endos_copy'].edges) == {('a', 'b'), ('b', 'a')}
+
+    def test_run_plugin_in_worker_process_with_undeclared_key(self, mock_plg):
+        meguca_ins, plg = self.gen_meguca(mock_plg, process_plugin.EdgeCount(), consumes='')
+        meguca_ins.data['endos'] = nx.DiGraph()
+
+        with pytest.raises(exceptions.NotFound):
+            meguca_ins.run_plugin(plg, 'run')
+        meguca_ins.process_executor.shutdown()
+
+    def test_run_plugin_in_worker_process_with_service(self, mock_plg):
+        class ServicePlugin():
+            plg_config = None
+
+            def run(self, ns_api):
+                pass
+
+        meguca_ins, plg = self.gen_meguca(mock_plg, ServicePlugin())
+        meguca_ins.services = {'ns_api': mock.Mock()}
+
+        with pytest.raises(exceptions.PluginError):
+            meguca_ins.run_plugin(plg, 'run')
+        meguca_ins.process_executor.shutdown()
@@ -0,0 +1,99 @@
+import time
+import asyncio
+import logging
+
+import pytest
+
+from meguca import profiling
+
+
+class TestPercentile():
+    @pytest.mark.parametrize('percent, expected', [(50, 5), (95, 10), (100, 10), (0, 1)])
+    def test_percentile(self, percent, expected):
+        assert profiling.percentile(list(range(1, 11)), percent) == expected
+
+
+class TestCountRequest():
+    def test_count_request_in_profiled_run(self):
+        profiler = profiling.Profiler()
+
+        with profiler.profile('Test', 'run') as record:
+            profiling.count_request('ns_api')
+            profiling.count_request('ns_api')
+
+        assert record['ns_api_requests'] == 2
+
+    def test_count_request_outside_of_profiled_run(self):
+        profiling.count_request('ns_api')
+
+
+class TestProfiler():
+    def test_profile_record_times(self):
+        profiler = profiling.Profiler()
+
+        with profiler.profile('Test', 'run') as record:
+            time.sleep(0.01)
+
+        assert record['wall_time'] >= 0.01
+        assert 'cpu_time' in record
+        assert 'peak_mem' not in record
+
+    def test_profile_with_trace_malloc(self):
+        profiler = profiling.Profiler(trace_malloc=True)
+
+        with profiler.profile('Test', 'run') as record:
+            big = bytearray(1000000)
+
+        assert record['peak_mem'] >= 1000000
+
+    def test_profile_overlapping_runs_without_peak_mem(self):
+        profiler = profiling.Profiler(trace_malloc=True)
+
+        with profiler.profile('Test1', 'run') as record1:
+            with profiler.profile('Test2', 'run') as record2:
+                pass
+
+        with profiler.profile('Test3', 'run') as record3:
+            pass
+
+        assert 'peak_mem' not in record1
+        assert 'peak_mem' not in record2
+        assert 'peak_mem' in record3
+
+    def test_profile_coro(self):
+        profiler = profiling.Profiler()
+
+        async def coro():
+            profiling.count_request('ns_api')
+            return 'Test'
+
+        result = asyncio.run(profiler.profile_coro('Test', 'run', coro()))
+
+        assert result == 'Test'
+        assert profiler.records[('Test', 'run')][0]['ns_api_requests'] == 1
+
+    def test_summary(self):
+        profiler = profiling.Profiler(window=2)
+        for wall_time in (3, 1, 2):
+            profiler.add_record('Test', 'run', {'wall_time': wall_time, 'cpu_time': 0})
+
+        summary = profiler.summary()
+
+        assert summary['Test']['run']['count'] == 3
+        assert summary['Test']['run']['wall_time'] == {'p50': 1, 'p95': 2, 'max': 2}
+
+    def test_summary_with_metric_missing_from_some_runs(self):
+        profiler = profiling.Profiler()
+        profiler.add_record('Test', 'run', {'wall_time': 1, 'cpu_time': 0, 'peak_mem': 5})
+        profiler.add_record('Test', 'run', {'wall_time': 1, 'cpu_time': 0})
+
+        assert profiler.summary()['Test']['run']['peak_mem'] == {'p50': 5, 'p95': 5, 'max': 5}
+
+    def test_log_summary(self, caplog):
+        profiler = profiling.Profiler()
+        profiler.add_record('Test', 'run', {'wall_time': 1, 'cpu_time': 0})
+        caplog.set_level(logging.INFO)
+
+        profiler.log_summary()
+
+        assert 'Plugin "Test" ran 1 times' in caplog.text
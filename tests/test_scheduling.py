@@ -0,0 +1,133 @@
+import time
+import datetime
+import threading
+from unittest import mock
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_ERROR
+
+from meguca import scheduling
+
+
+class TestPriorityThreadPool():
+    def test_run_higher_priority_first(self):
+        pool = scheduling.PriorityThreadPool(1)
+        started = threading.Event()
+        release = threading.Event()
+        order = []
+
+        def block():
+            started.set()
+            release.wait()
+
+        pool.submit(block)
+        started.wait()
+        futures = [pool.submit(lambda: order.append('low1'), priority=0),
+                   pool.submit(lambda: order.append('high'), priority=10),
+                   pool.submit(lambda: order.append('low2'), priority=0)]
+        release.set()
+        for future in futures:
+            future.result(1)
+        pool.shutdown()
+
+        assert order == ['high', 'low1', 'low2']
+
+    def test_submit_with_exception(self):
+        pool = scheduling.PriorityThreadPool(2)
+
+        def fail():
+            raise ValueError
+
+        future = pool.submit(fail)
+
+        assert isinstance(future.exception(1), ValueError)
+        pool.shutdown()
+
+    def test_threads_start_up_to_max_workers(self):
+        pool = scheduling.PriorityThreadPool(2)
+        release = threading.Event()
+
+        futures = [pool.submit(release.wait) for i in range(4)]
+        threads = len(pool.threads)
+        release.set()
+        for future in futures:
+            future.result(1)
+        pool.shutdown()
+
+        assert threads == 2
+
+
+class TestPriorityThreadPoolExecutor():
+    def test_run_jobs_and_record_lag(self):
+        metrics = scheduling.JobMetrics()
+        executor = scheduling.PriorityThreadPoolExecutor(2, metrics=metrics)
+        scheduler = BackgroundScheduler(executors={'default': executor})
+        done = threading.Event()
+        scheduler.add_job(done.set, id='job')
+        scheduler.start()
+
+        assert done.wait(1)
+        scheduler.shutdown()
+
+        assert metrics.summary()['job']['runs'] == 1
+        assert metrics.summary()['job']['lag']['max'] >= 0
+
+
+    def test_count_jobs_from_submission_until_finished(self):
+        job_counter = scheduling.JobCounter()
+        executor = scheduling.PriorityThreadPoolExecutor(1, job_counter=job_counter)
+        scheduler = BackgroundScheduler(executors={'default': executor})
+        started = threading.Event()
+        release = threading.Event()
+
+        def job():
+            started.set()
+            release.wait()
+            raise Exception
+
+        scheduler.add_job(job)
+        scheduler.start()
+        started.wait()
+
+        assert job_counter.count == 1
+        assert not job_counter.wait(0.01)
+        release.set()
+        assert job_counter.wait(1)
+        assert job_counter.count == 0
+        scheduler.shutdown()
+
+
+class TestJobMetrics():
+    def test_record_start(self):
+        metrics = scheduling.JobMetrics()
+        now = datetime.datetime.now(datetime.timezone.utc)
+
+        metrics.record_start('job', now - datetime.timedelta(seconds=2))
+        metrics.record_start('job', now - datetime.timedelta(seconds=1))
+
+        summary = metrics.summary()['job']
+        assert summary['runs'] == 2
+        assert 1 <= summary['lag']['p50'] < 1.5
+        assert 2 <= summary['lag']['max'] < 2.5
+
+    def test_handle_event(self):
+        metrics = scheduling.JobMetrics()
+
+        for code in (EVENT_JOB_MISSED, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_ERROR):
+            metrics.handle_event(mock.Mock(code=code, job_id='job'))
+
+        assert metrics.summary() == {'job': {'runs': 0, 'misfires': 2, 'overlaps': 1, 'errors': 1}}
+
+    def test_count_overlaps_of_scheduler(self):
+        metrics = scheduling.JobMetrics()
+        scheduler = BackgroundScheduler(executors={'default': scheduling.PriorityThreadPoolExecutor(2)})
+        scheduler.add_listener(metrics.handle_event, EVENT_JOB_MAX_INSTANCES)
+        release = threading.Event()
+        scheduler.add_job(release.wait, 'interval', seconds=0.1, id='job', max_instances=1)
+        scheduler.start()
+
+        time.sleep(0.5)
+        release.set()
+        scheduler.shutdown()
+
+        assert metrics.summary()['job']['overlaps'] >= 2
@@ -0,0 +1,117 @@
+import threading
+from unittest import mock
+
+import pytest
+
+from meguca import services
+from meguca import exceptions
+
+
+class TestServiceRegistry():
+    def test_getitem_creates_service_once(self, mock_plg):
+        create = mock.Mock(return_value='Test')
+        registry = services.ServiceRegistry(create)
+        registry.register('test', mock_plg(id='test'))
+
+        assert registry['test'] == 'Test'
+        assert registry['test'] == 'Test'
+        create.assert_called_once()
+
+    def test_register_does_not_create_service(self, mock_plg):
+        create = mock.Mock()
+        registry = services.ServiceRegistry(create)
+
+        registry.register('test', mock_plg(id='test'))
+
+        assert 'test' in registry
+        create.assert_not_called()
+
+    def test_getitem_with_unregistered_service(self):
+        registry = services.ServiceRegistry(mock.Mock())
+
+        with pytest.raises(KeyError):
+            registry['test']
+
+    def test_getitem_with_service_dependency(self, mock_plg):
+        def create(plg):
+            if plg.details['Core']['Id'] == 'b':
+                return 'B uses ' + registry['a']
+            return 'A'
+
+        registry = services.ServiceRegistry(create)
+        registry.register('a', mock_plg(id='a'))
+        registry.register('b', mock_plg(id='b'))
+
+        assert registry['b'] == 'B uses A'
+
+    def test_getitem_with_dependency_cycle(self, mock_plg):
+        def create(plg):
+            return registry['b' if plg.details['Core']['Id'] == 'a' else 'a']
+
+        registry = services.ServiceRegistry(create)
+        registry.register('a', mock_plg(id='a'))
+        registry.register('b', mock_plg(id='b'))
+
+        with pytest.raises(exceptions.DependencyError):
+            registry['a']
+
+    def test_getitem_from_many_threads_creates_service_once(self, mock_plg):
+        create = mock.Mock(return_value='Test')
+        registry = services.ServiceRegistry(create)
+        registry.register('test', mock_plg(id='test'))
+
+        threads = [threading.Thread(target=registry.__getitem__, args=('test',)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        create.assert_called_once()
+
+    def test_remove_closes_service(self, mock_plg):
+        service = mock.Mock()
+        registry = services.ServiceRegistry(mock.Mock(return_value=service))
+        registry.register('test', mock_plg(id='test'))
+        registry['test']
+
+        registry.remove('test')
+
+        service.close.assert_called_once_with()
+        assert registry.instances == {}
+
+    def test_close_services(self, mock_plg):
+        closable_service = mock.Mock()
+        registry = services.ServiceRegistry(lambda plg: closable_service if plg.details['Core']['Id'] == 'a'
+                                            else 'Test')
+        registry.register('a', mock_plg(id='a'))
+        registry.register('b', mock_plg(id='b'))
+        registry['a']
+        registry['b']
+
+        registry.close()
+
+        closable_service.close.assert_called_once_with()
+        assert registry.instances == {}
+
+    def test_close_services_in_reverse_creation_order(self, mock_plg):
+        closed = []
+        registry = services.ServiceRegistry(
+            lambda plg: mock.Mock(close=lambda: closed.append(plg.details['Core']['Id'])))
+        registry.register('a', mock_plg(id='a'))
+        registry.register('b', mock_plg(id='b'))
+        registry['a']
+        registry['b']
+
+        registry.close()
+
+        assert closed == ['b', 'a']
+
+    def test_close_service_with_error(self, mock_plg):
+        service = mock.Mock(close=mock.Mock(side_effect=RuntimeError))
+        registry = services.ServiceRegistry(mock.Mock(return_value=service))
+        registry.register('test', mock_plg(id='test'))
+        registry['test']
+
+        registry.close()
+
+        service.close.assert_called_once_with()
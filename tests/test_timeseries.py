@@ -0,0 +1,102 @@
+import pytest
+
+from meguca import timeseries
+
+
+class TestTimeSeries():
+    def test_range_after_buffer_wraps(self):
+        series = timeseries.TimeSeries(3)
+
+        for i in range(5):
+            series.add(i, i * 10)
+
+        assert len(series) == 3
+        assert series.range() == [(2, 20), (3, 30), (4, 40)]
+        assert series.range(3, 4) == [(3, 30), (4, 40)]
+        assert series.range(2.5, 3.5) == [(3, 30)]
+
+    def test_add_with_decreasing_timestamp(self):
+        series = timeseries.TimeSeries(3)
+        series.add(2, 1)
+
+        with pytest.raises(ValueError):
+            series.add(1, 1)
+
+    @pytest.mark.parametrize('func,result', [('count', 3), ('sum', 90), ('mean', 30),
+                                             ('min', 20), ('max', 40), ('first', 20), ('last', 40)])
+    def test_aggregate(self, func, result):
+        series = timeseries.TimeSeries(3)
+        for i in range(5):
+            series.add(i, i * 10)
+
+        assert series.aggregate(func) == result
+
+    def test_aggregate_empty_range(self):
+        series = timeseries.TimeSeries(3)
+        series.add(1, 1)
+
+        assert series.aggregate('mean', 2, 3) is None
+        assert series.aggregate('count', 2, 3) == 0
+
+
+class TestRollup():
+    def test_add_to_buckets(self):
+        rollup = timeseries.Rollup(10, 2)
+
+        for timestamp, value in ((1, 1), (5, 3), (12, 5), (25, 7), (29, 9)):
+            rollup.add(timestamp, value)
+
+        assert rollup.range() == [(10, 5), (20, 8)]
+
+    @pytest.mark.parametrize('func,result', [('count', 3), ('sum', 9), ('mean', 3),
+                                             ('min', 1), ('max', 5), ('first', 1), ('last', 5)])
+    def test_aggregate(self, func, result):
+        rollup = timeseries.Rollup(10, 2)
+        for timestamp, value in ((1, 1), (5, 3), (12, 5)):
+            rollup.add(timestamp, value)
+
+        assert rollup.aggregate(func) == result
+
+
+class TestTimeSeriesStore():
+    def test_record_tracked_numeric_keys(self):
+        store = timeseries.TimeSeriesStore(['a', 'b', 'c'], 10, {'hourly': 2})
+
+        store.record({'a': 1, 'b': 'Test', 'c': True, 'd': 1}, 3600)
+        store.record({'a': 3}, 3601)
+
+        assert store.range('a') == [(3600, 1), (3601, 3)]
+        assert store.range('a', resolution='hourly') == [(3600, 2)]
+        assert store.range('b') == []
+        assert store.aggregate('c', 'count') == 0
+        assert 'd' not in store.series
+
+    def test_record_with_clock_going_backwards(self):
+        store = timeseries.TimeSeriesStore(['a'], 10)
+
+        store.record({'a': 1}, 10)
+        store.record({'a': 2}, 5)
+
+        assert store.range('a') == [(10, 1), (10, 2)]
+
+    def test_query_untracked_key(self):
+        store = timeseries.TimeSeriesStore(['a'], 10)
+
+        with pytest.raises(KeyError):
+            store.range('b')
+
+    def test_query_resolution_not_kept(self):
+        store = timeseries.TimeSeriesStore(['a'], 10)
+
+        with pytest.raises(KeyError):
+            store.aggregate('a', 'mean', resolution='daily')
+
+    def test_unknown_rollup_resolution(self):
+        with pytest.raises(ValueError):
+            timeseries.TimeSeriesStore(['a'], 10, {'weekly': 10})
+
+    def test_unknown_aggregate_function(self):
+        store = timeseries.TimeSeriesStore(['a'], 10)
+
+        with pytest.raises(ValueError):
+            store.aggregate('a', 'median')
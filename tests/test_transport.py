@@ -0,0 +1,195 @@
+import json
+import atexit
+from unittest import mock
+
+import pytest
+import requests
+import requests.adapters
+
+from meguca import exceptions
+from meguca import transport
+
+
+URL = 'https://www.nationstates.net/cgi-bin/api.cgi?q=numnations'
+
+
+def gen_interaction(body, status=200, method='GET', url=URL, headers=None):
+    return {'request': {'method': method, 'url': url},
+            'response': {'status': status, 'headers': headers or {}, 'body': body}}
+
+
+@pytest.fixture
+def fixture_path(tmp_path):
+    path = tmp_path / 'fixtures.json'
+    path.write_text(json.dumps({'version': transport.FIXTURE_VERSION,
+                                'interactions': [gen_interaction('1', headers={'X-Pin': '12345'}),
+                                                 gen_interaction('2')]}))
+
+    return str(path)
+
+
+class TestReplayAdapter():
+    def test_replay_responses_in_order(self, fixture_path):
+        session = requests.Session()
+        transport.mount(session, {'mode': 'replay', 'path': fixture_path})
+
+        resps = [session.get(URL) for i in range(3)]
+
+        assert [resp.text for resp in resps] == ['1', '2', '2']
+        assert resps[0].status_code == 200
+        assert resps[0].headers['x-pin'] == '12345'
+
+    def test_replay_streamed_response(self, fixture_path):
+        session = requests.Session()
+        transport.mount(session, {'mode': 'replay', 'path': fixture_path})
+
+        resp = session.get(URL, stream=True)
+
+        assert list(resp.iter_content(1)) == [b'1']
+
+    def test_replay_non_recorded_request(self, fixture_path):
+        session = requests.Session()
+        transport.mount(session, {'mode': 'replay', 'path': fixture_path})
+
+        with pytest.raises(exceptions.TransportError):
+            session.post(URL)
+
+    def test_replay_request_with_changed_volatile_params(self, tmp_path):
+        path = tmp_path / 'fixtures.json'
+        url = 'https://www.nationstates.net/cgi-bin/api.cgi?q=happenings;filter=endo;sincetime={};'
+        path.write_text(json.dumps({'version': transport.FIXTURE_VERSION,
+                                    'interactions': [gen_interaction('1', url=url.format(100)),
+                                                     gen_interaction('2', url=url.format(200))]}))
+        session = requests.Session()
+        transport.mount(session, {'mode': 'replay', 'path': str(path)})
+
+        resps = [session.get(url.format(sincetime)) for sincetime in (300, 400)]
+
+        assert [resp.text for resp in resps] == ['1', '2']
+
+    @mock.patch('time.sleep')
+    def test_replay_with_fixed_latency(self, mocked_sleep, fixture_path):
+        session = requests.Session()
+        transport.mount(session, {'mode': 'replay', 'path': fixture_path, 'latency': 0.5})
+
+        session.get(URL)
+
+        mocked_sleep.assert_called_once_with(0.5)
+
+    @mock.patch('time.sleep')
+    def test_replay_with_recorded_latency(self, mocked_sleep, tmp_path):
+        path = tmp_path / 'fixtures.json'
+        interaction = gen_interaction('1')
+        interaction['response']['elapsed'] = 0.25
+        path.write_text(json.dumps({'version': transport.FIXTURE_VERSION,
+                                    'interactions': [interaction]}))
+        session = requests.Session()
+        transport.mount(session, {'mode': 'replay', 'path': str(path), 'latency': 'recorded'})
+
+        session.get(URL)
+
+        mocked_sleep.assert_called_once_with(0.25)
+
+
+def gen_response(request, body, headers):
+    resp = requests.Response()
+    resp.status_code = 200
+    resp.reason = 'OK'
+    resp.headers = requests.structures.CaseInsensitiveDict(headers)
+    resp._content = body.encode('utf-8')
+    resp.url = request.url
+    resp.request = request
+
+    return resp
+
+
+@pytest.fixture(autouse=True)
+def clear_cassettes():
+    yield
+
+    for cassette in transport._cassettes.values():
+        atexit.unregister(cassette.save)
+    transport._cassettes.clear()
+
+
+class TestRecordAdapter():
+    def test_record_and_replay(self, tmp_path):
+        path = str(tmp_path / 'cassette.json')
+        headers = {'X-Pin': '12345', 'X-Ratelimit-Requests-Seen': '3', 'X-Retry-After': '10'}
+        session = requests.Session()
+        transport.mount(session, {'mode': 'record', 'path': path})
+
+        with mock.patch.object(requests.adapters.HTTPAdapter, 'send',
+                               side_effect=lambda request, **kwargs: gen_response(request, '1', headers)):
+            session.get(URL)
+        transport.get_cassette(path).save()
+
+        replay_session = requests.Session()
+        transport.mount(replay_session, {'mode': 'replay', 'path': path})
+        resp = replay_session.get(URL)
+
+        assert resp.text == '1'
+        assert resp.headers['x-pin'] == '12345'
+        assert resp.headers['x-ratelimit-requests-seen'] == '3'
+        assert resp.headers['x-retry-after'] == '10'
+
+    def test_sessions_share_cassette(self, tmp_path):
+        path = str(tmp_path / 'cassette.json')
+        sessions = [requests.Session(), requests.Session()]
+        for session in sessions:
+            transport.mount(session, {'mode': 'record', 'path': path})
+
+        with mock.patch.object(requests.adapters.HTTPAdapter, 'send',
+                               side_effect=lambda request, **kwargs: gen_response(request, '1', {})):
+            for session in sessions:
+                session.get(URL)
+        transport.get_cassette(path).save()
+
+        assert len(transport.load_fixtures(path)) == 2
+
+
+    def test_record_through_existing_adapter(self, tmp_path):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=20)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        transport.mount(session, {'mode': 'record', 'path': str(tmp_path / 'cassette.json')})
+
+        record_adapter = session.get_adapter(URL)
+        assert record_adapter.adapter is adapter
+        assert session.get_adapter('http://www.nationstates.net') is record_adapter
+
+
+class TestNormalizeUrl():
+    def test_normalize_url(self):
+        url = 'https://www.nationstates.net/cgi-bin/api.cgi?q=happenings;sincetime=1;filter=endo;'
+
+        assert (transport.normalize_url(url, transport.VOLATILE_PARAMS)
+                == 'https://www.nationstates.net/cgi-bin/api.cgi?q=happenings;filter=endo')
+
+    def test_normalize_url_without_query(self):
+        url = 'https://www.nationstates.net/page=ajax2'
+
+        assert transport.normalize_url(url, transport.VOLATILE_PARAMS) == url
+
+
+class TestMount():
+    def test_mount_live_transport(self):
+        session = requests.Session()
+        adapter = session.get_adapter(URL)
+
+        transport.mount(session, {})
+
+        assert session.get_adapter(URL) is adapter
+
+    def test_mount_unknown_transport(self):
+        with pytest.raises(exceptions.ConfigError):
+            transport.mount(requests.Session(), {'mode': 'Test'})
+
+    def test_load_fixtures_with_unsupported_version(self, tmp_path):
+        path = tmp_path / 'fixtures.json'
+        path.write_text(json.dumps({'version': 0, 'interactions': []}))
+
+        with pytest.raises(exceptions.TransportError):
+            transport.load_fixtures(str(path))